@@ -1,20 +1,92 @@
-from flask import Flask, request, jsonify
+import time
+from startup import StartupReport
+startup_report = StartupReport()  # Started first so imports count toward boot time
+
+from flask import Flask, Response, request, jsonify, g, has_app_context
 from flask_cors import CORS
 import requests
 import os
 import json
-import google.generativeai as genai
 from datetime import datetime, timedelta, timezone
 import threading
-import time
+import functools
+import contextvars
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import hmac
+import hashlib
+import itertools
 from dotenv import load_dotenv
+from logging_config import configure_logging, begin_request, current_request_id, debug_enabled
+from records import PartitionedRecordCache, Snapshot
+from week_views import WeekViewCache
+from formatting import format_due_date, format_clock_time
+from capture import TrafficRecorder, capture_active, capture_snapshot, capture_context, capture_model_call
+from personal_llm import PersonalLLMDispatcher, PersonalLLMBusy, KeepWarm
+from warmup import WarmupScheduler
+from health import HealthRegistry
+from prefetch import Prefetcher, SpeculativeCache
+from fairshare import FairQueueTimeout, FairScheduler, UsageLedger, parse_weights
+from compression import compressed, encoding_names
+from jsoncodec import FastJSONProvider, STREAM_CHUNK_BYTES, codec_name, iter_collection, loads, dumps
+from profiling import PROFILE_MODES, ProfileStore, profile_call
+from tracing import TRACE_HEADER, start_trace, current_trace, stage, record_stage, trace_headers
+from prompt_builder import build_prompt, estimate_tokens, flatten_messages, truncate_to_tokens, DEFAULT_PROMPT_BUDGET, SYSTEM_PROMPT_TOKENS
+from memory import ConversationMemory, rule_based_summary
+from metrics import (
+    REGISTRY, gauge, NODE_FETCH_SECONDS, CONTEXT_SELECTION_SECONDS, PROMPT_TOKENS,
+    MODEL_LATENCY_SECONDS, MODEL_TTFB_SECONDS, MODEL_REQUESTS, MODEL_FALLBACKS,
+    RULE_BASED_FALLBACKS, CACHE_REQUESTS, STARTUP_SECONDS, MODEL_QUEUE_WAIT_SECONDS,
+    WARMUP_RUNS, WARMUP_SECONDS, PREFETCH_RUNS, AI_ADMISSIONS, AI_QUEUE_WAIT_SECONDS, AI_TOKENS
+)
+from retrieval import (
+    tokenize, top_k, recency_boost, due_date_boost,
+    numpy_available, TfidfIndex, recency_boost_array, due_date_boost_array, top_k_indices
+)
+
+if numpy_available():
+    import numpy as np
+
+startup_report.mark('imports')
 
 # Load environment variables from .env file
 load_dotenv()
 
-print("GEMINI_API_KEY:", os.getenv('GEMINI_API_KEY'))
+logger = configure_logging()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+active_requests = 0  # Requests being served, for load-aware background work
+active_requests_lock = threading.Lock()
+gauge('chat_active_requests', 'Requests currently being served by this worker', function=lambda: active_requests)
+
+@app.before_request
+def start_request_logging():
+    """Tag log records with a request id, decide DEBUG sampling and start the stage trace"""
+    global active_requests
+    begin_request(request.headers.get(TRACE_HEADER))
+    start_trace()
+    with active_requests_lock:
+        active_requests += 1
+    if not app_started:
+        # Served as `app:app` instead of through the factory
+        create_app()
+
+@app.teardown_request
+def finish_request(exc):
+    global active_requests
+    with active_requests_lock:
+        active_requests -= 1
+
+@app.after_request
+def add_trace_headers(response):
+    """Expose the stage breakdown to browser devtools and the trace id to clients"""
+    trace = current_trace()
+    if trace is not None:
+        response.headers['Server-Timing'] = trace.server_timing()
+        response.headers[TRACE_HEADER] = trace.trace_id
+    return response
 
 # Configuration
 NODE_API_URL = os.getenv('NODE_API_URL', 'https://your-node-service.onrender.com')
@@ -28,18 +100,17 @@ CORS(app, origins=[
     FRONTEND_URL,  # Dynamic frontend URL from environment
     "https://dailyclass.netlify.app",  # Your actual Netlify URL
     "https://*.netlify.app"  # Wildcard for any Netlify subdomain
-])
-
-print("OPENROUTER_API_KEY:", "***" + str(OPENROUTER_API_KEY)[-4:] if OPENROUTER_API_KEY else "Not set")
-print("FRONTEND_URL:", FRONTEND_URL)
+], expose_headers=['Server-Timing', 'X-Request-ID', 'X-Profile-ID'])
 
 # Model configuration with fallback chain - Updated with more reliable models
+# Optional per-model key: "prompt_budget" (estimated prompt tokens, see prompt_builder.py)
 MODEL_CHAIN = [
     {
         "provider": "personal_llm",
         "model": "llama3.2:3b", 
         "name": "Llama 3.2 3B (Personal Server)",
-        "available": bool(os.getenv('PERSONAL_LLM_URL'))  # Add this env var
+        "available": bool(os.getenv('PERSONAL_LLM_URL')),  # Add this env var
+        "prompt_budget": 1500  # Small local model: short prompts keep prompt evaluation fast
     },
     {
         "provider": "openrouter", 
@@ -81,26 +152,61 @@ MODEL_CHAIN = [
         "provider": "gemini",
         "model": "gemini-1.5-flash",
         "name": "Gemini 1.5 Flash",
-        "available": bool(GEMINI_API_KEY)
+        "available": bool(GEMINI_API_KEY),
+        "prompt_budget": 4000
     }
 ]
 
 # Filter available models
 AVAILABLE_MODELS = [model for model in MODEL_CHAIN if model["available"]]
-print(f"🚀 Available models: {[model['name'] for model in AVAILABLE_MODELS]}")
 
 # OpenRouter API configuration
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_BASE_URL = os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1/chat/completions")  # Overridable for load tests
+
+# Pooled HTTP sessions per upstream so TLS connections are reused (kept open by the warmup jobs)
+def pooled_session(pool_size=10):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
-# Initialize Gemini AI (as backup)
+node_http = pooled_session()
+openrouter_http = pooled_session()
+personal_llm_http = pooled_session()
+
+# Personal LLM (Ollama) configuration
+PERSONAL_LLM_KEEP_ALIVE = os.getenv('PERSONAL_LLM_KEEP_ALIVE', '30m')
+PERSONAL_LLM_NUM_CTX = int(os.getenv('PERSONAL_LLM_NUM_CTX', 4096))
+# Admission control: match PERSONAL_LLM_PARALLEL to the server's OLLAMA_NUM_PARALLEL
+PERSONAL_LLM_PARALLEL = int(os.getenv('PERSONAL_LLM_PARALLEL', 1))
+PERSONAL_LLM_MAX_QUEUE = int(os.getenv('PERSONAL_LLM_MAX_QUEUE', 2))
+PERSONAL_LLM_MAX_WAIT = float(os.getenv('PERSONAL_LLM_MAX_WAIT', 5))
+PERSONAL_LLM_WARM_INTERVAL = float(os.getenv('PERSONAL_LLM_WARM_INTERVAL', 600))  # Idle seconds before a preload; 0 disables
+
+personal_llm_dispatcher = PersonalLLMDispatcher(PERSONAL_LLM_PARALLEL, PERSONAL_LLM_MAX_QUEUE, PERSONAL_LLM_MAX_WAIT)
+
+# Gemini AI (as backup) - the SDK takes ~0.5s to import, so it is loaded on first use
 gemini_model = None
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    try:
-        gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-        print("✅ Gemini AI initialized as backup")
-    except Exception as e:
-        print(f"❌ Gemini AI initialization failed: {e}")
+gemini_lock = threading.Lock()
+gemini_failed = False
+
+def get_gemini_model():
+    """Import and configure the Gemini SDK on first use; None if unavailable"""
+    global gemini_model, gemini_failed
+    if gemini_model is not None or gemini_failed or not GEMINI_API_KEY:
+        return gemini_model
+    with gemini_lock:
+        if gemini_model is None and not gemini_failed:
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=GEMINI_API_KEY)
+                gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+                logger.info("✅ Gemini AI initialized as backup")
+            except Exception as e:
+                gemini_failed = True
+                logger.error("❌ Gemini AI initialization failed: %s", e)
+    return gemini_model
 
 # OpenRouter API helper function
 def call_openrouter_api(model, messages, max_tokens=1000, temperature=0.7):
@@ -120,7 +226,8 @@ def call_openrouter_api(model, messages, max_tokens=1000, temperature=0.7):
             "temperature": temperature
         }
         
-        response = requests.post(OPENROUTER_BASE_URL, headers=headers, json=data, timeout=30)
+        response = openrouter_http.post(OPENROUTER_BASE_URL, headers=trace_headers(headers), json=data, timeout=30)
+        MODEL_TTFB_SECONDS.observe(response.elapsed.total_seconds(), model=model)
         
         # Handle different HTTP status codes
         if response.status_code == 404:
@@ -134,7 +241,7 @@ def call_openrouter_api(model, messages, max_tokens=1000, temperature=0.7):
         
         response.raise_for_status()
         
-        result = response.json()
+        result = loads(response.content)
         
         # Check for API-level errors in the response
         if 'error' in result:
@@ -172,16 +279,16 @@ def call_openrouter_api(model, messages, max_tokens=1000, temperature=0.7):
             raise Exception(f"OpenRouter API error: {e}")
 
 #  ! Personal LLM API helper function
+def personal_llm_base_url():
+    personal_llm_url = os.getenv('PERSONAL_LLM_URL')
+    if not personal_llm_url:
+        raise Exception("Personal LLM URL not configured")
+    return personal_llm_url.rstrip('/')
+
 def call_personal_llm_api(model, messages, max_tokens=1000, temperature=0.7):
-    """Call your personal LLM server running on your Mac"""
+    """Call your personal LLM server running on your Mac (at most PERSONAL_LLM_PARALLEL at a time)"""
     try:
-        personal_llm_url = os.getenv('PERSONAL_LLM_URL')
-        if not personal_llm_url:
-            raise Exception("Personal LLM URL not configured")
-        
-        # Format for Ollama API
-        if personal_llm_url.endswith('/'):
-            personal_llm_url = personal_llm_url[:-1]
+        personal_llm_url = personal_llm_base_url()
         
         # Ollama chat API format
         url = f"{personal_llm_url}/api/chat"
@@ -190,22 +297,34 @@ def call_personal_llm_api(model, messages, max_tokens=1000, temperature=0.7):
             "model": model,
             "messages": messages,
             "stream": False,
+            # Keep the model loaded so its KV cache (system prompt and earlier
+            # turns) is reused; a fixed num_ctx avoids reloads between requests
+            "keep_alive": PERSONAL_LLM_KEEP_ALIVE,
             "options": {
                 "temperature": temperature,
-                "num_predict": max_tokens
+                "num_predict": max_tokens,
+                "num_ctx": PERSONAL_LLM_NUM_CTX
             }
         }
         
-        response = requests.post(url, json=data, timeout=60)  # Longer timeout for local processing
+        # Raises PersonalLLMBusy when the server is saturated so the chain moves on
+        with personal_llm_dispatcher.slot() as queued:
+            MODEL_QUEUE_WAIT_SECONDS.observe(queued, model=model)
+            record_stage('model_queue', queued, desc=model)
+            # The timeout now only covers generation, not time spent behind other requests
+            response = personal_llm_http.post(url, json=data, headers=trace_headers(), timeout=(5, 60))
+        MODEL_TTFB_SECONDS.observe(response.elapsed.total_seconds(), model=model)
         response.raise_for_status()
         
-        result = response.json()
+        result = loads(response.content)
         
         if 'message' in result and 'content' in result['message']:
             return result['message']['content']
         else:
             raise Exception(f"Unexpected response format from personal LLM: {result}")
             
+    except PersonalLLMBusy:
+        raise
     except requests.exceptions.Timeout:
         raise Exception(f"Personal LLM server timeout. Check if your Mac is running and accessible.")
     except requests.exceptions.ConnectionError:
@@ -213,6 +332,18 @@ def call_personal_llm_api(model, messages, max_tokens=1000, temperature=0.7):
     except Exception as e:
         raise Exception(f"Personal LLM API error: {e}")
 
+def preload_personal_llm():
+    """Load the personal model into memory (Ollama loads on an empty chat) and restart its keep_alive timer"""
+    for model_config in AVAILABLE_MODELS:
+        if model_config["provider"] == "personal_llm":
+            personal_llm_http.post(f"{personal_llm_base_url()}/api/chat", json={
+                "model": model_config["model"],
+                "messages": [],
+                "keep_alive": PERSONAL_LLM_KEEP_ALIVE,
+                "options": {"num_ctx": PERSONAL_LLM_NUM_CTX}  # Same num_ctx as requests, or Ollama reloads
+            }, timeout=(5, 120)).raise_for_status()
+            logger.info("Preloaded %s on the personal LLM server", model_config["model"])
+
 # Test available models on startup
 def test_models():
     """Test which models are actually working"""
@@ -220,297 +351,536 @@ def test_models():
     test_messages = [{"role": "user", "content": "Hello, respond with just 'OK'"}]
     
     for model_config in AVAILABLE_MODELS:
+        started = time.perf_counter()
         try:
             if model_config["provider"] == "personal_llm":
                 response = call_personal_llm_api(model_config["model"], test_messages)
                 working_models.append(model_config)
-                print(f"✅ {model_config['name']} is working (Personal LLM)")
+                logger.info("✅ %s is working (Personal LLM)", model_config['name'])
             elif model_config["provider"] == "openrouter":
                 response = call_openrouter_api(model_config["model"], test_messages)
                 working_models.append(model_config)
-                print(f"✅ {model_config['name']} is working")
-            elif model_config["provider"] == "gemini" and gemini_model:
-                response = gemini_model.generate_content("Hello")
+                logger.info("✅ %s is working", model_config['name'])
+            elif model_config["provider"] == "gemini" and get_gemini_model():
+                response = get_gemini_model().generate_content("Hello")
                 working_models.append(model_config)
-                print(f"✅ {model_config['name']} is working")
+                logger.info("✅ %s is working", model_config['name'])
         except Exception as e:
-            print(f"❌ {model_config['name']} failed test: {e}")
+            logger.warning("❌ %s failed test: %s", model_config['name'], e)
+            model_health.failure(model_config['name'], e, time.perf_counter() - started)
+        else:
+            if model_config in working_models:
+                model_health.success(model_config['name'], time.perf_counter() - started)
     
     return working_models
 
-# Test models and update available list
-print("🧪 Testing available models...")
-WORKING_MODELS = test_models()
-print(f"🚀 Working models: {[model['name'] for model in WORKING_MODELS]}")
+# Configured models count as working until the startup probe says otherwise.
+# MODEL_PROBES: 'background' (default) probes without delaying boot,
+# 'blocking' probes before the app serves, 'off' skips probing.
+MODEL_PROBES = os.getenv('MODEL_PROBES', 'background').lower()
+WORKING_MODELS = list(AVAILABLE_MODELS)
+
+def probe_models():
+    """Test configured models and keep only the working ones"""
+    logger.info("🧪 Testing available models...")
+    WORKING_MODELS[:] = test_models()  # In place: request handlers hold this list
+    logger.info("🚀 Working models: %s", [model['name'] for model in WORKING_MODELS])
+    
+    if not WORKING_MODELS:
+        logger.warning("⚠️ No AI models available - will use rule-based responses only")
 
-if not WORKING_MODELS:
-    print("⚠️ No AI models available - will use rule-based responses only")
+# Traffic capture for replay.py (off unless CAPTURE_DIR is set; logs contain user messages and data)
+CAPTURE_DIR = os.getenv('CAPTURE_DIR')
+traffic_recorder = None
 
 # ! In-memory conversation storage (use Redis in production)
 conversations = {}
+gauge('chat_conversations_in_memory', 'Users with conversation history held in memory', function=lambda: len(conversations))
+gauge('chat_personal_llm_in_flight', 'Generations running on the personal LLM server', function=lambda: personal_llm_dispatcher.in_flight)
+gauge('chat_personal_llm_queued', 'Requests waiting for a personal LLM slot', function=lambda: personal_llm_dispatcher.waiting)
+gauge('chat_conversation_exchanges_in_memory', 'Exchanges held across all conversations', function=lambda: sum(len(history) for history in list(conversations.values())))
+HISTORY_MAX_EXCHANGES = int(os.getenv('HISTORY_MAX_EXCHANGES', 10))
+# Exchange ids and history versions come from one global sequence, so a
+# cleared history never reuses an id (cursor) or a version (ETag)
+history_sequence = itertools.count(1)
+history_versions = {}  # user_id -> sequence number of the last change
+# The sequence restarts with every process, so ETags also name the process
+# that issued them: a tag from before a restart or from another worker never matches
+history_epoch = os.urandom(4).hex()
+
+def history_etag_prefix():
+    return f"{history_epoch}{os.getpid():x}"  # The pid tells apart workers forked from a preloaded app
+
+def record_exchange(user_id, message, response, context_used):
+    """Append an exchange to the user's history (keeping the last HISTORY_MAX_EXCHANGES) and bump its version"""
+    sequence = next(history_sequence)
+    history = conversations.setdefault(user_id, [])
+    history.append({
+        'id': sequence,
+        'user': message,
+        'assistant': response,
+        'timestamp': datetime.now().isoformat(),
+        'context_used': context_used
+    })
+    if len(history) > HISTORY_MAX_EXCHANGES:
+        conversations[user_id] = history[-HISTORY_MAX_EXCHANGES:]
+    history_versions[user_id] = sequence
+
+# Conversation memory mode: 'summary' folds older turns into a rolling summary
+# once raw history grows past a token threshold; 'window' sends raw turns only
+CONVERSATION_MEMORY = os.getenv('CONVERSATION_MEMORY', 'summary').lower()
+SUMMARY_MODEL = os.getenv('SUMMARY_MODEL')  # Optional low-tier OpenRouter model, runs off the request path
+
+def summarize_with_model(previous_summary, exchanges):
+    """Fold exchanges into the running summary using SUMMARY_MODEL"""
+    transcript = "\n".join(
+        f"Student: {exchange['user']}\nHunniBee: {truncate_to_tokens(exchange['assistant'], 200)}"
+        for exchange in exchanges
+    )
+    messages = [
+        {
+            "role": "system",
+            "content": "You condense chat transcripts between a student and their academic assistant. Reply with at most 5 short bullet points covering what the student asked about and the key facts given (classes, tasks, dates). No preamble."
+        },
+        {
+            "role": "user",
+            "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew exchanges:\n{transcript}"
+        }
+    ]
+    return call_openrouter_api(SUMMARY_MODEL, messages, max_tokens=200, temperature=0.2).strip()
+
+if SUMMARY_MODEL and OPENROUTER_API_KEY:
+    conversation_memory = ConversationMemory(summarizer=summarize_with_model, run_async=True)
+else:
+    conversation_memory = ConversationMemory(summarizer=rule_based_summary)
 
 # Global throttling state tracker
 throttled_models = set()
+
+# Upstream health fed by real traffic and the warmup probes; /health only reads it
+upstream_health = HealthRegistry()  # 'node', 'openrouter'
+model_health = HealthRegistry()  # Keyed by model name
 last_throttle_check = datetime.now()
 
+# Context retrieval limits and ranking weights
+MAX_CONTEXT_ITEMS = 15
+FOCUSED_CONTEXT_LIMIT = 10  # Single-type queries (only tasks or only announcements)
+INTENT_BONUS = 2.0  # Record type the message explicitly asks about
+DATE_MATCH_BONUS = 5.0  # Schedule on the exact day asked for ("today"/"tomorrow")
+TASK_PRIORITY_BONUS = 10.0  # Assignment queries rank tasks ahead of everything else
+# Records admitted on text match alone need at least MIN_TEXT_SCORE (BM25)
+# and RELATIVE_TEXT_FLOOR of the best text score for the message, so a
+# single common word ("classes") does not fill the context with weak matches
+MIN_TEXT_SCORE = 1.0
+RELATIVE_TEXT_FLOOR = 0.3
+
+RECORD_TYPES = ('schedule', 'task', 'announcement')
+RECORD_COLLECTIONS = {'schedule': 'schedules', 'task': 'tasks', 'announcement': 'announcements'}
+
+# Per-user data scoping: when set, schedules and tasks are requested with
+# ?<USER_SCOPE_PARAM>=<user_id> and cached per user; announcements are common
+# to everyone and always fetched unscoped. Off by default: the Node API
+# currently serves one class's data to everybody.
+USER_SCOPE_PARAM = os.getenv('USER_SCOPE_PARAM', '')
+SCOPED_COLLECTIONS = ('schedules', 'tasks')
+USER_PARTITION_IDLE_SECONDS = float(os.getenv('USER_PARTITION_IDLE_SECONDS', 1800))
+MAX_USER_PARTITIONS = int(os.getenv('MAX_USER_PARTITIONS', 256))
+
+def data_scope(user_id):
+    """Partition key for a user's data, or None when data is not user-scoped"""
+    if not USER_SCOPE_PARAM or not user_id or user_id == 'anonymous':
+        return None
+    return str(user_id)
+
+def drop_user_partition(scope):
+    with tfidf_lock:
+        tfidf_indexes.pop(scope, None)
+
+# Node API records are converted to typed records once (see records.py), one partition per scope
+record_cache = PartitionedRecordCache(MAX_USER_PARTITIONS, USER_PARTITION_IDLE_SECONDS, on_evict=drop_user_partition)
+gauge('chat_user_partitions', 'User-scoped snapshot partitions held in memory', function=lambda: len(record_cache))
+gauge('chat_shared_records', 'Records interned once and shared across user partitions', function=lambda: record_cache.shared_records())
+# Rendered week-by-week schedules per snapshot (see week_views.py)
+week_views = WeekViewCache(on_lookup=lambda result: CACHE_REQUESTS.inc(cache='week_view', result=result))
+
+# Retrieval engine: 'bm25' (default, pure Python) or 'tfidf' (vectorized, needs NumPy)
+RETRIEVAL_ENGINE = os.getenv('RETRIEVAL_ENGINE', 'bm25').lower()
+if RETRIEVAL_ENGINE == 'tfidf' and not numpy_available():
+    logger.warning("⚠️ RETRIEVAL_ENGINE=tfidf requires NumPy (pip install numpy) - falling back to BM25")
+    RETRIEVAL_ENGINE = 'bm25'
+
+# TF-IDF index per data scope, kept in sync with that scope's snapshots
+tfidf_indexes = {}
+tfidf_lock = threading.Lock()
+
+def tfidf_index_for(scope):
+    """The scope's TF-IDF index (created on first use); call with tfidf_lock held"""
+    index = tfidf_indexes.get(scope)
+    if index is None:
+        index = tfidf_indexes[scope] = TfidfIndex(feature_count=3)
+    return index
+
+def get_user_timezone():
+    """Get current time in appropriate timezone based on user location"""
+    utc_now = datetime.now(timezone.utc)
+    
+    # Default to Philippines timezone (UTC+8) since users are experiencing issues there
+    # Philippines doesn't observe DST, so it's consistently UTC+8
+    philippines_offset = timedelta(hours=8)
+    return utc_now.astimezone(timezone(philippines_offset))
+
+NODE_COLLECTIONS = ('schedules', 'tasks', 'announcements')
+STREAM_JSON_MIN_BYTES = int(os.getenv('STREAM_JSON_MIN_BYTES', 1024 * 1024))
+
+def buffered_or_streamed(chunks, cap):
+    """
+    Records of a body of unknown length (chunked transfer): up to `cap` bytes
+    are buffered and decoded in one call; a body that turns out larger
+    continues through the incremental parser.
+    """
+    buffered, size = [], 0
+    for chunk in chunks:
+        buffered.append(chunk)
+        size += len(chunk)
+        if size >= cap:
+            return iter_collection(itertools.chain(buffered, chunks))
+    return iter(loads(b''.join(buffered)).get('data') or [])
+
+def fetch_collection(collection, params=None):
+    """
+    Yield one Node API collection's raw records. Bodies with a Content-Length
+    of at least STREAM_JSON_MIN_BYTES are parsed incrementally: that parse
+    costs about 3.5x the CPU of a buffered decode, but peak memory stays near
+    one record instead of the whole document (see benchmark.py's peak_kib).
+    Chunked bodies are buffered up to the same size before that choice.
+    """
+    started = resumed = time.perf_counter()
+    spent = 0.0  # Request, download and decode only: the consumer's ingest runs while suspended at yield
+    try:
+        with node_http.get(f"{NODE_API_URL}/api/{collection}", params=params, timeout=10, headers=trace_headers(), stream=True) as response:
+            latency = response.elapsed.total_seconds()
+            if response.status_code != 200:
+                upstream_health.failure('node', f"GET /api/{collection}: {response.status_code}", latency)
+                return
+            length = response.headers.get('Content-Length')
+            if length is None:
+                records = buffered_or_streamed(response.iter_content(STREAM_CHUNK_BYTES), STREAM_JSON_MIN_BYTES)
+            elif int(length) >= STREAM_JSON_MIN_BYTES:
+                records = iter_collection(response.iter_content(STREAM_CHUNK_BYTES))
+            else:
+                records = loads(response.content).get('data') or []
+            for record in records:
+                spent += time.perf_counter() - resumed
+                resumed = None
+                yield record
+                resumed = time.perf_counter()
+    except Exception as e:
+        upstream_health.failure('node', e, time.perf_counter() - started)
+        raise
+    finally:
+        if resumed is not None:
+            spent += time.perf_counter() - resumed
+        NODE_FETCH_SECONDS.observe(spent, collection=collection)
+    upstream_health.success('node', latency)
+
 class ContextManager:
     """Handles context retrieval and processing"""
     
     @staticmethod
-    def fetch_user_data():
-        """Fetch schedules and tasks from Node.js API"""
-        try:
-            # Fetch schedules
-            schedules_response = requests.get(f"{NODE_API_URL}/api/schedules", timeout=10)
-            schedules = schedules_response.json().get('data', []) if schedules_response.status_code == 200 else []
-            
-            # Fetch tasks
-            tasks_response = requests.get(f"{NODE_API_URL}/api/tasks", timeout=10)
-            tasks = tasks_response.json().get('data', []) if tasks_response.status_code == 200 else []
-            print(f"DEBUG - Fetched {len(tasks)} tasks from API")
-            
-            # Fetch announcements
-            announcements_response = requests.get(f"{NODE_API_URL}/api/announcements", timeout=10)
-            announcements = announcements_response.json().get('data', []) if announcements_response.status_code == 200 else []
-            
-            return {
-                'schedules': schedules,
-                'tasks': tasks,
-                'announcements': announcements
-            }
-        except Exception as e:
-            print(f"Error fetching data from Node.js API: {e}")
-            return {'schedules': [], 'tasks': [], 'announcements': []}
+    def fetch_user_data(user_id=None):
+        """
+        Fetch schedules, tasks and announcements from Node.js API as a typed
+        Snapshot (once per request). With USER_SCOPE_PARAM set, schedules and
+        tasks are limited to the user's own records; without a user_id the
+        snapshot already fetched for this request is returned.
+        """
+        scope = data_scope(user_id)
+        if has_app_context() and 'user_data' in g and (user_id is None or g.user_data.scope == scope):
+            return g.user_data
+        
+        with stage('fetch'):
+            try:
+                # Records stream from the Node API straight into the snapshot
+                user_params = {USER_SCOPE_PARAM: scope} if scope is not None else None
+                user_data = {collection: fetch_collection(collection, user_params if collection in SCOPED_COLLECTIONS else None)
+                             for collection in NODE_COLLECTIONS}
+                if capture_active():
+                    user_data = {collection: list(records) for collection, records in user_data.items()}
+                    capture_snapshot(user_data)
+                snapshot = record_cache.snapshot(user_data, scope)
+                logger.debug("Fetched %d schedules, %d tasks, %d announcements from API",
+                             len(snapshot.schedules), len(snapshot.tasks), len(snapshot.announcements))
+            except Exception as e:
+                logger.error("Error fetching data from Node.js API: %s", e)
+                user_data = {'schedules': [], 'tasks': [], 'announcements': []}
+                capture_snapshot(user_data)
+                snapshot = record_cache.snapshot(user_data, scope)
+        
+        week_views.observe(snapshot, get_user_timezone().date())
+        if has_app_context():
+            g.user_data = snapshot
+        return snapshot
     
     @staticmethod
     def find_relevant_context(message, data):
         """Find relevant schedules, tasks, and announcements based on the message"""
         message_lower = message.lower()
-        relevant_context = []
         
-        print(f"DEBUG - Processing message: '{message}' (lower: '{message_lower}')")
-        print(f"DEBUG - Available data: {len(data['schedules'])} schedules, {len(data['tasks'])} tasks, {len(data['announcements'])} announcements")
+        logger.debug("Processing message: %r", message)
+        logger.debug("Available data: %d schedules, %d tasks, %d announcements", len(data.schedules), len(data.tasks), len(data.announcements))
         
         # Check if this is a specific content type query
         is_announcement_query = any(word in message_lower for word in ['announcement', 'announcements', 'news', 'update'])
         is_task_query = any(word in message_lower for word in ['task', 'tasks', 'assignment', 'assignments', 'homework', 'project', 'due'])
         is_schedule_query = any(word in message_lower for word in ['schedule', 'class', 'classes', 'subject', 'today', 'tomorrow'])
         
-        print(f"DEBUG - Query type detection: announcement={is_announcement_query}, task={is_task_query}, schedule={is_schedule_query}")
+        logger.debug("Query type detection: announcement=%s, task=%s, schedule=%s", is_announcement_query, is_task_query, is_schedule_query)
+        
+        today_user_tz = get_user_timezone().date()
         
-        # If asking specifically for announcements, prioritize announcements
+        # If asking specifically for announcements, rank announcements only
         if is_announcement_query and not is_task_query and not is_schedule_query:
-            print("DEBUG - Detected specific announcement query - focusing on announcements only")
-            announcement_matches = 0
-            for announcement in data['announcements']:
-                relevant_context.append({
-                    'type': 'announcement',
-                    'content': f"Announcement: {announcement.get('title')} - {announcement.get('description')}"
-                })
-                announcement_matches += 1
-            
-            print(f"DEBUG - Found {announcement_matches} announcements for specific query")
-            limited_context = relevant_context[:10]
-            print(f"DEBUG - Final context items after limit: {len(limited_context)}")
-            for i, item in enumerate(limited_context):
-                print(f"DEBUG - Context item {i+1}: {item['type']} - {item['content'][:100]}...")
+            logger.debug("Detected specific announcement query - focusing on announcements only")
+            limited_context = ContextManager._rank_records(ContextManager._rank(
+                data, message_lower, today_user_tz, FOCUSED_CONTEXT_LIMIT,
+                {'schedule': None, 'task': None, 'announcement': True}
+            ))
+            logger.debug("Final context items after ranking: %d", len(limited_context))
             return limited_context
         
-        # If asking specifically for tasks, prioritize tasks
+        # If asking specifically for tasks, rank tasks only
         if is_task_query and not is_announcement_query and not is_schedule_query:
-            print("DEBUG - Detected specific task query - focusing on tasks only")
-            task_matches = 0
-            for task in data['tasks']:
-                due_date = task.get('dueDate', '')
-                formatted_due_date = ChatService.format_date(due_date)
-                
-                relevant_context.append({
-                    'type': 'task',
-                    'content': f"Assignment: '{task.get('title')}' for {task.get('class')} - Type: {task.get('type')}, Priority: {task.get('priority')}, Status: {task.get('status')}, Due: {formatted_due_date}. Description: {task.get('description', '')[:100]}..."
-                })
-                task_matches += 1
-            
-            print(f"DEBUG - Found {task_matches} tasks for specific query")
-            limited_context = relevant_context[:10]
-            print(f"DEBUG - Final context items after limit: {len(limited_context)}")
-            for i, item in enumerate(limited_context):
-                print(f"DEBUG - Context item {i+1}: {item['type']} - {item['content'][:100]}...")
+            logger.debug("Detected specific task query - focusing on tasks only")
+            limited_context = ContextManager._rank_records(ContextManager._rank(
+                data, message_lower, today_user_tz, FOCUSED_CONTEXT_LIMIT,
+                {'schedule': None, 'task': True, 'announcement': None}
+            ))
+            logger.debug("Final context items after ranking: %d", len(limited_context))
             return limited_context
         
-        # Check schedules
-        schedule_matches = 0
         today_query = any(word in message_lower for word in ['today', 'today?'])
         tomorrow_query = any(word in message_lower for word in ['tomorrow', 'tomorrow?'])
         
         # Detect if this is a casual follow-up question (less strict filtering)
         is_casual_followup = any(phrase in message_lower for phrase in ['how about', 'what about', 'and tomorrow', 'for tomorrow'])
         
-        for schedule in data['schedules']:
-            should_include = False
-            
-            # Check if this is a date-specific query (like "today" or "tomorrow")
-            if (today_query or tomorrow_query) and not is_casual_followup:
-                # Apply strict date filtering only for direct date queries, not casual follow-ups
-                # Get today's date in proper timezone (Philippines UTC+8)
-                def get_user_timezone():
-                    """Get current time in appropriate timezone based on user location"""
-                    utc_now = datetime.now(timezone.utc)
-                    
-                    # Default to Philippines timezone (UTC+8) since users are experiencing issues there
-                    # Philippines doesn't observe DST, so it's consistently UTC+8
-                    philippines_offset = timedelta(hours=8)
-                    philippines_time = utc_now.replace(tzinfo=timezone.utc).astimezone(timezone(philippines_offset))
-                    
-                    return philippines_time
-                
-                user_tz_now = get_user_timezone()
-                today_user_tz = user_tz_now.date()
-                
-                if tomorrow_query:
-                    # Get tomorrow's date
-                    target_date = today_user_tz + timedelta(days=1)
-                    query_type = "tomorrow"
-                else:
-                    # Get today's date
-                    target_date = today_user_tz
-                    query_type = "today"
-                
-                # Parse schedule date
-                schedule_date_str = schedule.get('date', '')
-                if schedule_date_str:
-                    try:
-                        # Parse ISO date string and convert to date
-                        schedule_date = datetime.fromisoformat(schedule_date_str.replace('Z', '+00:00')).date()
-                        
-                        print(f"DEBUG - Schedule: {schedule.get('subject')} on {schedule_date}, Target ({query_type}): {target_date}")
-                        
-                        # Only include if it matches the target date
-                        if schedule_date == target_date:
-                            should_include = True
-                            print(f"DEBUG - Including schedule for {query_type}: {schedule.get('subject')}")
-                        else:
-                            print(f"DEBUG - Excluding schedule (not {query_type}): {schedule.get('subject')} on {schedule_date}")
-                            
-                    except Exception as e:
-                        print(f"DEBUG - Error parsing date {schedule_date_str}: {e}")
-                        continue
-            else:
-                # For casual follow-ups or general queries, use keyword matching
-                if any(keyword in message_lower for keyword in [
-                    schedule.get('subject', '').lower(),
-                    schedule.get('room', '').lower(),
-                    schedule.get('day', '').lower(),
-                    'schedule', 'class', 'subject', 'today', 'tomorrow'
-                ]):
-                    should_include = True
-                    print(f"DEBUG - Including schedule via keyword match: {schedule.get('subject')}")
-            
-            # Include the schedule if it meets our criteria
-            if should_include:
-                # Format times for better display
-                start_time = ChatService.format_time(schedule.get('startTime', 'TBA'))
-                end_time = ChatService.format_time(schedule.get('endTime', 'TBA'))
-                
-                # Include date information in the context
-                schedule_date_str = schedule.get('date', '')
-                if schedule_date_str:
-                    try:
-                        # Parse and format the date for better readability
-                        schedule_date = datetime.fromisoformat(schedule_date_str.replace('Z', '+00:00'))
-                        formatted_date = schedule_date.strftime('%A, %B %d, %Y')
-                        content_with_date = f"{schedule.get('subject')} class on {formatted_date} from {start_time} to {end_time} in room {schedule.get('room')}"
-                    except Exception as e:
-                        # Fallback if date parsing fails
-                        content_with_date = f"{schedule.get('subject')} class from {start_time} to {end_time} in room {schedule.get('room')} (date: {schedule_date_str})"
-                else:
-                    content_with_date = f"{schedule.get('subject')} class from {start_time} to {end_time} in room {schedule.get('room')} (no date specified)"
-                
-                relevant_context.append({
-                    'type': 'schedule',
-                    'content': content_with_date
-                })
-                schedule_matches += 1
-                print(f"DEBUG - Including schedule: {schedule.get('subject')} on {schedule.get('date', 'unknown date')}")
+        # Apply strict date filtering only for direct date queries, not casual follow-ups
+        target_date = None
+        if (today_query or tomorrow_query) and not is_casual_followup:
+            target_date = today_user_tz + timedelta(days=1) if tomorrow_query else today_user_tz
         
-        print(f"DEBUG - Found {schedule_matches} relevant schedules")
+        intents = {'schedule': is_schedule_query, 'task': is_task_query, 'announcement': is_announcement_query}
+        if target_date is not None:
+            # Date-strict questions are about that day: leave out record types the message did not ask for
+            intents = {record_type: (True if intent else None) for record_type, intent in intents.items()}
         
-        # Check tasks - prioritize tasks for assignment-related queries
-        task_matches = 0
-        
-        for task in data['tasks']:
-            # Print first task for debugging
-            if task_matches == 0:
-                print(f"DEBUG - Sample task: {task}")
-            
-            task_keywords = [
-                task.get('title', '').lower(),
-                task.get('class', '').lower(),
-                task.get('type', '').lower(),
-                'task', 'assignment', 'homework', 'project', 'due'
-            ]
-            
-            if any(keyword in message_lower for keyword in task_keywords):
-                due_date = task.get('dueDate', '')
-                status = task.get('status', '')
-                priority = task.get('priority', '')
-                
-                # Format the due date
-                formatted_due_date = ChatService.format_date(due_date)
-                
-                relevant_context.append({
-                    'type': 'task',
-                    'content': f"Assignment: '{task.get('title')}' for {task.get('class')} - Type: {task.get('type')}, Priority: {priority}, Status: {status}, Due: {formatted_due_date}. Description: {task.get('description', '')[:100]}..."
-                })
-                task_matches += 1
-                print(f"DEBUG - Found relevant task: {task.get('title')} for {task.get('class')}")
-        
-        print(f"DEBUG - Found {task_matches} relevant tasks")
-        
-        # Check announcements
-        announcement_matches = 0
-        for announcement in data['announcements']:
-            if any(keyword in message_lower for keyword in [
-                announcement.get('title', '').lower(),
-                'announcement', 'news', 'update'
-            ]):
-                relevant_context.append({
-                    'type': 'announcement',
-                    'content': f"Announcement: {announcement.get('title')} - {announcement.get('description')}"
-                })
-                announcement_matches += 1
-        
-        print(f"DEBUG - Found {announcement_matches} relevant announcements")
-        print(f"DEBUG - Total context items: {len(relevant_context)}")
+        # Assignment queries put tasks ahead of everything else
+        limited_context = ContextManager._rank_records(ContextManager._rank(
+            data, message_lower, today_user_tz, MAX_CONTEXT_ITEMS, intents,
+            task_priority=is_task_query, target_date=target_date
+        ))
         
         # Special handling for "today" or "tomorrow" queries with no results
-        if (today_query or tomorrow_query) and not relevant_context:
+        if (today_query or tomorrow_query) and not limited_context:
             if tomorrow_query:
                 tomorrow_date = (datetime.now() + timedelta(days=1)).strftime('%A, %B %d, %Y')
-                print("DEBUG - Tomorrow query with no results - adding explicit 'no classes tomorrow' context")
-                relevant_context.append({
+                logger.debug("Tomorrow query with no results - adding explicit 'no classes tomorrow' context")
+                limited_context.append({
                     'type': 'schedule',
                     'content': f"No classes scheduled for tomorrow ({tomorrow_date})"
                 })
             else:
                 today_date = datetime.now().strftime('%A, %B %d, %Y')
-                print("DEBUG - Today query with no results - adding explicit 'no classes today' context")
-                relevant_context.append({
+                logger.debug("Today query with no results - adding explicit 'no classes today' context")
+                limited_context.append({
                     'type': 'schedule',
                     'content': f"No classes scheduled for today ({today_date})"
                 })
         
-        # For assignment queries, prioritize task context
-        if is_task_query:
-            # Sort so tasks come first
-            relevant_context.sort(key=lambda x: 0 if x['type'] == 'task' else 1)
-            print("DEBUG - Prioritizing task context for assignment query")
-        
-        limited_context = relevant_context[:15]
-        print(f"DEBUG - Final context items after limit: {len(limited_context)}")
-        for i, item in enumerate(limited_context):
-            print(f"DEBUG - Context item {i+1}: {item['type']} - {item['content'][:100]}...")
+        logger.debug("Final context items after ranking: %d", len(limited_context))
+        return limited_context
+    
+    @staticmethod
+    def _rank(data, message_lower, today, limit, intents, task_priority=False, target_date=None):
+        """
+        Return the best `limit` (score, type, record) candidates, best first.
+        
+        `intents` maps each record type to None (type excluded), False (only
+        text matches) or True (every record of that type is a candidate).
+        """
+        if RETRIEVAL_ENGINE == 'tfidf':
+            return ContextManager._rank_with_tfidf(data, message_lower, today, limit, intents, task_priority, target_date)
+        
+        query_tokens = tokenize(message_lower)
+        text_scores = {
+            record_type: ContextManager._bm25_scores(data, RECORD_COLLECTIONS[record_type], query_tokens)
+            for record_type in RECORD_TYPES if intents[record_type] is not None
+        }
+        best_text_score = max((max(scores.values()) for scores in text_scores.values() if scores), default=0.0)
+        text_floor = max(MIN_TEXT_SCORE, RELATIVE_TEXT_FLOOR * best_text_score)
+        
+        scored = []
+        if intents['schedule'] is not None:
+            scored.extend(ContextManager._score_schedules(data, text_scores['schedule'], text_floor, today, intent=intents['schedule'], target_date=target_date))
+        if intents['task'] is not None:
+            scored.extend(ContextManager._score_tasks(data, text_scores['task'], text_floor, today, intent=intents['task'], priority=task_priority))
+        if intents['announcement'] is not None:
+            scored.extend(ContextManager._score_announcements(data, text_scores['announcement'], text_floor, today, intent=intents['announcement']))
+        
+        ranked = top_k(((score, (record_type, record)) for score, record_type, record in scored), limit)
+        return [(score, record_type, record) for score, (record_type, record) in ranked]
+    
+    @staticmethod
+    def _rank_with_tfidf(data, message_lower, today, limit, intents, task_priority, target_date):
+        """Vectorized equivalent of the BM25 path over the scope's TF-IDF index"""
+        with tfidf_lock:
+            tfidf_index = tfidf_index_for(data.scope)
+            changed = tfidf_index.sync(ContextManager._tfidf_entries(data), data.version)
+            CACHE_REQUESTS.inc(len(tfidf_index) - changed, cache='tfidf_rows', result='hit')
+            CACHE_REQUESTS.inc(changed, cache='tfidf_rows', result='miss')
+            if changed:
+                logger.debug("TF-IDF index refreshed %d of %d records", changed, len(tfidf_index))
+            
+            if not len(tfidf_index):
+                return []
+            
+            text_scores = tfidf_index.scores(message_lower)
+            # Cosine-style scores have no absolute scale; only the relative floor applies
+            text_floor = RELATIVE_TEXT_FLOOR * float(text_scores.max()) if len(text_scores) else 0.0
+            record_types = tfidf_index.features[:, 0]
+            days_away = tfidf_index.features[:, 1] - today.toordinal()
+            is_open = tfidf_index.features[:, 2] > 0
+            
+            scores = np.full(len(tfidf_index), -np.inf)
+            for type_code, record_type in enumerate(RECORD_TYPES):
+                intent = intents[record_type]
+                if intent is None:
+                    continue
+                
+                of_type = record_types == type_code
+                if record_type == 'schedule' and target_date is not None:
+                    # Only include if it matches the target date
+                    candidates = of_type & (days_away == (target_date - today).days)
+                    type_scores = DATE_MATCH_BONUS + text_scores
+                else:
+                    candidates = of_type & (((text_scores > 0) & (text_scores >= text_floor)) | intent)
+                    type_scores = text_scores + (INTENT_BONUS if intent else 0.0)
+                
+                if record_type == 'task':
+                    type_scores = type_scores + (TASK_PRIORITY_BONUS if task_priority else 0.0) + due_date_boost_array(days_away, is_open)
+                else:
+                    type_scores = type_scores + recency_boost_array(days_away)
+                
+                scores = np.where(candidates, type_scores, scores)
+            
+            return [(float(scores[row]),) + tfidf_index.payloads[row] for row in top_k_indices(scores, limit)]
+    
+    @staticmethod
+    def _tfidf_entries(data):
+        """Yield (key, fingerprint, text, payload, features) rows for the TF-IDF index"""
+        for type_code, record_type in enumerate(RECORD_TYPES):
+            for record in getattr(data, RECORD_COLLECTIONS[record_type]):
+                is_open = record_type == 'task' and record.is_open
+                features = (
+                    type_code,
+                    float('nan') if record.date is None else record.date.toordinal(),
+                    1.0 if is_open else 0.0
+                )
+                yield f"{record_type}:{record.id}", record.fingerprint, record.search_text, (record_type, record), features
+    
+    @staticmethod
+    def _rank_records(ranked):
+        """Render ranked (score, type, record) candidates as context items"""
+        context = []
+        for score, record_type, record in ranked:
+            context.append({
+                'type': record_type,
+                'content': ContextManager._render_record(record_type, record),
+                'score': round(score, 3)
+            })
         
-        return limited_context  # Limit to 15 most relevant items
+        if debug_enabled():
+            for i, item in enumerate(context, 1):
+                logger.debug("Context item %d: %s (score %.2f) - %s...", i, item['type'], item['score'], item['content'][:100])
+        return context
+    
+    @staticmethod
+    def _bm25_scores(data, collection, query_tokens):
+        """Score one collection of the snapshot against the query with its cached BM25 index"""
+        if not query_tokens or not getattr(data, collection):
+            return {}
+        return data.bm25(collection).score(query_tokens)
+    
+    @staticmethod
+    def _days_from(record_date, today):
+        """Days between a record's date and today (negative if in the past), or None"""
+        return None if record_date is None else (record_date - today).days
+    
+    @staticmethod
+    def _score_schedules(data, text_scores, text_floor, today, intent=False, target_date=None):
+        """Yield (score, 'schedule', record) candidates; strict to target_date when given"""
+        for index, schedule in enumerate(data.schedules):
+            days_away = ContextManager._days_from(schedule.date, today)
+            text_score = text_scores.get(index, 0.0)
+            
+            if target_date is not None:
+                # Only include if it matches the target date
+                if days_away is None or today + timedelta(days=days_away) != target_date:
+                    continue
+                score = DATE_MATCH_BONUS + text_score
+            elif text_score >= text_floor or intent:
+                score = text_score + (INTENT_BONUS if intent else 0.0)
+            else:
+                continue
+            
+            yield score + recency_boost(days_away), 'schedule', schedule
+    
+    @staticmethod
+    def _score_tasks(data, text_scores, text_floor, today, intent=False, priority=False):
+        """Yield (score, 'task', record) candidates with due-date boosts"""
+        for index, task in enumerate(data.tasks):
+            text_score = text_scores.get(index, 0.0)
+            if text_score < text_floor and not intent:
+                continue
+            
+            score = text_score + (INTENT_BONUS if intent else 0.0) + (TASK_PRIORITY_BONUS if priority else 0.0)
+            days_until_due = ContextManager._days_from(task.date, today)
+            yield score + due_date_boost(days_until_due, task.status), 'task', task
+    
+    @staticmethod
+    def _score_announcements(data, text_scores, text_floor, today, intent=False):
+        """Yield (score, 'announcement', record) candidates with recency boosts"""
+        for index, announcement in enumerate(data.announcements):
+            text_score = text_scores.get(index, 0.0)
+            if text_score < text_floor and not intent:
+                continue
+            
+            score = text_score + (INTENT_BONUS if intent else 0.0)
+            days_ago = ContextManager._days_from(announcement.date, today)
+            yield score + recency_boost(days_ago), 'announcement', announcement
+    
+    @staticmethod
+    def _render_record(record_type, record):
+        """Render a typed record as the context line sent to the model"""
+        if record_type == 'task':
+            formatted_due_date = ChatService.format_date(record.due_text)
+            return f"Assignment: '{record.title}' for {record.class_name} - Type: {record.type}, Priority: {record.priority}, Status: {record.status}, Due: {formatted_due_date}. Description: {(record.description or '')[:100]}..."
+        
+        if record_type == 'announcement':
+            return f"Announcement: {record.title} - {record.description}"
+        
+        # Format times for better display
+        start_time = ChatService.format_time(record.start_time)
+        end_time = ChatService.format_time(record.end_time)
+        
+        # Include date information in the context
+        if record.starts_at:
+            formatted_date = record.starts_at.strftime('%A, %B %d, %Y')
+            return f"{record.subject} class on {formatted_date} from {start_time} to {end_time} in room {record.room}"
+        if record.date_text:
+            # Fallback if date parsing fails
+            return f"{record.subject} class from {start_time} to {end_time} in room {record.room} (date: {record.date_text})"
+        return f"{record.subject} class from {start_time} to {end_time} in room {record.room} (no date specified)"
 
 class ChatService:
     """Handles chat responses using AI or fallbacks"""
@@ -522,29 +892,10 @@ class ChatService:
             return "No due date"
         
         try:
-            # Parse ISO date string
-            date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            
-            # Format as "Sep 30, 2025 at 4:00 PM"
-            formatted_date = date_obj.strftime("%b %d, %Y at %I:%M %p")
-            
-            # Calculate days from now using local dates for comparison
-            now = datetime.now()
-            days_diff = (date_obj.date() - now.date()).days
-            
-            if days_diff == 0:
-                return f"{formatted_date} (Today)"
-            elif days_diff == 1:
-                return f"{formatted_date} (Tomorrow)"
-            elif days_diff == -1:
-                return f"{formatted_date} (Yesterday)"
-            elif days_diff > 1:
-                return f"{formatted_date} (in {days_diff} days)"
-            else:
-                return f"{formatted_date} ({abs(days_diff)} days overdue)"
-                
+            # Format as "Sep 30, 2025 at 4:00 PM (in 3 days)", memoized until local midnight
+            return format_due_date(date_str)
         except Exception as e:
-            print(f"Error formatting date {date_str}: {e}")
+            logger.warning("Error formatting date %s: %s", date_str, e)
             return date_str  # Return original if parsing fails
     
     @staticmethod
@@ -554,191 +905,119 @@ class ChatService:
             return 'TBA'
         
         try:
-            # Parse time string (assuming format like "14:30" or "14:30:00")
-            if ':' in time_str:
-                time_parts = time_str.split(':')
-                hour = int(time_parts[0])
-                minute = int(time_parts[1])
-                
-                # Convert to 12-hour format
-                if hour == 0:
-                    formatted_time = f"12:{minute:02d}AM"
-                elif hour < 12:
-                    formatted_time = f"{hour}:{minute:02d}AM"
-                elif hour == 12:
-                    formatted_time = f"12:{minute:02d}PM"
-                else:
-                    formatted_time = f"{hour - 12}:{minute:02d}PM"
-                
-                return formatted_time
-            else:
-                return time_str  # Return original if not in expected format
-                
+            # "14:30" or "14:30:00" to "2:30PM" (memoized); other formats are returned as-is
+            return format_clock_time(time_str)
         except Exception as e:
-            print(f"Error formatting time {time_str}: {e}")
+            logger.warning("Error formatting time %s: %s", time_str, e)
             return time_str  # Return original if parsing fails
     
     @staticmethod
-    def generate_ai_response(message, context, conversation_history):
+    def generate_ai_response(message, context, conversation_history, conversation_summary=None):
         """Generate response using multi-model fallback chain"""
         if not WORKING_MODELS:
-            print("No AI models available, using rule-based fallback")
+            logger.info("No AI models available, using rule-based fallback")
             return ChatService.generate_fallback_response(message, context), True
         
-        # Build context string with clear structure
-        if not context:
-            context_text = "NO DATA AVAILABLE - The student has no schedules, tasks, or announcements in the database for this query."
-        else:
-            context_sections = []
-            
-            # Group context by type
-            schedules = [c for c in context if c['type'] == 'schedule']
-            tasks = [c for c in context if c['type'] == 'task']
-            announcements = [c for c in context if c['type'] == 'announcement']
-            
-            if schedules:
-                context_sections.append(f"SCHEDULES ({len(schedules)} found):")
-                for i, schedule in enumerate(schedules, 1):
-                    context_sections.append(f"{i}. {schedule['content']}")
-            
-            if tasks:
-                context_sections.append(f"\nTASKS ({len(tasks)} found):")
-                for i, task in enumerate(tasks, 1):
-                    context_sections.append(f"{i}. {task['content']}")
-            
-            if announcements:
-                context_sections.append(f"\nANNOUNCEMENTS ({len(announcements)} found):")
-                for i, announcement in enumerate(announcements, 1):
-                    context_sections.append(f"{i}. {announcement['content']}")
-            
-            context_text = "\n".join(context_sections)
-        
-        print(f"DEBUG - Context being sent to AI ({len(context)} items):")
-        print(f"DEBUG - Context text (first 800 chars):\n{context_text[:800]}...")
-        
-        # Build conversation history
-        history_text = ""
-        if conversation_history:
-            history_text = "\n".join([
-                f"User: {msg['user']}\nAssistant: {msg['assistant']}"
-                for msg in conversation_history[-3:]  # Last 3 exchanges
-            ])
-
-        # Get current date and time in appropriate timezone (Philippines UTC+8 or Eastern Time)
-        def get_user_timezone():
-            """Get current time in appropriate timezone based on user location"""
-            utc_now = datetime.now(timezone.utc)
-            
-            # Default to Philippines timezone (UTC+8) since users are experiencing issues there
-            # Philippines doesn't observe DST, so it's consistently UTC+8
-            philippines_offset = timedelta(hours=8)
-            philippines_time = utc_now.replace(tzinfo=timezone.utc).astimezone(timezone(philippines_offset))
-            
-            # For now, prioritize Philippines time since that's where the issue is occurring
-            # In the future, this could be made configurable per user
-            return philippines_time
+        logger.debug("Context being sent to AI (%d items)", len(context))
         
         current_datetime = get_user_timezone()
         current_date = current_datetime.strftime("%A, %B %d, %Y")
         current_time = current_datetime.strftime("%I:%M %p")
         timezone_info = "PHT"  # Philippines Time (UTC+8)
-
-        # Build prompt
-        prompt_content = f"""
-You are HunniBee, a friendly and helpful academic assistant for a student. You can have normal conversations while also helping with academic information.
-
-Current Date and Time: {current_date} at {current_time} {timezone_info}
-
-Previous conversation:
-{history_text}
-
-AVAILABLE ACADEMIC DATA:
-{context_text}
-
-User's current question: {message}
-
-INSTRUCTIONS:
-- You can engage in normal, friendly conversation about any topic
-- For ACADEMIC QUERIES (schedules, tasks, assignments, announcements): Use information from the "AVAILABLE ACADEMIC DATA" section above
-- The academic data includes complete information with dates, times, and locations - use this information to answer questions
-- For academic data, be accurate and don't invent schedules, tasks, or announcements not listed
-- When answering follow-up questions like "how about tomorrow?" or "what about next class?", look through ALL the academic data provided to find relevant information
-- If you see schedule data in the available academic data, you can discuss it and identify which schedules are for today, tomorrow, or other specific dates
-- For general questions, study tips, motivation, or casual conversation: Respond naturally and helpfully
-- Use a friendly, encouraging tone with appropriate emojis
-- Today is {current_date}
-- Keep responses engaging and helpful
-
-Response:
-"""
-
-        print(f"DEBUG - Full prompt length: {len(prompt_content)} characters")
         
-        # Try each model in the chain
-        for model_config in WORKING_MODELS:
+        # Prompts are built per budget, so models sharing a budget share a prompt
+        prompts_by_budget = {}
+        
+        def messages_for(model_config):
+            budget = model_config.get('prompt_budget', DEFAULT_PROMPT_BUDGET)
+            if budget not in prompts_by_budget:
+                with stage('prompt'):
+                    messages, report = build_prompt(
+                        message, context, conversation_history,
+                        current_date, current_time, timezone_info,
+                        budget=budget, conversation_summary=conversation_summary
+                    )
+                logger.info("Prompt built: ~%d tokens for budget %d", report['total_tokens'], budget, extra={'prompt': report})
+                PROMPT_TOKENS.observe(report['total_tokens'])
+                if has_app_context():
+                    g.prompt_tokens = report['total_tokens']  # Charged to the user's AI budget
+                prompts_by_budget[budget] = messages
+            else:
+                CACHE_REQUESTS.inc(cache='prompt', result='hit')
+            return prompts_by_budget[budget]
+        
+        # Try each model in the chain (copied: a background probe may update the list)
+        for model_config in list(WORKING_MODELS):
+            attempt_started = time.perf_counter()
             try:
-                print(f"🔄 Trying {model_config['name']}...")
+                logger.info("🔄 Trying %s...", model_config['name'])
                 
                 if model_config["provider"] == "personal_llm":
-                    messages = [
-                        {
-                            "role": "system", 
-                            "content": "You are HunniBee, a friendly academic assistant. You can have normal conversations and help with general questions. For academic data (schedules, tasks, announcements), only use provided information and don't invent details."
-                        },
-                        {
-                            "role": "user", 
-                            "content": prompt_content
-                        }
-                    ]
-                    response = call_personal_llm_api(model_config["model"], messages, max_tokens=1500, temperature=0.3)
-                    print(f"✅ {model_config['name']} response received: {len(response)} characters (Personal LLM)")
+                    response = call_personal_llm_api(model_config["model"], messages_for(model_config), max_tokens=1500, temperature=0.3)
+                    logger.info("✅ %s response received: %d characters (Personal LLM)", model_config['name'], len(response))
+                    ChatService._record_model_attempt(model_config, attempt_started, 'success', content=response)
                     return response.strip(), False
                     
                 elif model_config["provider"] == "openrouter":
-                    messages = [
-                        {
-                            "role": "system", 
-                            "content": "You are HunniBee, a friendly academic assistant. You can have normal conversations and help with general questions. For academic data (schedules, tasks, announcements), only use provided information and don't invent details."
-                        },
-                        {
-                            "role": "user", 
-                            "content": prompt_content
-                        }
-                    ]
-                    response = call_openrouter_api(model_config["model"], messages, max_tokens=1500, temperature=0.3)
-                    print(f"✅ {model_config['name']} response received: {len(response)} characters")
+                    response = call_openrouter_api(model_config["model"], messages_for(model_config), max_tokens=1500, temperature=0.3)
+                    logger.info("✅ %s response received: %d characters", model_config['name'], len(response))
+                    ChatService._record_model_attempt(model_config, attempt_started, 'success', content=response)
                     # Remove from throttled list if successful
                     throttled_models.discard(model_config['name'])
                     return response.strip(), False
                 
-                elif model_config["provider"] == "gemini" and gemini_model:
-                    response = gemini_model.generate_content(prompt_content)
-                    print(f"✅ {model_config['name']} response received: {len(response.text)} characters")
+                elif model_config["provider"] == "gemini" and get_gemini_model():
+                    response = get_gemini_model().generate_content(flatten_messages(messages_for(model_config)))
+                    logger.info("✅ %s response received: %d characters", model_config['name'], len(response.text))
+                    ChatService._record_model_attempt(model_config, attempt_started, 'success', content=response.text)
                     # Remove from throttled list if successful
                     throttled_models.discard(model_config['name'])
                     return response.text.strip(), False
                     
+            except PersonalLLMBusy as e:
+                # Saturated, not failing: skip without marking the model throttled
+                logger.info("⏭️ %s overflow - %s", model_config['name'], e)
+                ChatService._record_model_attempt(model_config, attempt_started, 'overflow', error=str(e))
+                continue
             except Exception as e:
                 error_str = str(e)
-                print(f"❌ {model_config['name']} error: {e}")
+                logger.warning("❌ %s error: %s", model_config['name'], e)
                 
                 # Check for throttling errors
                 if "429" in error_str or "quota" in error_str.lower() or "rate limit" in error_str.lower():
-                    print(f"🚨 {model_config['name']} throttled - trying next model")
+                    logger.warning("🚨 %s throttled - trying next model", model_config['name'])
+                    ChatService._record_model_attempt(model_config, attempt_started, 'rate_limited', error=error_str)
                     # Track this model as throttled
                     throttled_models.add(model_config['name'])
                     continue
                 else:
-                    print(f"💥 {model_config['name']} failed - trying next model")
+                    logger.warning("💥 %s failed - trying next model", model_config['name'])
+                    ChatService._record_model_attempt(model_config, attempt_started, 'failure', error=error_str)
                     continue
         
         # All AI models failed, use enhanced fallback
-        print("🚨 All AI models failed or throttled - using enhanced fallback")
+        logger.warning("🚨 All AI models failed or throttled - using enhanced fallback")
+        RULE_BASED_FALLBACKS.inc()
         # Mark all models as potentially throttled if they all failed
         for model in WORKING_MODELS:
             throttled_models.add(model['name'])
         return ChatService.generate_throttled_response(message, context), True
     
+    @staticmethod
+    def _record_model_attempt(model_config, started, outcome, content=None, error=None):
+        """Record latency and outcome of one attempt in the fallback chain"""
+        elapsed = time.perf_counter() - started
+        capture_model_call(model_config['name'], outcome, elapsed, content, error)
+        record_stage('model', elapsed, desc=f"{model_config['name']}: {outcome}")
+        MODEL_LATENCY_SECONDS.observe(elapsed, model=model_config['model'])
+        MODEL_REQUESTS.inc(model=model_config['model'], outcome=outcome)
+        if outcome == 'success':
+            model_health.success(model_config['name'], elapsed)
+        elif outcome != 'overflow':
+            model_health.failure(model_config['name'], error or outcome, elapsed)
+        if outcome != 'success':
+            MODEL_FALLBACKS.inc(model=model_config['model'])
+    
     @staticmethod
     def generate_throttled_response(message, context):
         """Generate response when AI service is throttled"""
@@ -813,223 +1092,33 @@ Response:
     @staticmethod
     def format_weekly_schedule_response(context):
         """Format weekly schedule response with day-by-day breakdown for CURRENT WEEK ONLY"""
-        # Get fresh schedule data to properly organize by day
-        try:
-            user_data = ContextManager.fetch_user_data()
-            raw_schedules = user_data.get('schedules', [])
-        except Exception as e:
-            print(f"Error fetching fresh schedule data: {e}")
-            raw_schedules = []
-        
-        # Get current week date range using appropriate timezone (Philippines UTC+8)
-        def get_user_timezone():
-            """Get current time in appropriate timezone based on user location"""
-            utc_now = datetime.now(timezone.utc)
-            
-            # Default to Philippines timezone (UTC+8) since users are experiencing issues there
-            # Philippines doesn't observe DST, so it's consistently UTC+8
-            philippines_offset = timedelta(hours=8)
-            philippines_time = utc_now.replace(tzinfo=timezone.utc).astimezone(timezone(philippines_offset))
-            
-            return philippines_time
-        
-        today = get_user_timezone()
-        
-        # Find Monday of current week
-        days_since_monday = today.weekday()  # Monday is 0
-        monday = today - timedelta(days=days_since_monday)
-        sunday = monday + timedelta(days=6)
-        
-        week_range = f"{monday.strftime('%B %d')} - {sunday.strftime('%B %d, %Y')}"
-        print(f"DEBUG - Current week range: {monday.date()} to {sunday.date()}")
-        
-        # Filter schedules to only include those from the current week
-        current_week_schedules = []
-        for schedule in raw_schedules:
-            schedule_date_str = schedule.get('date', '')
-            if schedule_date_str:
-                try:
-                    # Parse ISO date string and convert to date
-                    schedule_date = datetime.fromisoformat(schedule_date_str.replace('Z', '+00:00')).date()
-                    
-                    # Check if this schedule falls within the current week
-                    if monday.date() <= schedule_date <= sunday.date():
-                        current_week_schedules.append(schedule)
-                        print(f"DEBUG - Including schedule: {schedule.get('subject')} on {schedule_date} (current week)")
-                    else:
-                        print(f"DEBUG - Excluding schedule: {schedule.get('subject')} on {schedule_date} (not current week)")
-                        
-                except Exception as e:
-                    print(f"DEBUG - Error parsing schedule date {schedule_date_str}: {e}")
-                    # If we can't parse the date, try to match by day name as fallback
-                    schedule_day = schedule.get('day', '').strip()
-                    if schedule_day:
-                        print(f"DEBUG - Fallback: trying to match by day name '{schedule_day}' for {schedule.get('subject')}")
-                        # Only include if we can't determine the date, but this is risky
-                        # Better to exclude uncertain schedules for weekly view
-        
-        print(f"DEBUG - Found {len(current_week_schedules)} schedules for current week out of {len(raw_schedules)} total")
-        
-        response_parts = [f"📅 **Your Schedule This Week**"]
-        response_parts.append(f"*Week of {week_range}*")
-        response_parts.append("")
-        
-        # Group schedules by day for the current week
-        days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        schedule_by_day = {day: [] for day in days_of_week}
-        
-        # Organize current week schedules by day
-        for schedule in current_week_schedules:
-            schedule_date_str = schedule.get('date', '')
-            if schedule_date_str:
-                try:
-                    # Parse ISO date string and get day name
-                    schedule_date = datetime.fromisoformat(schedule_date_str.replace('Z', '+00:00'))
-                    schedule_day = schedule_date.strftime('%A')  # Gets day name like "Monday"
-                    
-                    # Format times for better display
-                    start_time = ChatService.format_time(schedule.get('startTime', 'TBA'))
-                    end_time = ChatService.format_time(schedule.get('endTime', 'TBA'))
-                    
-                    # Format the schedule entry
-                    schedule_entry = f"{schedule.get('subject', 'Unknown Class')} from {start_time} to {end_time} in room {schedule.get('room', 'TBA')}"
-                    schedule_by_day[schedule_day].append(schedule_entry)
-                    print(f"DEBUG - Assigned {schedule.get('subject')} to {schedule_day}")
-                    
-                except Exception as e:
-                    print(f"DEBUG - Error processing schedule date {schedule_date_str}: {e}")
-        
-        # Display each day - show "No classes scheduled" for empty days
-        for day in days_of_week:
-            if schedule_by_day[day]:
-                response_parts.append(f"**{day}:**")
-                for schedule in schedule_by_day[day]:
-                    response_parts.append(f"  • {schedule}")
-                response_parts.append("")
-            else:
-                response_parts.append(f"**{day}:** No classes scheduled")
-                response_parts.append("")
-        
-        # If no schedules found for the entire week, add a helpful note
-        if not current_week_schedules:
-            response_parts.append("🎉 **You have a free week!** No classes scheduled for this week.")
-            response_parts.append("")
-            response_parts.append("💡 *Tip: Use this time to catch up on assignments or prepare for upcoming classes.*")
-        
-        return "\n".join(response_parts).strip()
+        return ChatService.format_week_schedule_response(0)
     
     @staticmethod
     def format_next_week_schedule_response(context):
         """Format next week schedule response with day-by-day breakdown for NEXT WEEK ONLY"""
-        # Get fresh schedule data to properly organize by day
+        return ChatService.format_week_schedule_response(1)
+    
+    @staticmethod
+    def format_week_schedule_response(week_offset=0):
+        """Day-by-day schedule for the week `week_offset` weeks from the current one, cached per snapshot"""
         try:
-            user_data = ContextManager.fetch_user_data()
-            raw_schedules = user_data.get('schedules', [])
+            snapshot = ContextManager.fetch_user_data()
         except Exception as e:
-            print(f"Error fetching fresh schedule data: {e}")
-            raw_schedules = []
-        
-        # Get next week date range using appropriate timezone (Philippines UTC+8)
-        def get_user_timezone():
-            """Get current time in appropriate timezone based on user location"""
-            utc_now = datetime.now(timezone.utc)
-            
-            # Default to Philippines timezone (UTC+8) since users are experiencing issues there
-            # Philippines doesn't observe DST, so it's consistently UTC+8
-            philippines_offset = timedelta(hours=8)
-            philippines_time = utc_now.replace(tzinfo=timezone.utc).astimezone(timezone(philippines_offset))
-            
-            return philippines_time
-        
-        today = get_user_timezone()
-        
-        # Find Monday of current week, then add 7 days for next week
-        days_since_monday = today.weekday()  # Monday is 0
-        current_monday = today - timedelta(days=days_since_monday)
-        next_monday = current_monday + timedelta(days=7)
-        next_sunday = next_monday + timedelta(days=6)
-        
-        week_range = f"{next_monday.strftime('%B %d')} - {next_sunday.strftime('%B %d, %Y')}"
-        print(f"DEBUG - Next week range: {next_monday.date()} to {next_sunday.date()}")
-        
-        # Filter schedules to only include those from next week
-        next_week_schedules = []
-        for schedule in raw_schedules:
-            schedule_date_str = schedule.get('date', '')
-            if schedule_date_str:
-                try:
-                    # Parse ISO date string and convert to date
-                    schedule_date = datetime.fromisoformat(schedule_date_str.replace('Z', '+00:00')).date()
-                    
-                    # Check if this schedule falls within next week
-                    if next_monday.date() <= schedule_date <= next_sunday.date():
-                        next_week_schedules.append(schedule)
-                        print(f"DEBUG - Including schedule: {schedule.get('subject')} on {schedule_date} (next week)")
-                    else:
-                        print(f"DEBUG - Excluding schedule: {schedule.get('subject')} on {schedule_date} (not next week)")
-                        
-                except Exception as e:
-                    print(f"DEBUG - Error parsing schedule date {schedule_date_str}: {e}")
-        
-        print(f"DEBUG - Found {len(next_week_schedules)} schedules for next week out of {len(raw_schedules)} total")
-        
-        response_parts = [f"📅 **Your Schedule Next Week**"]
-        response_parts.append(f"*Week of {week_range}*")
-        response_parts.append("")
-        
-        # Group schedules by day for next week
-        days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        schedule_by_day = {day: [] for day in days_of_week}
-        
-        # Organize next week schedules by day
-        for schedule in next_week_schedules:
-            schedule_date_str = schedule.get('date', '')
-            if schedule_date_str:
-                try:
-                    # Parse ISO date string and get day name
-                    schedule_date = datetime.fromisoformat(schedule_date_str.replace('Z', '+00:00'))
-                    schedule_day = schedule_date.strftime('%A')  # Gets day name like "Monday"
-                    
-                    # Format times for better display
-                    start_time = ChatService.format_time(schedule.get('startTime', 'TBA'))
-                    end_time = ChatService.format_time(schedule.get('endTime', 'TBA'))
-                    
-                    # Format the schedule entry
-                    schedule_entry = f"{schedule.get('subject', 'Unknown Class')} from {start_time} to {end_time} in room {schedule.get('room', 'TBA')}"
-                    schedule_by_day[schedule_day].append(schedule_entry)
-                    print(f"DEBUG - Assigned {schedule.get('subject')} to {schedule_day}")
-                    
-                except Exception as e:
-                    print(f"DEBUG - Error processing schedule date {schedule_date_str}: {e}")
-        
-        # Display each day - show "No classes scheduled" for empty days
-        for day in days_of_week:
-            if schedule_by_day[day]:
-                response_parts.append(f"**{day}:**")
-                for schedule in schedule_by_day[day]:
-                    response_parts.append(f"  • {schedule}")
-                response_parts.append("")
-            else:
-                response_parts.append(f"**{day}:** No classes scheduled")
-                response_parts.append("")
-        
-        # If no schedules found for the entire week, add a helpful note
-        if not next_week_schedules:
-            response_parts.append("🎉 **You have a free week ahead!** No classes scheduled for next week.")
-            response_parts.append("")
-            response_parts.append("💡 *Tip: Perfect time to plan ahead or work on long-term projects.*")
+            logger.error("Error fetching fresh schedule data: %s", e)
+            snapshot = Snapshot()
         
-        return "\n".join(response_parts).strip()
+        # Weeks run Monday-Sunday in the user's timezone (Philippines UTC+8)
+        return week_views.view(snapshot, get_user_timezone().date(), week_offset)
     
     @staticmethod
     def format_tasks_response(context):
         """Format tasks response showing up to 3 tasks with navigation hint"""
         # Get fresh task data to properly format dates
         try:
-            user_data = ContextManager.fetch_user_data()
-            raw_tasks = user_data.get('tasks', [])
+            raw_tasks = ContextManager.fetch_user_data().tasks
         except Exception as e:
-            print(f"Error fetching fresh task data: {e}")
+            logger.error("Error fetching fresh task data: %s", e)
             raw_tasks = []
         
         if not raw_tasks:
@@ -1040,15 +1129,14 @@ Response:
         
         # Show up to 3 tasks with properly formatted layout
         for i, task in enumerate(raw_tasks[:3], 1):
-            due_date = task.get('dueDate', '')
-            formatted_due_date = ChatService.format_date(due_date)
+            formatted_due_date = ChatService.format_date(task.due_text)
             
             # Create a clean, multi-line format for each task
-            task_title = task.get('title', 'Untitled')
-            task_class = task.get('class', 'Unknown Class')
-            task_type = task.get('type', 'N/A')
-            task_priority = task.get('priority', 'N/A')
-            task_status = task.get('status', 'N/A')
+            task_title = task.title or 'Untitled'
+            task_class = task.class_name or 'Unknown Class'
+            task_type = task.type or 'N/A'
+            task_priority = task.priority or 'N/A'
+            task_status = task.status or 'N/A'
             
             response_parts.append(f"**{i}. {task_title}**")
             response_parts.append(f"   📚 **Class:** {task_class}")
@@ -1056,7 +1144,7 @@ Response:
             response_parts.append(f"   📅 **Due:** {formatted_due_date}")
             
             # Add description if available
-            description = task.get('description', '')
+            description = task.description
             if description:
                 # Truncate description and format nicely
                 desc_text = description[:80] + ('...' if len(description) > 80 else '')
@@ -1095,20 +1183,46 @@ Response:
         
         return "\n".join(response_parts)
 
+process_started = time.time()
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """Process is up and serving; answered from process state without touching any upstream"""
+    return jsonify({'status': 'alive', 'service': 'chat-service', 'uptime_seconds': round(time.time() - process_started, 1)})
+
+def model_states():
+    """Per-model state (working, throttled or unavailable after a failed probe) with cached call health"""
+    working = {model['name'] for model in WORKING_MODELS}
+    states = {}
+    for model in AVAILABLE_MODELS:
+        if model['name'] not in working:
+            state = 'unavailable'
+        elif model['name'] in throttled_models:
+            state = 'throttled'
+        else:
+            state = 'working'
+        states[model['name']] = {'state': state, **model_health.describe(model['name'])}
+    return states
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    """Ready once startup finished and Node is not failing; 503 otherwise (cached state only)"""
+    node_state = upstream_health.state('node')
+    ready = app_started and node_state != 'failing'
+    return jsonify({
+        'ready': ready,
+        'started': app_started,
+        'node': node_state,
+        'upstreams': upstream_health.as_dict(),
+        'warmup': warmup_scheduler.status()
+    }), 200 if ready else 503
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    global last_throttle_check
-    
-    # Test basic service functionality (database connectivity)
-    try:
-        # Test if we can fetch data (core service functionality)
-        test_data = ContextManager.fetch_user_data()
-        service_functional = True
-        service_error = None
-    except Exception as e:
-        service_functional = False
-        service_error = str(e)
+    """Health check endpoint, served from cached upstream state (refreshed by traffic and the warmup probes)"""
+    # Core functionality depends on Node; 'unknown' (not checked yet) is not treated as broken
+    service_functional = upstream_health.state('node') != 'failing'
+    service_error = None if service_functional else upstream_health.last_error('node')
     
     # Check available models (not forced anymore)
     available_models = [model for model in WORKING_MODELS if model['name'] not in throttled_models]
@@ -1140,196 +1254,542 @@ def health_check():
         'working_models': [model['name'] for model in available_models],
         'throttled_models': list(throttled_models),
         'service_functional': service_functional,
-        'service_error': service_error
+        'service_error': service_error,
+        'upstreams': upstream_health.as_dict(),
+        'models': model_states()
     })
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    """Main chat endpoint"""
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics endpoint"""
+    return REGISTRY.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# On-demand profiling: admins send X-Profile-Token (or ?profile_token=) with
+# PROFILE_ADMIN_TOKEN; PROFILE_SAMPLE_ALL=true samples every /chat request
+PROFILE_ADMIN_TOKEN = os.getenv('PROFILE_ADMIN_TOKEN')
+PROFILE_SAMPLE_ALL = os.getenv('PROFILE_SAMPLE_ALL', 'false').lower() == 'true'
+profile_store = ProfileStore(capacity=int(os.getenv('PROFILE_SLOWEST_N', 20)), directory=os.getenv('PROFILE_DIR'))
+
+def is_admin_request():
+    """Whether the request carries the profiling admin token"""
+    token = request.headers.get('X-Profile-Token') or request.args.get('profile_token')
+    return bool(PROFILE_ADMIN_TOKEN and token and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN))
+
+def profiled(view):
+    """Run the view under a profiler when an admin asks for it (or when sampling everything)"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        requested = is_admin_request()
+        if not requested and not PROFILE_SAMPLE_ALL:
+            return view(*args, **kwargs)
+        
+        mode = request.headers.get('X-Profile-Mode') or request.args.get('profile', 'sample')
+        if mode not in PROFILE_MODES:
+            mode = 'sample'
+        
+        started = time.perf_counter()
+        result, profile_text, mode = profile_call(lambda: view(*args, **kwargs), mode)
+        duration_ms = (time.perf_counter() - started) * 1000
+        
+        body = request.get_json(silent=True) or {}
+        label = f"{request.path} {str(body.get('message', ''))[:60]}"
+        profile_id = profile_store.add(duration_ms, mode, profile_text, label=label, requested=requested)
+        
+        response = app.make_response(result)
+        if requested:
+            response.headers['X-Profile-ID'] = profile_id
+        return response
+    return wrapper
+
+def captured(view):
+    """Write the request, its data snapshot, model calls and response to the capture log"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if traffic_recorder is None:
+            return view(*args, **kwargs)
+        
+        body = request.get_json(silent=True) or {}
+        traffic_recorder.begin(
+            request_id=current_request_id(),
+            user_id=body.get('user_id', 'anonymous'),
+            message=body.get('message', ''),
+            mode=body.get('mode', 'auto'),
+            chain=[model['name'] for model in WORKING_MODELS]
+        )
+        response = app.make_response(view(*args, **kwargs))
+        traffic_recorder.finish(response.status_code, response.get_json(silent=True))
+        return response
+    return wrapper
+
+@app.route('/debug/profiles', methods=['GET'])
+def list_profiles():
+    """Slowest profiled requests (admin only)"""
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({'profiles': profile_store.summaries()})
+
+@app.route('/debug/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Raw profile as collapsed stacks or pstats text (admin only)"""
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    entry = profile_store.get(profile_id)
+    if not entry:
+        return jsonify({'error': 'Profile not found'}), 404
+    return entry['profile'], 200, {'Content-Type': 'text/plain; charset=utf-8', 'X-Profile-Format': entry['format']}
+
+def traced_json(payload, include_timings=False):
+    """Serialize a /chat payload as a traced stage, optionally embedding the stage timings"""
+    trace = current_trace()
+    if include_timings and trace is not None:
+        payload['timings'] = trace.as_dict()
+    with stage('serialize'):
+        return jsonify(payload)
+
+# Speculative prefetch: chat_action buttons predict the next message, which is
+# prepared in the background from the same snapshot (PREFETCH=off disables)
+PREFETCH = os.getenv('PREFETCH', 'on').lower() != 'off'
+speculative_cache = SpeculativeCache(ttl=float(os.getenv('PREFETCH_TTL', 60)))
+prefetcher = Prefetcher(
+    max_in_flight=int(os.getenv('PREFETCH_MAX_IN_FLIGHT', 1)),
+    per_minute=int(os.getenv('PREFETCH_PER_MINUTE', 30)),
+    max_active_requests=int(os.getenv('PREFETCH_MAX_ACTIVE_REQUESTS', 1)),  # 1: only the request offering the button
+    active_requests=lambda: active_requests,
+    on_outcome=lambda outcome: PREFETCH_RUNS.inc(outcome=outcome)
+)
+
+# Fair sharing of the AI path: per-user request/token budgets per window
+# (over budget -> Smart Mode) and weighted fair queuing for generation slots
+AI_QUOTAS = os.getenv('AI_QUOTAS', 'on').lower() != 'off'
+usage_ledger = UsageLedger(
+    window=float(os.getenv('AI_QUOTA_WINDOW', 3600)),
+    max_requests=int(os.getenv('AI_REQUESTS_PER_WINDOW', 30)),
+    max_tokens=int(os.getenv('AI_TOKENS_PER_WINDOW', 60000))
+)
+ai_scheduler = FairScheduler(
+    concurrency=int(os.getenv('AI_CONCURRENCY', 4)),
+    max_wait=float(os.getenv('AI_QUEUE_MAX_WAIT', 20)),
+    weights=parse_weights(os.getenv('AI_USER_WEIGHTS', ''))  # e.g. "teacher=4,anonymous=0.5"
+)
+gauge('chat_ai_in_flight', 'AI generations holding a fair-queue slot', function=lambda: ai_scheduler.in_flight)
+gauge('chat_ai_queued', 'AI requests waiting for a fair-queue slot', function=lambda: ai_scheduler.waiting)
+
+def admit_ai_request(user_id):
+    """Count an AI request against the user's budget; False if they are over it and get Smart Mode"""
+    if not AI_QUOTAS:
+        return True
+    refusal = usage_ledger.admit(user_id)
+    AI_ADMISSIONS.inc(outcome=refusal or 'admitted')
+    if refusal:
+        logger.info("AI budget exhausted (%s) - answering in Smart Mode", refusal, extra={'user_id': user_id})
+        return False
+    return True
+
+def scheduled_ai_response(user_id, message, context, conversation_history, conversation_summary):
+    """generate_ai_response behind the fair queue; returns (response, is_fallback, actual_mode)"""
+    estimated_tokens = SYSTEM_PROMPT_TOKENS + estimate_tokens(message) + sum(estimate_tokens(item['content']) for item in context)
+    g.pop('prompt_tokens', None)  # Batch items share an app context
     try:
-        data = request.get_json()
-        message = data.get('message', '').strip()
-        user_id = data.get('user_id', 'anonymous')
-        requested_mode = data.get('mode', 'auto') 
-        
-        if not message:
-            return jsonify({'error': 'Message is required'}), 400
-        
-        print(f"DEBUG - Chat request: mode='{requested_mode}', message='{message[:50]}...'")
-        
-        # Check for generic greetings and respond as a bee character
+        with ai_scheduler.slot(user_id, cost=estimated_tokens) as waited:
+            AI_QUEUE_WAIT_SECONDS.observe(waited)
+            response, is_fallback = ChatService.generate_ai_response(message, context, conversation_history, conversation_summary)
+    except FairQueueTimeout as e:
+        AI_ADMISSIONS.inc(outcome='queue_timeout')
+        logger.warning("%s - answering in Smart Mode", e, extra={'user_id': user_id})
+        return ChatService.generate_fallback_response(message, context), True, 'smart_mode'
+    if AI_QUOTAS and not is_fallback:
+        used = g.get('prompt_tokens', estimated_tokens) + estimate_tokens(response)
+        usage_ledger.charge(user_id, used)
+        AI_TOKENS.inc(used)
+    return response, is_fallback, 'ai_enhanced'
+
+def prefetch_key(user_id, message):
+    return (user_id, message.lower().strip())
+
+def prepare_follow_up(user_id, message, snapshot):
+    """Select context for a predicted message and render its Smart Mode answer (warming the view caches)"""
+    with app.app_context():
+        g.user_data = snapshot
+        context = ContextManager.find_relevant_context(message, snapshot)
+        ChatService.generate_fallback_response(message, context)
+    speculative_cache.put(prefetch_key(user_id, message), (snapshot, context), snapshot.version)
+
+def speculate_follow_ups(user_id, navigation_actions, snapshot):
+    for action in navigation_actions:
+        if action.get('type') == 'chat_action' and action.get('message'):
+            if prefetch_key(user_id, action['message']) in speculative_cache:
+                continue
+            prefetcher.submit(functools.partial(prepare_follow_up, user_id, action['message'], snapshot), logger)
+
+CHAT_ERROR_RESPONSE = "I'm sorry, I'm having trouble processing your request right now. Please try again in a moment."
+
+def process_chat(message, user_id, requested_mode):
+    """Run one message through the chat pipeline and return the response payload"""
+    logger.info("Chat request: mode=%s", requested_mode, extra={'user_id': user_id, 'message_chars': len(message)})
+    
+    # Check for generic greetings and respond as a bee character
+    with stage('intent'):
         message_lower = message.lower().strip()
         generic_greetings = [
             'hi', 'hello', 'hey', 'hiya', 'yo', 'sup', 'wassup', 
             'good morning', 'good afternoon', 'good evening',
             'greetings', 'howdy', 'what\'s up', 'whats up'
         ]
-        
-        if message_lower in generic_greetings or any(greeting in message_lower for greeting in ['hi there', 'hello there']):
-            # Get current time for time-based greeting
-            current_hour = datetime.now().hour
-            if 5 <= current_hour < 12:
-                time_greeting = "Good morning"
-            elif 12 <= current_hour < 17:
-                time_greeting = "Good afternoon"
-            elif 17 <= current_hour < 21:
-                time_greeting = "Good evening"
-            else:
-                time_greeting = "Hello"
-                
-            bee_response = f"{time_greeting}! 🐝 *Buzz buzz!* I'm HunniBee, your busy little academic assistant! I've been buzzing around collecting all the sweet information about your classes, tasks, and announcements.\n\nI'm here to help you stay organized and make your academic life as smooth as honey! 🍯 What can I help you with today? Need to know about:\n\n• 📅 Your class schedule\n• 📚 Upcoming assignments and tasks\n• 📢 Important announcements\n\nJust ask away, and I'll bee right on it! 🐝✨"
-            
-            # Store conversation
-            if user_id not in conversations:
-                conversations[user_id] = []
-            
-            conversations[user_id].append({
-                'user': message,
-                'assistant': bee_response,
-                'timestamp': datetime.now().isoformat(),
-                'context_used': 0
-            })
+        is_greeting = message_lower in generic_greetings or any(greeting in message_lower for greeting in ['hi there', 'hello there'])
+    
+    if is_greeting:
+        # Get current time for time-based greeting
+        current_hour = datetime.now().hour
+        if 5 <= current_hour < 12:
+            time_greeting = "Good morning"
+        elif 12 <= current_hour < 17:
+            time_greeting = "Good afternoon"
+        elif 17 <= current_hour < 21:
+            time_greeting = "Good evening"
+        else:
+            time_greeting = "Hello"
             
-            return jsonify({
-                'response': bee_response,
-                'context_items_used': 0,
-                'ai_powered': False,
-                'is_throttled': False,
-                'model_used': 'Bee Character Response',
-                'timestamp': datetime.now().isoformat()
-            })
-        
-        # Get conversation history
-        conversation_history = conversations.get(user_id, [])
+        bee_response = f"{time_greeting}! 🐝 *Buzz buzz!* I'm HunniBee, your busy little academic assistant! I've been buzzing around collecting all the sweet information about your classes, tasks, and announcements.\n\nI'm here to help you stay organized and make your academic life as smooth as honey! 🍯 What can I help you with today? Need to know about:\n\n• 📅 Your class schedule\n• 📚 Upcoming assignments and tasks\n• 📢 Important announcements\n\nJust ask away, and I'll bee right on it! 🐝✨"
         
+        # Store conversation
+        record_exchange(user_id, message, bee_response, 0)
+        
+        return {
+            'response': bee_response,
+            'context_items_used': 0,
+            'ai_powered': False,
+            'is_throttled': False,
+            'model_used': 'Bee Character Response',
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    # Get conversation history (older turns replaced by a rolling summary in summary mode)
+    conversation_history = conversations.get(user_id, [])
+    conversation_summary = None
+    if CONVERSATION_MEMORY == 'summary':
+        conversation_summary, conversation_history = conversation_memory.for_prompt(user_id, conversation_history)
+    
+    # A predicted follow-up (e.g. the "See Next Week" button) may already be prepared
+    speculated = None
+    if PREFETCH and 'user_data' not in g and not capture_active():
+        # Dropped if a fetch since has seen the user's data change
+        speculated = speculative_cache.take(prefetch_key(user_id, message), record_cache.last_version(data_scope(user_id)))
+        CACHE_REQUESTS.inc(cache='prefetch', result='hit' if speculated else 'miss')
+    
+    if speculated:
+        g.user_data, context = speculated
+        user_data = g.user_data
+    else:
         # Fetch user data from Node.js API
-        user_data = ContextManager.fetch_user_data()
+        user_data = ContextManager.fetch_user_data(user_id)
         
         # Find relevant context
-        context = ContextManager.find_relevant_context(message, user_data)
-        
-        # Determine which mode to use based on client request and server capabilities
-        available_models = [model for model in WORKING_MODELS if model['name'] not in throttled_models]
-        
-        # ! Force specific mode behavior based on client selection
-        if requested_mode == 'smart_mode':
-            # Client explicitly requested Smart Mode - use structured responses
-            print("DEBUG - Client requested Smart Mode - using structured responses")
-            response = ChatService.generate_fallback_response(message, context)
-            is_fallback = True
-            actual_mode = 'smart_mode'
-        elif requested_mode == 'ai_enhanced' and available_models:
-            # Client requested AI Enhanced and we have working models
-            print("DEBUG - Client requested AI Enhanced - using AI")
-            response, is_fallback = ChatService.generate_ai_response(message, context, conversation_history)
-            actual_mode = 'ai_enhanced'
-        elif requested_mode == 'ai_enhanced' and not available_models:
-            # Client requested AI Enhanced but no models available - fallback to Smart Mode
-            print("DEBUG - Client requested AI Enhanced but no models available - falling back to Smart Mode")
+        with CONTEXT_SELECTION_SECONDS.time(), stage('context'):
+            context = ContextManager.find_relevant_context(message, user_data)
+    capture_context(context)
+    
+    # Determine which mode to use based on client request and server capabilities
+    available_models = [model for model in WORKING_MODELS if model['name'] not in throttled_models]
+    quota_exceeded = False
+    if requested_mode != 'smart_mode' and available_models and not admit_ai_request(user_id):
+        available_models = []  # Over budget: answered in Smart Mode below
+        quota_exceeded = True
+    
+    # ! Force specific mode behavior based on client selection
+    if requested_mode == 'smart_mode':
+        # Client explicitly requested Smart Mode - use structured responses
+        logger.debug("Client requested Smart Mode - using structured responses")
+        response = ChatService.generate_fallback_response(message, context)
+        is_fallback = True
+        actual_mode = 'smart_mode'
+    elif requested_mode == 'ai_enhanced' and available_models:
+        # Client requested AI Enhanced and we have working models
+        logger.debug("Client requested AI Enhanced - using AI")
+        response, is_fallback, actual_mode = scheduled_ai_response(user_id, message, context, conversation_history, conversation_summary)
+    elif requested_mode == 'ai_enhanced' and not available_models:
+        # Client requested AI Enhanced but no models available - fallback to Smart Mode
+        logger.info("Client requested AI Enhanced but no models available - falling back to Smart Mode")
+        response = ChatService.generate_fallback_response(message, context)
+        is_fallback = True
+        actual_mode = 'smart_mode'
+    else:
+        # Auto mode or unknown mode - use server logic
+        logger.debug("Auto mode or unknown - using server logic")
+        if available_models:
+            # Try AI first
+            response, is_fallback, actual_mode = scheduled_ai_response(user_id, message, context, conversation_history, conversation_summary)
+        else:
+            # Use Smart Mode fallback
             response = ChatService.generate_fallback_response(message, context)
             is_fallback = True
             actual_mode = 'smart_mode'
-        else:
-            # Auto mode or unknown mode - use server logic
-            print("DEBUG - Auto mode or unknown - using server logic")
-            if available_models:
-                # Try AI first
-                response, is_fallback = ChatService.generate_ai_response(message, context, conversation_history)
-                actual_mode = 'ai_enhanced'
-            else:
-                # Use Smart Mode fallback
-                response = ChatService.generate_fallback_response(message, context)
-                is_fallback = True
-                actual_mode = 'smart_mode'
-        
-        # Store conversation
-        if user_id not in conversations:
-            conversations[user_id] = []
-        
-        conversations[user_id].append({
-            'user': message,
-            'assistant': response,
-            'timestamp': datetime.now().isoformat(),
-            'context_used': len(context)
-        })
-        
-        # Keep only last 10 exchanges per user
-        if len(conversations[user_id]) > 10:
-            conversations[user_id] = conversations[user_id][-10:]
-        
-        # Determine if this is a Smart Mode button action for navigation
-        navigation_action = None
-        navigation_actions = []  # Support multiple navigation actions
-        message_lower = message.lower().strip()
-        if ('show my schedules for this week' in message_lower or 
-            'schedules for this week' in message_lower):
-            # For current week schedule, provide both "View Full Schedule" and "See Next Week" actions
-            navigation_actions = [
-                {
-                    'type': 'navigate',
-                    'action': 'schedule',
-                    'label': '📅 View Full Schedule',
-                    'url': '/#weekly'
-                },
-                {
-                    'type': 'chat_action',
-                    'action': 'next_week_schedule',
-                    'label': '📆 See Next Week',
-                    'message': 'Show my schedules for next week'
-                }
-            ]
-            # Keep single navigation_action for backward compatibility
-            navigation_action = navigation_actions[0]
-        elif ('show my schedules for next week' in message_lower or 
-              'schedules for next week' in message_lower):
-            navigation_action = {
+    
+    # Store conversation
+    record_exchange(user_id, message, response, len(context))
+    
+    # Determine if this is a Smart Mode button action for navigation
+    navigation_action = None
+    navigation_actions = []  # Support multiple navigation actions
+    message_lower = message.lower().strip()
+    if ('show my schedules for this week' in message_lower or 
+        'schedules for this week' in message_lower):
+        # For current week schedule, provide both "View Full Schedule" and "See Next Week" actions
+        navigation_actions = [
+            {
                 'type': 'navigate',
-                'action': 'next_week_schedule',
+                'action': 'schedule',
                 'label': '📅 View Full Schedule',
                 'url': '/#weekly'
+            },
+            {
+                'type': 'chat_action',
+                'action': 'next_week_schedule',
+                'label': '📆 See Next Week',
+                'message': 'Show my schedules for next week'
             }
-        elif ('show my tasks' in message_lower or 'show tasks' in message_lower):
-            navigation_action = {
-                'type': 'navigate',
-                'action': 'tasks',
-                'label': '📚 View All Tasks',
-                'url': '/#tasks' 
-            }
-        elif 'show announcements' in message_lower:
-            navigation_action = {
-                'type': 'navigate',
-                'action': 'announcements',
-                'label': '📢 View All Announcements',
-                'url': '/#announcements'  # Changed from /#dashboard to /#announcements
-            }
+        ]
+        # Keep single navigation_action for backward compatibility
+        navigation_action = navigation_actions[0]
+    elif ('show my schedules for next week' in message_lower or 
+          'schedules for next week' in message_lower):
+        navigation_action = {
+            'type': 'navigate',
+            'action': 'next_week_schedule',
+            'label': '📅 View Full Schedule',
+            'url': '/#weekly'
+        }
+    elif ('show my tasks' in message_lower or 'show tasks' in message_lower):
+        navigation_action = {
+            'type': 'navigate',
+            'action': 'tasks',
+            'label': '📚 View All Tasks',
+            'url': '/#tasks' 
+        }
+    elif 'show announcements' in message_lower:
+        navigation_action = {
+            'type': 'navigate',
+            'action': 'announcements',
+            'label': '📢 View All Announcements',
+            'url': '/#announcements'  # Changed from /#dashboard to /#announcements
+        }
+    
+    if PREFETCH and navigation_actions:
+        speculate_follow_ups(user_id, navigation_actions, user_data)
+    
+    return {
+        'response': response,
+        'context_items_used': len(context),
+        'ai_powered': actual_mode == 'ai_enhanced' and not is_fallback,
+        'is_throttled': is_fallback and len(WORKING_MODELS) > 0,
+        'model_used': available_models[0]['name'] if available_models and not is_fallback else 'Rule-based',
+        'actual_mode': actual_mode,  # Tell client which mode was actually used
+        'requested_mode': requested_mode,  # Echo back what client requested
+        'quota_exceeded': quota_exceeded,  # AI budget spent for this window; see /chat/usage/<user_id>
+        'timestamp': datetime.now().isoformat(),
+        'navigation_action': navigation_action,
+        'navigation_actions': navigation_actions if navigation_actions else None
+    }
+
+@app.route('/chat', methods=['POST'])
+@profiled
+@captured
+def chat():
+    """Main chat endpoint"""
+    try:
+        data = request.get_json()
+        message = data.get('message', '').strip()
+        user_id = data.get('user_id', 'anonymous')
+        requested_mode = data.get('mode', 'auto') 
+        include_timings = bool(data.get('include_timings')) or request.args.get('timings') in ('1', 'true')
         
-        return jsonify({
-            'response': response,
-            'context_items_used': len(context),
-            'ai_powered': actual_mode == 'ai_enhanced' and not is_fallback,
-            'is_throttled': is_fallback and len(WORKING_MODELS) > 0,
-            'model_used': available_models[0]['name'] if available_models and not is_fallback else 'Rule-based',
-            'actual_mode': actual_mode,  # Tell client which mode was actually used
-            'requested_mode': requested_mode,  # Echo back what client requested
-            'timestamp': datetime.now().isoformat(),
-            'navigation_action': navigation_action,
-            'navigation_actions': navigation_actions if navigation_actions else None
-        })
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+        
+        return traced_json(process_chat(message, user_id, requested_mode), include_timings)
         
     except Exception as e:
-        print(f"Chat error: {e}")
+        logger.exception("Chat error: %s", e)
         return jsonify({
-            'response': "I'm sorry, I'm having trouble processing your request right now. Please try again in a moment.",
+            'response': CHAT_ERROR_RESPONSE,
             'error': True
         }), 500
 
+# Batch chat: shared pool so concurrent batches together stay within BATCH_CONCURRENCY model calls
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 20))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+# Longest wait for the next finished item before the rest are reported as timed out
+BATCH_ITEM_TIMEOUT = float(os.getenv('BATCH_ITEM_TIMEOUT', 120))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='chat-batch')
+
+def run_batch_items(items, snapshot, results):
+    """Process one user's batch items in order (each sees the previous turns) against the shared snapshot"""
+    with app.app_context():
+        if snapshot is not None:
+            g.user_data = snapshot  # fetch_user_data() returns this instead of calling Node
+        for index, message, user_id, requested_mode in items:
+            started = time.perf_counter()
+            try:
+                payload = process_chat(message, user_id, requested_mode)
+            except Exception as e:
+                logger.exception("Batch item %d error: %s", index, e)
+                payload = {'response': CHAT_ERROR_RESPONSE, 'error': True, 'status': 500}
+            payload['index'] = index
+            payload['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            results.put(payload)
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Answer several messages against one data snapshot.
+    
+    Body: {"items": [{"message", "user_id", "mode"}, ...], "user_id", "mode",
+    "ordered"}; item fields default to the top-level ones. Streams one NDJSON
+    line per item (with its "index") as results complete, in input order
+    unless "ordered" is false, then a final {"done": true} line.
+    """
+    data = request.get_json(silent=True) or {}
+    raw_items = data.get('items')
+    if not isinstance(raw_items, list) or not raw_items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_MAX_ITEMS} items per batch'}), 400
+    ordered = data.get('ordered', True) is not False
+    
+    results = queue.Queue()
+    by_user = {}
+    for index, item in enumerate(raw_items):
+        item = item if isinstance(item, dict) else {}
+        message = str(item.get('message') or '').strip()
+        if not message:
+            results.put({'index': index, 'error': 'Message is required', 'status': 400})
+            continue
+        user_id = item.get('user_id') or data.get('user_id', 'anonymous')
+        requested_mode = item.get('mode') or data.get('mode', 'auto')
+        by_user.setdefault(user_id, []).append((index, message, user_id, requested_mode))
+    
+    logger.info("Batch request: %d items for %d users", len(raw_items), len(by_user))
+    # One shared snapshot; with user-scoped data each user's items fetch their own
+    snapshot = ContextManager.fetch_user_data() if by_user and not USER_SCOPE_PARAM else None
+    for items in by_user.values():
+        # Each group gets its own copy of the request's context (request id, trace)
+        try:
+            batch_executor.submit(contextvars.copy_context().run, run_batch_items, items, snapshot, results)
+        except RuntimeError as e:  # Executor shut down (worker exiting)
+            logger.error("Batch items not scheduled: %s", e)
+            for index, *_ in items:
+                results.put({'index': index, 'error': 'Service is shutting down', 'status': 503})
+    
+    started = time.perf_counter()
+    
+    def stream():
+        pending = {}
+        next_index = 0
+        delivered = set()
+        while len(delivered) < len(raw_items):
+            try:
+                payload = results.get(timeout=BATCH_ITEM_TIMEOUT)
+            except queue.Empty:
+                # A worker died or hung: report what never arrived instead of holding the response open
+                missing = [index for index in range(len(raw_items)) if index not in delivered]
+                logger.error("Batch items %s did not finish within %gs", missing, BATCH_ITEM_TIMEOUT)
+                timed_out = [{'index': index, 'error': 'Timed out', 'status': 504} for index in missing]
+                break
+            delivered.add(payload['index'])
+            if not ordered:
+                yield dumps(payload) + b"\n"
+                continue
+            pending[payload['index']] = payload
+            while next_index in pending:
+                yield dumps(pending.pop(next_index)) + b"\n"
+                next_index += 1
+        else:
+            timed_out = []
+        for payload in timed_out:
+            pending[payload['index']] = payload
+        for index in sorted(pending):
+            yield dumps(pending[index]) + b"\n"
+        yield dumps({'done': True, 'count': len(raw_items), 'timed_out': len(timed_out),
+                     'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)}) + b"\n"
+    
+    return Response(stream(), mimetype='application/x-ndjson')
+
+HISTORY_PAGE_SIZE = 10
+HISTORY_MAX_PAGE_SIZE = 50
+HISTORY_FIELDS = ('id', 'user', 'assistant', 'timestamp', 'context_used')
+
+def history_params(args):
+    """Validated (limit, before, after, fields) from /chat/history query args; raises ValueError"""
+    limit = int(args.get('limit', HISTORY_PAGE_SIZE))
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}")
+    before = int(args['before']) if args.get('before') else None
+    after = int(args['after']) if args.get('after') else None
+    fields = HISTORY_FIELDS
+    if args.get('fields'):
+        fields = tuple(field.strip() for field in args['fields'].split(',') if field.strip())
+        unknown = [field for field in fields if field not in HISTORY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}; available: {', '.join(HISTORY_FIELDS)}")
+        if 'id' not in fields:
+            fields = ('id',) + fields  # Cursors are exchange ids
+    return limit, before, after, fields
+
 @app.route('/chat/history/<user_id>', methods=['GET'])
+@compressed
 def get_chat_history(user_id):
-    """Get chat history for a user"""
-    history = conversations.get(user_id, [])
+    """
+    Get chat history for a user, one page of the newest exchanges at a time.
+    ?before=<id> pages back (pass next_cursor), ?after=<id> returns only
+    newer exchanges, ?fields=user,timestamp projects each exchange. The
+    weak ETag changes whenever the history does, so If-None-Match polls of
+    an unchanged history get 304 without the body being rebuilt. The tag
+    stays weak because it covers every Content-Encoding of the page; the
+    query (page and fields) is hashed into it.
+    """
+    try:
+        limit, before, after, fields = history_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    version = history_versions.get(user_id, 0)
+    representation = f"{user_id}\0{limit}\0{before}\0{after}\0{','.join(fields)}".encode('utf-8')
+    etag = f"h{history_etag_prefix()}-{version}-{hashlib.sha1(representation).hexdigest()[:12]}"
+    if request.if_none_match.contains_weak(etag):
+        CACHE_REQUESTS.inc(cache='history_etag', result='hit')
+        response = app.response_class(status=304)
+    else:
+        CACHE_REQUESTS.inc(cache='history_etag', result='miss')
+        history = conversations.get(user_id, [])
+        matching = [exchange for exchange in history
+                    if (before is None or exchange['id'] < before) and (after is None or exchange['id'] > after)]
+        page = matching[-limit:]
+        if fields != HISTORY_FIELDS:
+            page = [{field: exchange[field] for field in fields} for exchange in page]
+        response = jsonify({
+            'history': page,
+            'count': len(history),
+            'version': version,
+            'next_cursor': page[0]['id'] if len(matching) > len(page) else None  # Pass as ?before= for older exchanges
+        })
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'  # Store, but revalidate every time
+    return response
+
+@app.route('/chat/usage/<user_id>', methods=['GET'])
+def get_chat_usage(user_id):
+    """AI budget usage for a user in the current window"""
+    return jsonify({'user_id': user_id, 'quotas_enabled': AI_QUOTAS, **usage_ledger.usage(user_id)})
+
+@app.route('/chat/usage', methods=['GET'])
+def get_all_chat_usage():
+    """AI budget usage for every user seen in the current window (admin only)"""
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
     return jsonify({
-        'history': history[-10:],  # Last 10 exchanges
-        'count': len(history)
+        'quotas_enabled': AI_QUOTAS,
+        'in_flight': ai_scheduler.in_flight,
+        'queued': ai_scheduler.waiting,
+        'users': {user_id: usage_ledger.usage(user_id) for user_id in usage_ledger.users()}
     })
 
 @app.route('/chat/clear/<user_id>', methods=['POST'])
@@ -1337,22 +1797,126 @@ def clear_chat_history(user_id):
     """Clear chat history for a user"""
     if user_id in conversations:
         del conversations[user_id]
+    history_versions[user_id] = next(history_sequence)
+    conversation_memory.clear(user_id)
     return jsonify({'message': 'Chat history cleared'})
 
-def keep_alive():
-    """Keep the service alive by self-pinging every 14 minutes"""
-    while True:
-        try:
-            time.sleep(840)  # 14 minutes
-            requests.get(f"{os.getenv('RENDER_EXTERNAL_URL', 'http://localhost:5002')}/health", timeout=10)
-            print(f"Keep-alive ping at {datetime.now()}")
-        except Exception as e:
-            print(f"Keep-alive error: {e}")
+# Warmup jobs (WARMUP=off disables); intervals in seconds, 0 disables a job
+WARMUP = os.getenv('WARMUP', 'on').lower() != 'off'
+WARMUP_SNAPSHOT_INTERVAL = float(os.getenv('WARMUP_SNAPSHOT_INTERVAL', 300))
+WARMUP_CONNECTIONS_INTERVAL = float(os.getenv('WARMUP_CONNECTIONS_INTERVAL', 45))
+MODEL_PROBE_INTERVAL = float(os.getenv('MODEL_PROBE_INTERVAL', 1800))
+SELF_PING_INTERVAL = float(os.getenv('SELF_PING_INTERVAL', 840))  # Render sleeps free services after 15 idle minutes
 
-if __name__ == '__main__':
-    # Start keep-alive thread in production
+def warm_snapshot():
+    """Refresh the data snapshot and build what is cached per snapshot: this/next week's views and the retrieval indexes"""
+    with app.app_context():  # One fetch shared by everything below
+        snapshot = ContextManager.fetch_user_data()
+        ChatService.format_week_schedule_response(0)
+        ChatService.format_week_schedule_response(1)
+        if RETRIEVAL_ENGINE == 'tfidf':
+            with tfidf_lock:
+                tfidf_index = tfidf_index_for(snapshot.scope)
+                tfidf_index.sync(ContextManager._tfidf_entries(snapshot), snapshot.version)
+                tfidf_index.columns()
+        else:
+            for collection in NODE_COLLECTIONS:
+                snapshot.bm25(collection)
+
+def probe_upstream(name, session, method, url):
+    """One cheap request to an upstream, recorded in upstream_health; re-raises on failure"""
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=10)
+        # Any answer below 500 means the upstream is reachable (OpenRouter answers HEAD with 405)
+        if response.status_code >= 500:
+            raise Exception(f"{method} {url}: {response.status_code}")
+    except Exception as e:
+        upstream_health.failure(name, e, time.perf_counter() - started)
+        raise
+    upstream_health.success(name, response.elapsed.total_seconds())
+
+def warm_connections():
+    """Keep pooled keep-alive connections to Node and OpenRouter open and refresh their health"""
+    probe_upstream('node', node_http, 'GET', f"{NODE_API_URL}/health")
+    if OPENROUTER_API_KEY:
+        probe_upstream('openrouter', openrouter_http, 'HEAD', OPENROUTER_BASE_URL)
+
+def self_ping():
+    """Inbound request that stops Render from idling the service"""
+    requests.get(f"{os.getenv('RENDER_EXTERNAL_URL')}/health/live", timeout=10).raise_for_status()
+
+def record_warmup_run(job, outcome, seconds):
+    WARMUP_RUNS.inc(job=job, outcome=outcome)
+    if outcome != 'skipped':
+        WARMUP_SECONDS.observe(seconds, job=job)
+
+warmup_scheduler = WarmupScheduler(on_run=record_warmup_run, logger=logger)
+
+def schedule_warmup_jobs():
+    # With user-scoped data nobody reads the unscoped snapshot; each user's partition warms on their first request
+    if not USER_SCOPE_PARAM:
+        warmup_scheduler.add('snapshot', warm_snapshot, WARMUP_SNAPSHOT_INTERVAL, initial_delay=0)
+    warmup_scheduler.add('connections', warm_connections, WARMUP_CONNECTIONS_INTERVAL)
+    if MODEL_PROBES != 'off' and AVAILABLE_MODELS:
+        warmup_scheduler.add('model_probes', probe_models, MODEL_PROBE_INTERVAL)
+    if PERSONAL_LLM_WARM_INTERVAL > 0 and any(model['provider'] == 'personal_llm' for model in AVAILABLE_MODELS):
+        keep_warm = KeepWarm(personal_llm_dispatcher, preload_personal_llm, PERSONAL_LLM_WARM_INTERVAL)
+        warmup_scheduler.add('personal_llm', keep_warm.run_once, min(60.0, PERSONAL_LLM_WARM_INTERVAL / 2))
     if os.getenv('RENDER_EXTERNAL_URL'):
-        threading.Thread(target=keep_alive, daemon=True).start()
+        warmup_scheduler.add('self_ping', self_ping, SELF_PING_INTERVAL)
+    warmup_scheduler.start()
+    logger.info("Warmup jobs scheduled: %s", sorted(warmup_scheduler.jobs))
+
+def probe_models_in_background():
+    started = time.perf_counter()
+    probe_models()
+    elapsed = time.perf_counter() - started
+    startup_report.record('model_probes_background', elapsed)
+    STARTUP_SECONDS.set(elapsed, phase='model_probes_background')
+
+startup_report.mark('module_setup')
+app_started = False
+app_start_lock = threading.Lock()
+
+def create_app():
+    """
+    Finish startup work deferred from import and return the app.
+    
+    Logs configuration, opens the capture log and probes models (in the
+    background unless MODEL_PROBES=blocking), then logs the startup report.
+    Idempotent; gunicorn runs it once per worker via 'app:create_app()'.
+    """
+    global app_started, traffic_recorder
+    with app_start_lock:
+        if app_started:
+            return app
+        
+        with startup_report.phase('factory'):
+            logger.info("Configuration loaded", extra={'openrouter_configured': bool(OPENROUTER_API_KEY), 'gemini_configured': bool(GEMINI_API_KEY), 'frontend_url': FRONTEND_URL, 'json_codec': codec_name(), 'retrieval_engine': RETRIEVAL_ENGINE, 'compression': encoding_names()})
+            logger.info("🚀 Available models: %s", [model['name'] for model in AVAILABLE_MODELS])
+            
+            if CAPTURE_DIR:
+                traffic_recorder = TrafficRecorder(CAPTURE_DIR, [model['name'] for model in AVAILABLE_MODELS])
+                logger.info("📼 Capturing /chat traffic to %s", traffic_recorder.path)
+        
+        if MODEL_PROBES == 'blocking':
+            with startup_report.phase('model_probes'):
+                probe_models()
+        elif MODEL_PROBES != 'off' and AVAILABLE_MODELS:
+            threading.Thread(target=probe_models_in_background, daemon=True).start()
+        
+        if WARMUP:
+            schedule_warmup_jobs()
+        
+        for phase in startup_report.phases:
+            STARTUP_SECONDS.set(phase['ms'] / 1000, phase=phase['phase'])
+        logger.info("Startup complete in %.0fms", startup_report.total_ms(), extra={'startup': startup_report.as_dict()})
+        app_started = True
+    return app
+
+if __name__ == '__main__':
+    create_app()
     
     port = int(os.getenv('PORT', 5002))
     app.run(host='0.0.0.0', port=port, debug=os.getenv('FLASK_ENV') == 'development')
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the chat service hot paths.
+
+Runs snapshot ingest, context selection, date/time formatting, the weekly schedule and task
+formatters and prompt assembly against synthetic data at several sizes and
+writes the results as JSON so runs can be compared between commits:
+
+    python benchmark.py --output before.json
+    # ...change code...
+    python benchmark.py --output after.json --compare before.json
+
+No network access is needed: model API keys are blanked before the app is
+imported and fetch_user_data is pointed at the synthetic snapshot.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, time as clock_time, timedelta, timezone
+
+# Keep the app from probing real providers or the Node API at import time
+for key in ('OPENROUTER_API_KEY', 'GEMINI_API_KEY', 'PERSONAL_LLM_URL', 'SUMMARY_MODEL'):
+    os.environ[key] = ''
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from jsoncodec import STREAM_CHUNK_BYTES, iter_collection, loads
+from records import RecordCache
+from synthetic_data import MESSAGE_CORPUS, generate_dataset, generate_history
+
+DEFAULT_SIZES = (100, 1000, 10000)
+REGRESSION_THRESHOLD = 1.10  # Median this much slower than the baseline counts as a regression
+# Synthetic dates and the app's "today" are pinned to this day (a school-term
+# Monday), so a given --seed produces the same week views, due-date
+# suffixes and context on any day the suite runs
+REFERENCE_DATE = '2025-09-01'
+USER_TIMEZONE = timezone(timedelta(hours=8))  # As get_user_timezone()
+
+
+def _percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+
+def measure(function, inputs, repeat, warmup=1):
+    """Call function on every input `repeat` times; returns per-call stats in microseconds"""
+    for _ in range(warmup):
+        for value in inputs:
+            function(value)
+
+    samples = []
+    for _ in range(repeat):
+        for value in inputs:
+            started = time.perf_counter()
+            function(value)
+            samples.append((time.perf_counter() - started) * 1e6)
+
+    samples.sort()
+    return {
+        'calls': len(samples),
+        'mean_us': round(sum(samples) / len(samples), 2),
+        'median_us': round(_percentile(samples, 0.5), 2),
+        'p95_us': round(_percentile(samples, 0.95), 2),
+        'min_us': round(samples[0], 2)
+    }
+
+
+def peak_memory_kib(function, argument):
+    """Peak memory allocated while calling function(argument), in KiB"""
+    tracemalloc.start()
+    try:
+        function(argument)
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(app_module, sizes, repeat, seed, reference_date=None):
+    ContextManager = app_module.ContextManager
+    ChatService = app_module.ChatService
+    original_fetch = ContextManager.fetch_user_data
+    original_clock = app_module.get_user_timezone
+
+    reference_date = reference_date or date.fromisoformat(REFERENCE_DATE)
+    now = datetime.combine(reference_date, clock_time(10), tzinfo=USER_TIMEZONE)
+    app_module.get_user_timezone = lambda: now
+
+    messages = [message for kind, message in MESSAGE_CORPUS if kind != 'greeting']
+    history = generate_history(3, seed=seed, now=now.replace(tzinfo=None))
+    current_date = now.strftime("%A, %B %d, %Y")
+    current_time = now.strftime("%I:%M %p")
+
+    results = []
+    try:
+        for size in sizes:
+            data = generate_dataset(size, seed=seed, now=now.astimezone(timezone.utc))
+            snapshot = app_module.record_cache.snapshot(data)
+            ContextManager.fetch_user_data = staticmethod(lambda user_id=None: snapshot)
+            contexts = {message: ContextManager.find_relevant_context(message, snapshot) for message in messages}
+
+            due_dates = [task['dueDate'] for task in data['tasks']][:2000]
+            start_times = [schedule['startTime'] for schedule in data['schedules']][:2000]
+            body = json.dumps({'success': True, 'data': data['schedules']}).encode('utf-8')
+            chunks = [body[offset:offset + STREAM_CHUNK_BYTES] for offset in range(0, len(body), STREAM_CHUNK_BYTES)]
+
+            benchmarks = {
+                # Both start from the received chunks; buffered joins them like response.content does
+                'node_decode_buffered': (lambda parts: loads(b''.join(parts))['data'], [chunks]),
+                'node_decode_streamed': (lambda parts: sum(1 for _ in iter_collection(parts)), [chunks]),
+                'snapshot_ingest_cold': (lambda raw: RecordCache().snapshot(raw), [data]),
+                'snapshot_ingest_warm': (app_module.record_cache.snapshot, [data]),
+                'find_relevant_context': (lambda message: ContextManager.find_relevant_context(message, snapshot), messages),
+                'format_date': (ChatService.format_date, due_dates),
+                'format_time': (ChatService.format_time, start_times),
+                'format_weekly_schedule_response': (ChatService.format_weekly_schedule_response, [[]] * 10),
+                'format_tasks_response': (ChatService.format_tasks_response, [[]] * 10),
+                'build_prompt': (
+                    lambda message: app_module.build_prompt(
+                        message, contexts[message], history, current_date, current_time,
+                        "Philippines Time (UTC+8)"
+                    ),
+                    messages
+                )
+            }
+            for name, (function, inputs) in benchmarks.items():
+                stats = measure(function, inputs, repeat)
+                if name.startswith('node_decode_'):
+                    # The streamed parse trades CPU for memory; record what it buys
+                    stats['peak_kib'] = peak_memory_kib(function, inputs[0])
+                results.append({'benchmark': name, 'records': size, **stats})
+                peak = f"  peak {stats['peak_kib']:>9.1f}KiB" if 'peak_kib' in stats else ''
+                print(f"{name:34} {size:>6} records  median {stats['median_us']:>10.2f}us  p95 {stats['p95_us']:>10.2f}us{peak}",
+                      file=sys.stderr)
+    finally:
+        ContextManager.fetch_user_data = original_fetch
+        app_module.get_user_timezone = original_clock
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD, reference_date=REFERENCE_DATE):
+    """Print median ratios against a baseline run; returns the regressed (benchmark, records) pairs"""
+    previous = {(entry['benchmark'], entry['records']): entry for entry in baseline['results']}
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('git_commit') or 'baseline'}:", file=sys.stderr)
+    if baseline['meta'].get('reference_date') != reference_date:
+        print(f"Warning: the baseline used reference date {baseline['meta'].get('reference_date')}, "
+              f"this run {reference_date}; the inputs differ", file=sys.stderr)
+    for entry in results:
+        before = previous.get((entry['benchmark'], entry['records']))
+        if not before or not before['median_us']:
+            continue
+        ratio = entry['median_us'] / before['median_us']
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{entry['benchmark']:34} {entry['records']:>6} records  {before['median_us']:>10.2f}us -> "
+              f"{entry['median_us']:>10.2f}us  x{ratio:.2f}{flag}", file=sys.stderr)
+        if ratio > threshold:
+            regressions.append((entry['benchmark'], entry['records']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Total records per dataset')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes over each input set')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reference-date', type=date.fromisoformat, default=date.fromisoformat(REFERENCE_DATE),
+                        help=f"Day the synthetic data and the app's 'today' are pinned to (default {REFERENCE_DATE})")
+    parser.add_argument('--engine', choices=['bm25', 'tfidf'], help='RETRIEVAL_ENGINE to benchmark')
+    parser.add_argument('--output', help='Write JSON results here (default: stdout)')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Median slowdown ratio that fails the comparison')
+    args = parser.parse_args()
+
+    if args.engine:
+        os.environ['RETRIEVAL_ENGINE'] = args.engine
+    import app as app_module
+
+    results = run_suite(app_module, args.sizes, args.repeat, args.seed, args.reference_date)
+    report = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'retrieval_engine': app_module.RETRIEVAL_ENGINE,
+            'numpy': app_module.numpy_available(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'reference_date': args.reference_date.isoformat()
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold, args.reference_date.isoformat())
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Capture of live /chat traffic for replay (see replay.py).
+
+With CAPTURE_DIR set, every /chat request is written to a gzip'd JSON-lines
+log: the incoming message, the fetch_user_data snapshot(s) it saw, the
+context chosen, each upstream model attempt with its outcome, timing and
+text, and the final response. Snapshots are stored once per content hash
+and referenced by version from the chat records.
+
+Record types:
+- {'t': 'meta', 'started_at', 'pid', 'working_models'}
+- {'t': 'snapshot', 'version', 'data'}
+- {'t': 'chat', 'ts', 'request_id', 'user_id', 'message', 'mode',
+   'snapshots', 'context', 'model_calls', 'status', 'response', 'latency_ms',
+   'fetch_ms'}
+
+fetch_ms is the time spent in the request's Node fetch stage(s), so replay
+can compare processing time with both upstreams taken out.
+
+Each worker process writes its own file, so gunicorn workers never share one.
+"""
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from tracing import current_trace
+
+_current_capture = contextvars.ContextVar('current_capture', default=None)
+
+
+class TrafficRecorder:
+    """Appends capture records to <directory>/capture-<pid>-<timestamp>.jsonl.gz"""
+
+    def __init__(self, directory, working_models=()):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"capture-{os.getpid()}-{int(time.time())}.jsonl.gz")
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+        self._snapshots = set()
+        self._lock = threading.Lock()
+        self._write({'t': 'meta', 'started_at': datetime.now().isoformat(), 'pid': os.getpid(),
+                     'working_models': list(working_models)})
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            # Sync flush keeps everything written so far readable if the process dies
+            self._file.flush()
+
+    def snapshot_version(self, data):
+        """Store a data snapshot once and return its version (content hash)"""
+        encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+        version = hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+        with self._lock:
+            known = version in self._snapshots
+            self._snapshots.add(version)
+        if not known:
+            self._write({'t': 'snapshot', 'version': version, 'data': data})
+        return version
+
+    def begin(self, **fields):
+        """Start capturing the current request"""
+        capture = {'t': 'chat', 'ts': datetime.now().isoformat(), 'snapshots': [], 'context': None,
+                   'model_calls': [], '_started': time.perf_counter(), **fields}
+        _current_capture.set((self, capture))
+        return capture
+
+    def finish(self, status, response):
+        state = _current_capture.get()
+        if state is None or state[0] is not self:
+            return
+        _current_capture.set(None)
+        capture = state[1]
+        capture['latency_ms'] = round((time.perf_counter() - capture.pop('_started')) * 1000, 2)
+        trace = current_trace()
+        capture['fetch_ms'] = fetch_stage_ms(trace.stages if trace is not None else None)
+        capture['status'] = status
+        capture['response'] = response
+        self._write(capture)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def capture_active():
+    """Whether the current request is being recorded"""
+    return _current_capture.get() is not None
+
+
+def capture_snapshot(data):
+    state = _current_capture.get()
+    if state is not None:
+        recorder, capture = state
+        capture['snapshots'].append(recorder.snapshot_version(data))
+
+
+def capture_context(context):
+    state = _current_capture.get()
+    if state is not None:
+        state[1]['context'] = context
+
+
+def capture_model_call(model_name, outcome, seconds, content=None, error=None):
+    state = _current_capture.get()
+    if state is not None:
+        call = {'model': model_name, 'outcome': outcome, 'ms': round(seconds * 1000, 2)}
+        if content is not None:
+            call['content'] = content
+        if error is not None:
+            call['error'] = error
+        state[1]['model_calls'].append(call)
+
+
+def fetch_stage_ms(stages):
+    """Total of the Node fetch stages ('fetch', 'fetch-2', ...) in a trace's stage list, or None without one"""
+    if stages is None:
+        return None
+    return round(sum(stage['ms'] for stage in stages if stage['name'].partition('-')[0] == 'fetch'), 2)
+
+
+def read_capture(path):
+    """Yield records from a capture log, tolerating a truncated tail"""
+    with gzip.open(path, 'rt', encoding='utf-8') as capture_file:
+        try:
+            for line in capture_file:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        return  # Partial last line
+        except EOFError:
+            return
@@ -0,0 +1,72 @@
+"""
+Response compression for JSON endpoints.
+
+Bodies of at least COMPRESS_MIN_BYTES are compressed with the best encoding
+the client accepts: brotli when the `brotli` package is installed, else
+gzip. Smaller bodies are sent as they are, since they fit in a packet
+anyway and compressing them costs more than it saves. Streamed responses
+and responses that already have a Content-Encoding are left alone. A 304
+gets the same `Vary: Accept-Encoding` as the 200 it revalidates; ETags set
+on compressed views should be weak, since one tag covers every encoding.
+"""
+import functools
+import gzip
+import os
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Close to gzip's speed with a better ratio on markdown-heavy JSON
+
+
+def encoding_names():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None for a werkzeug Accept-Encoding header"""
+    if brotli is not None and accept_encodings.quality('br') > 0 \
+            and accept_encodings.quality('br') >= accept_encodings.quality('gzip'):
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encodings, min_bytes=COMPRESS_MIN_BYTES):
+    """Compress the response body in place if it is large enough and the client accepts an encoding"""
+    if response.status_code == 304:
+        # A 304 carries the Vary its 200 would have, so caches key the stored body the same way
+        response.vary.add('Accept-Encoding')
+        return response
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200 \
+            or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = choose_encoding(accept_encodings) if len(data) >= min_bytes else None
+    if encoding:
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def compressed(view):
+    """Compress the view's response according to the request's Accept-Encoding"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        response = current_app.make_response(view(*args, **kwargs))
+        return compress_response(response, request.accept_encodings)
+    return wrapper
@@ -0,0 +1,13 @@
+"""
+Shared pytest setup for the chat-service tests.
+
+app.py configures itself on import (warmup jobs, prefetching, model probes),
+so those are switched off here: pytest loads this file before collecting
+the test modules, which can then simply `import app`.
+"""
+import os
+
+os.environ.setdefault('WARMUP', 'off')
+os.environ.setdefault('PREFETCH', 'off')
+os.environ.setdefault('MODEL_PROBES', 'off')
+
@@ -0,0 +1,197 @@
+"""
+Per-user fairness for AI-enhanced requests.
+
+Every user shares one OpenRouter key and one personal LLM, so a single
+student sending AI requests back to back could spend the free-tier quota
+and get every model throttled for the whole class. Two mechanisms keep
+that in check:
+
+UsageLedger gives each user a budget of requests and estimated tokens per
+window. A user over either budget is answered in Smart Mode until their
+window resets.
+
+FairScheduler limits how many AI generations run at once and, when they
+are all busy, hands the next free slot to the waiter with the smallest
+virtual finish time (weighted fair queuing). A request's finish time is
+its user's previous finish time (or the current virtual time, if later)
+plus cost / weight, so a user with many queued requests waits behind
+everyone else's first request instead of in front of it.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+
+class FairQueueTimeout(Exception):
+    """No AI slot became free in time for this request"""
+
+
+class UserUsage:
+    __slots__ = ('window_started', 'requests', 'tokens', 'total_requests', 'total_tokens', 'downgraded', 'last_seen')
+
+    def __init__(self, now):
+        self.window_started = now
+        self.requests = 0
+        self.tokens = 0
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.downgraded = 0
+        self.last_seen = now
+
+
+class UsageLedger:
+    """Requests and estimated tokens per user in fixed windows of `window` seconds; 0 disables a limit"""
+
+    def __init__(self, window=3600.0, max_requests=30, max_tokens=60000, max_users=10000):
+        self.window = window
+        self.max_requests = max_requests
+        self.max_tokens = max_tokens
+        self.max_users = max_users
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _get(self, user_id, now):
+        usage = self._users.get(user_id)
+        if usage is None:
+            if len(self._users) >= self.max_users:
+                # Users idle for a whole window have nothing left to enforce
+                self._users = {key: entry for key, entry in self._users.items() if now - entry.last_seen < self.window}
+            usage = self._users[user_id] = UserUsage(now)
+        elif now - usage.window_started >= self.window:
+            usage.window_started = now
+            usage.requests = 0
+            usage.tokens = 0
+        usage.last_seen = now
+        return usage
+
+    def admit(self, user_id):
+        """Count a request against the user's budget; returns the refusal reason (over_requests, over_tokens) or None"""
+        with self._lock:
+            usage = self._get(user_id, time.monotonic())
+            if self.max_requests and usage.requests >= self.max_requests:
+                refusal = 'over_requests'
+            elif self.max_tokens and usage.tokens >= self.max_tokens:
+                refusal = 'over_tokens'
+            else:
+                usage.requests += 1
+                usage.total_requests += 1
+                return None
+            usage.downgraded += 1
+            return refusal
+
+    def charge(self, user_id, tokens):
+        """Add the tokens an admitted request actually used"""
+        with self._lock:
+            usage = self._get(user_id, time.monotonic())
+            usage.tokens += tokens
+            usage.total_tokens += tokens
+
+    def usage(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            usage = self._users.get(user_id)
+            if usage is None or now - usage.window_started >= self.window:
+                requests, tokens, resets_in = 0, 0, None
+            else:
+                requests, tokens, resets_in = usage.requests, usage.tokens, self.window - (now - usage.window_started)
+            return {
+                'window_seconds': self.window,
+                'requests': requests,
+                'request_limit': self.max_requests or None,
+                'tokens': tokens,
+                'token_limit': self.max_tokens or None,
+                'resets_in_seconds': round(resets_in, 1) if resets_in is not None else None,
+                'over_quota': bool((self.max_requests and requests >= self.max_requests)
+                                   or (self.max_tokens and tokens >= self.max_tokens)),
+                'total_requests': usage.total_requests if usage else 0,
+                'total_tokens': usage.total_tokens if usage else 0,
+                'downgraded': usage.downgraded if usage else 0
+            }
+
+    def users(self):
+        with self._lock:
+            return list(self._users)
+
+
+class FairScheduler:
+    """At most `concurrency` AI generations at once, granted in weighted-fair order"""
+
+    def __init__(self, concurrency=4, max_wait=20.0, weights=None, default_weight=1.0):
+        self.concurrency = max(1, concurrency)
+        self.max_wait = max_wait
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self._finish = {}  # user -> virtual finish time of their latest request
+        self._waiting = []  # heap of (finish, sequence, ticket)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    @property
+    def waiting(self):
+        with self._condition:
+            return len(self._waiting)
+
+    def _grant_next(self):
+        """Hand free slots to the waiters with the smallest finish times; call with the condition held"""
+        granted = False
+        while self._waiting and self.in_flight < self.concurrency:
+            finish, _, ticket = heapq.heappop(self._waiting)
+            ticket['granted'] = True
+            self.virtual_time = max(self.virtual_time, ticket['start'])
+            self.in_flight += 1
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, user_id, cost=1.0):
+        """Hold an AI slot for the body; yields the seconds spent queued, raises FairQueueTimeout past max_wait"""
+        started = time.monotonic()
+        weight = self.weights.get(user_id, self.default_weight) or self.default_weight
+        with self._condition:
+            start = max(self.virtual_time, self._finish.get(user_id, 0.0))
+            finish = self._finish[user_id] = start + max(cost, 1.0) / weight
+            if self.in_flight < self.concurrency and not self._waiting:
+                self.in_flight += 1
+                self.virtual_time = max(self.virtual_time, start)
+            else:
+                ticket = {'granted': False, 'start': start}
+                entry = (finish, next(self._sequence), ticket)
+                heapq.heappush(self._waiting, entry)
+                deadline = started + self.max_wait
+                while not ticket['granted']:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._waiting.remove(entry)
+                        heapq.heapify(self._waiting)
+                        # Give back the virtual time this request reserved
+                        if self._finish.get(user_id) == finish:
+                            self._finish[user_id] = start
+                        raise FairQueueTimeout(f"No AI slot within {self.max_wait:g}s ({self.in_flight} in flight)")
+                    self._condition.wait(remaining)
+            if len(self._finish) > 4 * len(self._waiting) + 1024:
+                # Users whose finish time has passed start from the current virtual time anyway
+                self._finish = {user: tag for user, tag in self._finish.items() if tag > self.virtual_time}
+        try:
+            yield time.monotonic() - started
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._grant_next()
+
+
+def parse_weights(spec):
+    """'alice=2,bob=0.5' -> {'alice': 2.0, 'bob': 0.5}; malformed entries are ignored"""
+    weights = {}
+    for item in (spec or '').split(','):
+        name, _, value = item.partition('=')
+        try:
+            if name.strip() and float(value) > 0:
+                weights[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return weights
@@ -0,0 +1,99 @@
+"""
+Memoized date and time formatting for responses and model context.
+
+The same dueDate/startTime/endTime strings are formatted for every task and
+schedule on every request. Parsing and the static part of a due date
+("Sep 30, 2025 at 4:00 PM") never change, so they are kept in LRU caches.
+The relative suffix ("(in 3 days)") depends on today's date, so complete
+strings live in a DayCache that is dropped in bulk at local midnight.
+"""
+import functools
+import time
+from datetime import datetime, time as clock_time, timedelta
+
+FORMAT_CACHE_SIZE = 4096
+
+
+class DayCache:
+    """Dict cache for values that are only valid until the local date changes"""
+
+    def __init__(self, max_entries=FORMAT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.today = None
+        self._values = {}
+        self._expires_at = 0.0
+
+    def _roll_over(self):
+        now = datetime.now()
+        self.today = now.date()
+        self._values = {}
+        self._expires_at = datetime.combine(self.today + timedelta(days=1), clock_time.min).timestamp()
+
+    def current_day(self):
+        """Today's local date, clearing the cache first if midnight has passed"""
+        if time.time() >= self._expires_at:
+            self._roll_over()
+        return self.today
+
+    def get(self, key):
+        if time.time() >= self._expires_at:
+            self._roll_over()
+            return None
+        return self._values.get(key)
+
+    def set(self, key, value):
+        if len(self._values) >= self.max_entries:
+            self._values = {}
+        self._values[key] = value
+
+
+_relative_dates = DayCache()
+
+
+@functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _parse_due_date(date_str):
+    """(static text, calendar date) of an ISO date string; raises ValueError if invalid"""
+    date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+    return date_obj.strftime("%b %d, %Y at %I:%M %p"), date_obj.date()
+
+
+def relative_day_suffix(days_diff):
+    if days_diff == 0:
+        return "Today"
+    if days_diff == 1:
+        return "Tomorrow"
+    if days_diff == -1:
+        return "Yesterday"
+    if days_diff > 1:
+        return f"in {days_diff} days"
+    return f"{abs(days_diff)} days overdue"
+
+
+def format_due_date(date_str):
+    """Due date as "Sep 30, 2025 at 04:00 PM (in 3 days)"; raises ValueError if invalid"""
+    text = _relative_dates.get(date_str)
+    if text is None:
+        static_text, due_date = _parse_due_date(date_str)
+        days_diff = (due_date - _relative_dates.current_day()).days
+        text = f"{static_text} ({relative_day_suffix(days_diff)})"
+        _relative_dates.set(date_str, text)
+    return text
+
+
+@functools.lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def format_clock_time(time_str):
+    """24-hour "14:30" (or "14:30:00") to "2:30PM"; other strings unchanged; raises ValueError if malformed"""
+    if ':' not in time_str:
+        return time_str
+
+    time_parts = time_str.split(':')
+    hour = int(time_parts[0])
+    minute = int(time_parts[1])
+
+    if hour == 0:
+        return f"12:{minute:02d}AM"
+    if hour < 12:
+        return f"{hour}:{minute:02d}AM"
+    if hour == 12:
+        return f"12:{minute:02d}PM"
+    return f"{hour - 12}:{minute:02d}PM"
@@ -0,0 +1,85 @@
+"""
+Cached upstream health for the /health endpoints.
+
+Results come from work the service does anyway: Node fetches, model calls,
+and the warmup jobs' periodic probes. A health check only reads this state
+and never calls an upstream, so monitors polling /health add no load to
+Node during an incident.
+"""
+import threading
+from datetime import datetime, timezone
+
+FAILURE_THRESHOLD = 3  # Consecutive failures before an upstream counts as failing
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class UpstreamHealth:
+    __slots__ = ('last_success', 'last_failure', 'last_error', 'latency_ms', 'consecutive_failures')
+
+    def __init__(self):
+        self.last_success = None
+        self.last_failure = None
+        self.last_error = None
+        self.latency_ms = None
+        self.consecutive_failures = 0
+
+
+class HealthRegistry:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD):
+        self.failure_threshold = failure_threshold
+        self._upstreams = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        upstream = self._upstreams.get(name)
+        if upstream is None:
+            upstream = self._upstreams[name] = UpstreamHealth()
+        return upstream
+
+    def success(self, name, seconds=None):
+        with self._lock:
+            upstream = self._get(name)
+            upstream.last_success = _now()
+            upstream.consecutive_failures = 0
+            if seconds is not None:
+                upstream.latency_ms = round(seconds * 1000, 2)
+
+    def failure(self, name, error, seconds=None):
+        with self._lock:
+            upstream = self._get(name)
+            upstream.last_failure = _now()
+            upstream.last_error = str(error)
+            upstream.consecutive_failures += 1
+            if seconds is not None:
+                upstream.latency_ms = round(seconds * 1000, 2)
+
+    def state(self, name):
+        """'ok', 'failing' (threshold consecutive failures) or 'unknown' (never checked)"""
+        with self._lock:
+            upstream = self._upstreams.get(name)
+            if upstream is None:
+                return 'unknown'
+            if upstream.consecutive_failures >= self.failure_threshold:
+                return 'failing'
+            return 'ok' if upstream.last_success else 'unknown'
+
+    def last_error(self, name):
+        with self._lock:
+            upstream = self._upstreams.get(name)
+            return upstream.last_error if upstream else None
+
+    def describe(self, name):
+        with self._lock:
+            upstream = self._upstreams.get(name)
+            if upstream is None:
+                return {'last_success': None, 'last_failure': None, 'last_error': None,
+                        'latency_ms': None, 'consecutive_failures': 0}
+            return {slot: getattr(upstream, slot) for slot in UpstreamHealth.__slots__}
+
+    def as_dict(self):
+        with self._lock:
+            names = list(self._upstreams)
+        return {name: {'state': self.state(name), **self.describe(name)} for name in names}
@@ -0,0 +1,169 @@
+"""
+JSON encoding and decoding for the chat service.
+
+loads/dumps use orjson when it is installed (several times faster than the
+stdlib on the Node payloads and /chat replies) and fall back to the json
+module otherwise; JSON_CODEC=stdlib forces the fallback. FastJSONProvider
+plugs the same codec into Flask's jsonify.
+
+iter_collection() parses a Node API response ({"success": ..., "data":
+[...]}) incrementally: records in "data" are decoded one at a time from the
+socket and handed to the caller, so a full-collection refresh never holds
+the raw body and the complete document in memory at once.
+"""
+import codecs
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib codec gives the same output
+    orjson = None
+
+if os.getenv('JSON_CODEC', 'auto').lower() == 'stdlib':
+    orjson = None
+
+STREAM_CHUNK_BYTES = 64 * 1024
+WHITESPACE = ' \t\n\r'
+NUMBER_CHARS = '0123456789.eE+-'
+
+_decoder = json.JSONDecoder()
+
+
+def codec_name():
+    return 'orjson' if orjson is not None else 'stdlib'
+
+
+def loads(data):
+    """Decode JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, default=None, sort_keys=False):
+    """Compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        # Datetimes go through `default` so they serialize as they do with the stdlib provider
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(obj, default=default, sort_keys=sort_keys, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by loads/dumps; pretty-printing in debug mode stays on the stdlib"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or self._app.debug:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, default=self.default, sort_keys=self.sort_keys).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        if self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, default=self.default, sort_keys=self.sort_keys) + b"\n",
+                                        mimetype=self.mimetype)
+
+
+class _StreamReader:
+    """Text buffer over an iterator of byte chunks, consumed from the front"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read one more chunk, dropping everything already consumed; False at end of stream"""
+        if self.eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self._decoder.decode(b'', final=True)
+        else:
+            text = self._decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (without consuming it), or '' at end of stream"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of the JSON stream")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more chunks until it is whole"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number cut off by the chunk boundary ("1" of "1.5") decodes cleanly; wait for its end
+            if (not self.eof and self.buffer[self.pos] not in '{["'
+                    and (end == len(self.buffer) or self.buffer[end] in NUMBER_CHARS)):
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_collection(chunks, key='data'):
+    """
+    Yield the elements of the top-level `key` array of a JSON object streamed
+    as byte chunks (e.g. response.iter_content()), one decoded element at a
+    time. Other top-level members are decoded and discarded. Raises
+    ValueError if the document is malformed or is not an object.
+    """
+    reader = _StreamReader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.peek() == ',':
+                        reader.pos += 1
+                        continue
+                    reader.expect(']')
+                    break
+        else:
+            reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect('}')
+        return
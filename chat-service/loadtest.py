@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the chat service, fully offline.
+
+Starts stand-in Node API and LLM servers (stub_servers.py), launches the
+chat service against them under gunicorn (or the Flask dev server), then
+drives /chat with concurrent users sending a realistic message mix and
+reports throughput, latency percentiles, fallback rate and memory growth:
+
+    python loadtest.py --users 20 --duration 60 --workers 2 --threads 4 \\
+        --llm-latency 800 --llm-429-rate 0.2 --output run.json
+
+Use --target to drive an already running service instead (stand-ins are
+still started; point its NODE_API_URL / OPENROUTER_BASE_URL at them).
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from stub_servers import FaultProfile, start_llm_stub, start_node_stub
+from synthetic_data import MESSAGE_CORPUS
+
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = ('auto', 'auto', 'auto', 'smart_mode')  # Most clients leave the mode on auto
+
+
+def _free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _rss_kb(pid):
+    """Resident memory of a process and its children (Linux /proc), or None"""
+    try:
+        pids = [pid]
+        children = f"/proc/{pid}/task/{pid}/children"
+        if os.path.exists(children):
+            with open(children) as children_file:
+                pids += [int(child) for child in children_file.read().split()]
+        total = 0
+        for process_id in pids:
+            with open(f"/proc/{process_id}/status") as status_file:
+                for line in status_file:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        return total
+    except (OSError, ValueError):
+        return None
+
+
+def start_service(args, node_url, llm_url):
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'NODE_API_URL': node_url,
+        'OPENROUTER_API_KEY': 'loadtest',
+        'OPENROUTER_BASE_URL': f"{llm_url}/v1/chat/completions",
+        'PERSONAL_LLM_URL': llm_url if args.ollama else '',
+        'GEMINI_API_KEY': '',
+        'SUMMARY_MODEL': '',
+        'RENDER_EXTERNAL_URL': '',
+        'LOG_LEVEL': args.log_level,
+        'MODEL_PROBES': 'blocking',  # Probe the stand-ins before /health answers
+        'AI_QUOTAS': 'off'  # Virtual users send far more than a student's hourly budget
+    })
+    if args.server == 'gunicorn':
+        command = [
+            sys.executable, '-m', 'gunicorn', 'app:create_app()', '--bind', f"127.0.0.1:{port}",
+            '--workers', str(args.workers), '--threads', str(args.threads), '--timeout', '60'
+        ]
+    else:
+        command = [sys.executable, 'app.py']
+    process = subprocess.Popen(command, cwd=SERVICE_DIR, env=env,
+                               stdout=subprocess.DEVNULL if not args.service_logs else None, stderr=subprocess.STDOUT)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Chat service exited during startup (code {process.returncode})")
+        try:
+            if requests.get(f"{base_url}/health", timeout=2).status_code < 500:
+                return process, base_url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("Chat service did not become healthy in time")
+
+
+class LoadDriver:
+    """Concurrent simulated users hitting /chat until the deadline"""
+
+    def __init__(self, base_url, users, duration, think_time, seed):
+        self.base_url = base_url
+        self.users = users
+        self.duration = duration
+        self.think_time = think_time
+        self.seed = seed
+        self.results = []
+        self._lock = threading.Lock()
+
+    def _user(self, index, deadline):
+        rng = random.Random(self.seed + index)
+        session = requests.Session()
+        user_id = f"loadtest-user-{index}"
+        while time.time() < deadline:
+            kind, message = rng.choice(MESSAGE_CORPUS)
+            mode = rng.choice(MODES)
+            started = time.perf_counter()
+            entry = {'kind': kind, 'mode': mode}
+            try:
+                response = session.post(f"{self.base_url}/chat", json={'message': message, 'user_id': user_id, 'mode': mode}, timeout=120)
+                entry['status'] = response.status_code
+                if response.status_code == 200:
+                    body = response.json()
+                    entry['ai_powered'] = body.get('ai_powered')
+                    entry['is_throttled'] = body.get('is_throttled')
+                    entry['model'] = body.get('model_used')
+            except requests.exceptions.RequestException as e:
+                entry['status'] = 0
+                entry['error'] = type(e).__name__
+            entry['latency_ms'] = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.results.append(entry)
+            if self.think_time:
+                time.sleep(rng.uniform(0, self.think_time))
+
+    def run(self):
+        deadline = time.time() + self.duration
+        threads = [threading.Thread(target=self._user, args=(index, deadline), daemon=True) for index in range(self.users)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))], 2)
+
+
+def summarize(results, elapsed):
+    latencies = sorted(entry['latency_ms'] for entry in results)
+    succeeded = [entry for entry in results if entry['status'] == 200]
+    # Requests that should have reached a model: everything but greetings and explicit Smart Mode
+    ai_eligible = [entry for entry in succeeded if entry['kind'] != 'greeting' and entry['mode'] != 'smart_mode']
+    fallbacks = [entry for entry in ai_eligible if not entry.get('ai_powered')]
+    models = {}
+    for entry in ai_eligible:
+        models[entry.get('model')] = models.get(entry.get('model'), 0) + 1
+    return {
+        'requests': len(results),
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'p50': _percentile(latencies, 0.50),
+            'p95': _percentile(latencies, 0.95),
+            'p99': _percentile(latencies, 0.99),
+            'max': round(latencies[-1], 2) if latencies else None
+        },
+        'error_rate': round(1 - len(succeeded) / len(results), 4) if results else None,
+        'status_counts': {str(status): sum(1 for entry in results if entry['status'] == status)
+                          for status in sorted({entry['status'] for entry in results})},
+        'fallback_rate': round(len(fallbacks) / len(ai_eligible), 4) if ai_eligible else None,
+        'models_used': models
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to drive load')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Max random pause between a user\'s requests (s)')
+    parser.add_argument('--records', type=int, default=1000, help='Records served by the Node stand-in')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--server', choices=['gunicorn', 'flask'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn --workers')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn --threads')
+    parser.add_argument('--target', help='Drive an already running service at this URL instead of starting one')
+    parser.add_argument('--ollama', action='store_true', help='Also route the personal LLM (Ollama) to the stand-in')
+    parser.add_argument('--node-latency', type=float, default=20, help='Node stand-in latency (ms)')
+    parser.add_argument('--node-error-rate', type=float, default=0.0)
+    parser.add_argument('--llm-latency', type=float, default=500, help='LLM stand-in latency (ms)')
+    parser.add_argument('--llm-jitter', type=float, default=200, help='LLM latency jitter (+/- ms)')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--llm-429-rate', type=float, default=0.0)
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    parser.add_argument('--log-level', default='WARNING', help='LOG_LEVEL for the service under test')
+    parser.add_argument('--service-logs', action='store_true', help='Show the service\'s stdout')
+    parser.add_argument('--output', help='Write the JSON report here as well')
+    args = parser.parse_args()
+
+    node = start_node_stub(args.records, FaultProfile(args.node_latency, error_rate=args.node_error_rate, seed=args.seed), seed=args.seed)
+    llm = start_llm_stub(FaultProfile(args.llm_latency, args.llm_jitter, args.llm_error_rate, args.llm_429_rate, seed=args.seed))
+    print(f"Node stand-in at {node.url}, LLM stand-in at {llm.url}", file=sys.stderr)
+
+    process = None
+    try:
+        if args.target:
+            base_url = args.target.rstrip('/')
+        else:
+            process, base_url = start_service(args, node.url, llm.url)
+        node.faults_enabled = llm.faults_enabled = True
+
+        rss_before = _rss_kb(process.pid) if process else None
+        driver = LoadDriver(base_url, args.users, args.duration, args.think_time, args.seed)
+        elapsed = driver.run()
+        rss_after = _rss_kb(process.pid) if process else None
+
+        report = {
+            'meta': {
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'server': 'external' if args.target else args.server,
+                'workers': args.workers,
+                'threads': args.threads,
+                'users': args.users,
+                'records': args.records,
+                'faults': {
+                    'node_latency_ms': args.node_latency, 'node_error_rate': args.node_error_rate,
+                    'llm_latency_ms': args.llm_latency, 'llm_jitter_ms': args.llm_jitter,
+                    'llm_error_rate': args.llm_error_rate, 'llm_429_rate': args.llm_429_rate
+                }
+            },
+            **summarize(driver.results, elapsed),
+            'upstream_requests': {'node': node.requests, 'llm': llm.requests},
+            'memory_kb': {
+                'rss_before': rss_before,
+                'rss_after': rss_after,
+                'growth': rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            }
+        }
+    finally:
+        if process:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        node.stop()
+        llm.stop()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
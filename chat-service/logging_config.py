@@ -0,0 +1,135 @@
+"""
+Structured, leveled logging for the chat service.
+
+- LOG_LEVEL sets the baseline level (default INFO).
+- LOG_SAMPLE_RATE (0.0-1.0) turns on DEBUG output for a random share of
+  requests; everything else in those requests logs at the baseline level.
+- LOG_FORMAT is 'json' (one object per line, default) or 'text'.
+
+Records go through a QueueHandler so request threads never block on stdout;
+they are queued unformatted and a QueueListener thread does all the
+formatting (message, traceback) and writing. Arguments are therefore read
+after the call returns, so don't mutate them once logged. Use %-style
+arguments (logger.debug("x %s", y)) so messages are only formatted when a
+record is actually emitted, and guard per-record loops with debug_enabled().
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+
+LOGGER_NAME = 'chat-service'
+
+# Per-request state, set by begin_request()
+_request_id = contextvars.ContextVar('request_id', default=None)
+_sampled = contextvars.ContextVar('sampled', default=False)
+
+_base_level = logging.INFO
+_listener = None
+
+# Incoming request ids end up in every log line and response header
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9-]{1,64}')
+
+
+def get_logger(name=None):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def begin_request(request_id=None):
+    """Tag the current request (a missing or malformed id gets a new one) and decide whether it is sampled for DEBUG output"""
+    if not request_id or not REQUEST_ID_PATTERN.fullmatch(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    _request_id.set(request_id)
+    sample_rate = float(os.getenv('LOG_SAMPLE_RATE', 0))
+    _sampled.set(sample_rate > 0 and random.random() < sample_rate)
+    return request_id
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def debug_enabled():
+    """Cheap check for guarding expensive or per-record DEBUG logging"""
+    return _base_level <= logging.DEBUG or _sampled.get()
+
+
+class SamplingFilter(logging.Filter):
+    """Drop below-baseline records unless the current request was sampled"""
+
+    def filter(self, record):
+        if record.levelno >= _base_level or _sampled.get():
+            record.request_id = _request_id.get()
+            return True
+        return False
+
+
+class RawQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue the record as logged; the listener thread merges args and formats exc_info"""
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with any `extra=` fields merged in"""
+
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        for key, value in vars(record).items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging():
+    """Install the queue-backed handler on the service logger (idempotent)"""
+    global _base_level, _listener
+    if _listener is not None:
+        return get_logger()
+
+    _base_level = logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+    if not isinstance(_base_level, int):
+        _base_level = logging.INFO
+    sampling = float(os.getenv('LOG_SAMPLE_RATE', 0)) > 0
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv('LOG_FORMAT', 'json').lower() == 'text':
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(message)s'))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    # Filter on the handler (not the logger) so child loggers are covered too
+    queue_handler = RawQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    logger = get_logger()
+    logger.handlers[:] = [queue_handler]
+    # Sampled requests need DEBUG records created; the filter drops the rest
+    logger.setLevel(logging.DEBUG if sampling else _base_level)
+    logger.propagate = False
+    return logger
@@ -0,0 +1,133 @@
+"""
+Rolling conversation memory.
+
+Keeps a short summary of older exchanges next to each user's raw history.
+Once the raw turns not yet covered by the summary grow past a token
+threshold, all but the most recent ones are folded into the summary, either
+inline with the cheap rule-based summarizer or in a background thread with a
+model-backed summarizer so the request never waits on it.
+"""
+import re
+import threading
+from datetime import datetime
+
+from logging_config import get_logger
+from prompt_builder import estimate_tokens, truncate_to_tokens
+
+logger = get_logger('memory')
+
+SUMMARY_THRESHOLD_TOKENS = 600  # Raw history above this gets compacted
+KEEP_RECENT_EXCHANGES = 1  # Newest exchanges always sent verbatim
+SUMMARY_MAX_TOKENS = 300
+
+MARKDOWN_NOISE = re.compile(r"[*_`#>]+")
+
+
+def _first_line(text, max_tokens):
+    """First meaningful line of a (markdown) answer, shortened"""
+    for line in (text or '').splitlines():
+        line = MARKDOWN_NOISE.sub('', line).strip(' •-')
+        if line:
+            return truncate_to_tokens(line, max_tokens)
+    return ''
+
+
+def _cap_summary(text):
+    """Keep the newest summary lines that fit SUMMARY_MAX_TOKENS"""
+    lines = text.splitlines()
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > SUMMARY_MAX_TOKENS:
+        lines.pop(0)
+    return truncate_to_tokens("\n".join(lines), SUMMARY_MAX_TOKENS)
+
+
+def rule_based_summary(previous_summary, exchanges):
+    """Append one line per exchange: the question and the gist of the answer"""
+    lines = [previous_summary] if previous_summary else []
+    for exchange in exchanges:
+        question = truncate_to_tokens(exchange['user'].strip(), 30)
+        answer = _first_line(exchange['assistant'], 30)
+        lines.append(f"- Student asked: {question} | HunniBee: {answer}")
+    return _cap_summary("\n".join(lines))
+
+
+class ConversationMemory:
+    """Per-user rolling summaries stored alongside the raw conversation history"""
+
+    def __init__(self, summarizer=rule_based_summary, run_async=False,
+                 threshold_tokens=SUMMARY_THRESHOLD_TOKENS, keep_recent=KEEP_RECENT_EXCHANGES):
+        self.summarizer = summarizer
+        self.run_async = run_async
+        self.threshold_tokens = threshold_tokens
+        self.keep_recent = keep_recent
+        # user_id -> {'text', 'covered_until' (timestamp of last folded exchange), 'updated_at'}
+        self.summaries = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        return self.summaries.get(user_id)
+
+    def clear(self, user_id):
+        with self._lock:
+            self.summaries.pop(user_id, None)
+
+    def _uncovered(self, user_id, history):
+        summary = self.summaries.get(user_id)
+        if not summary:
+            return list(history)
+        return [exchange for exchange in history if exchange['timestamp'] > summary['covered_until']]
+
+    def for_prompt(self, user_id, history):
+        """
+        Return (summary_text, recent_exchanges) to send in place of raw history.
+
+        Compacts first when the uncovered turns exceed the threshold; with an
+        async summarizer the fold happens in the background and this request
+        uses the previous summary plus raw turns.
+        """
+        uncovered = self._uncovered(user_id, history)
+        raw_tokens = sum(estimate_tokens(e['user']) + estimate_tokens(e['assistant']) for e in uncovered)
+
+        if raw_tokens > self.threshold_tokens and len(uncovered) > self.keep_recent:
+            to_fold = uncovered[:len(uncovered) - self.keep_recent]
+            if self.run_async:
+                self._fold_in_background(user_id, to_fold)
+            else:
+                self._fold(user_id, to_fold)
+                uncovered = uncovered[-self.keep_recent:]
+
+        summary = self.summaries.get(user_id)
+        return (summary['text'] if summary else None), uncovered
+
+    def _fold(self, user_id, exchanges, summarizer=None):
+        previous = self.summaries.get(user_id)
+        text = (summarizer or self.summarizer)(previous['text'] if previous else None, exchanges)
+        with self._lock:
+            current = self.summaries.get(user_id)
+            # Skip if a concurrent fold already covered these turns
+            if current and current['covered_until'] >= exchanges[-1]['timestamp']:
+                return
+            self.summaries[user_id] = {
+                'text': text,
+                'covered_until': exchanges[-1]['timestamp'],
+                'updated_at': datetime.now().isoformat()
+            }
+        logger.debug("Conversation summary for %s now covers %d more exchange(s)", user_id, len(exchanges))
+
+    def _fold_in_background(self, user_id, exchanges):
+        with self._lock:
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+
+        def run():
+            try:
+                self._fold(user_id, exchanges)
+            except Exception as e:
+                logger.warning("Summary model failed for %s, using rule-based summary: %s", user_id, e)
+                self._fold(user_id, exchanges, summarizer=rule_based_summary)
+            finally:
+                with self._lock:
+                    self._pending.discard(user_id)
+
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,178 @@
+"""
+Minimal Prometheus metrics for the chat service.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus
+text exposition format by the /metrics endpoint. Kept dependency-free so
+the service does not need prometheus_client.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._function = function  # Unlabelled gauges may be computed at scrape time
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        if self._function is not None:
+            return [f"{self.name} {self._function()}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count], sum
+        self._counts = {}
+        self._sums = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=(), function=None):
+    return REGISTRY.register(Gauge(name, documentation, labelnames, function))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Service metrics
+NODE_FETCH_SECONDS = histogram('chat_node_fetch_seconds', 'Node API fetch time per collection', ['collection'])
+CONTEXT_SELECTION_SECONDS = histogram('chat_context_selection_seconds', 'Time spent ranking context for a message')
+PROMPT_TOKENS = histogram('chat_prompt_tokens', 'Estimated prompt size in tokens', buckets=TOKEN_BUCKETS)
+MODEL_LATENCY_SECONDS = histogram('chat_model_latency_seconds', 'Upstream model call latency', ['model'])
+MODEL_TTFB_SECONDS = histogram('chat_model_time_to_first_byte_seconds', 'Time until the upstream model response headers arrive', ['model'])
+MODEL_QUEUE_WAIT_SECONDS = histogram('chat_model_queue_wait_seconds', 'Time a request waited for a model slot before generation started', ['model'])
+MODEL_REQUESTS = counter('chat_model_requests_total', 'Upstream model calls by outcome (success, failure, rate_limited, overflow)', ['model', 'outcome'])
+MODEL_FALLBACKS = counter('chat_model_fallbacks_total', 'Times the chain moved past a model to the next one', ['model'])
+RULE_BASED_FALLBACKS = counter('chat_rule_based_fallbacks_total', 'AI requests answered by rule-based responses after every model failed')
+STARTUP_SECONDS = gauge('chat_startup_seconds', 'Worker boot time by phase (imports, module_setup, factory, model_probes)', ['phase'])
+WARMUP_RUNS = counter('chat_warmup_runs_total', 'Warmup job runs by outcome (success, failure, skipped)', ['job', 'outcome'])
+WARMUP_SECONDS = histogram('chat_warmup_seconds', 'Warmup job duration', ['job'])
+PREFETCH_RUNS = counter('chat_prefetch_total', 'Speculative follow-up prefetches by outcome (scheduled, skipped_load, skipped_budget, failed)', ['outcome'])
+AI_ADMISSIONS = counter('chat_ai_admissions_total', 'AI requests by budget outcome (admitted, over_requests, over_tokens, queue_timeout)', ['outcome'])
+AI_QUEUE_WAIT_SECONDS = histogram('chat_ai_queue_wait_seconds', 'Time an AI request waited for a fair-queue slot')
+AI_TOKENS = counter('chat_ai_tokens_total', 'Estimated tokens (prompt + response) charged to user AI budgets')
+CACHE_REQUESTS = counter('chat_cache_requests_total', 'Cache lookups by cache and result (hit, miss)', ['cache', 'result'])
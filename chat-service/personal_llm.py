@@ -0,0 +1,103 @@
+"""
+Admission control and warm-keeping for the personal Ollama server.
+
+Ollama on a single Mac runs a fixed number of generations at once
+(OLLAMA_NUM_PARALLEL) and queues everything else internally, so a burst
+used to stack requests until they hit the 60 s timeout. The dispatcher
+holds one slot per server-side parallel generation: a request waits up to
+`max_wait` seconds for a slot behind at most `max_queue` others, and past
+that raises PersonalLLMBusy so the fallback chain moves on to the next
+provider straight away.
+
+KeepWarm preloads the model whenever the server has been idle for
+`interval` seconds (polled by the warmup scheduler), so the first request
+after a quiet period does not pay the model-load cost.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PersonalLLMBusy(Exception):
+    """No generation slot became free in time; try the next provider"""
+
+
+class PersonalLLMDispatcher:
+    def __init__(self, parallelism=1, max_queue=2, max_wait=5.0):
+        self.parallelism = max(1, parallelism)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.waiting = 0
+        self.last_used = time.monotonic()
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Hold a generation slot for the body; yields the seconds spent queued"""
+        started = time.monotonic()
+        with self._condition:
+            if self.in_flight >= self.parallelism:
+                if self.waiting >= self.max_queue:
+                    raise PersonalLLMBusy(f"Personal LLM busy: {self.in_flight} in flight, {self.waiting} queued")
+                self.waiting += 1
+                try:
+                    deadline = started + self.max_wait
+                    while self.in_flight >= self.parallelism:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise PersonalLLMBusy(f"Personal LLM busy: no slot within {self.max_wait:g}s")
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+        try:
+            yield time.monotonic() - started
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self.last_used = time.monotonic()
+                self._condition.notify()
+
+    @contextmanager
+    def idle_slot(self):
+        """Take a slot only if the server is idle; yields False (and holds nothing) otherwise"""
+        with self._condition:
+            if self.in_flight or self.waiting:
+                acquired = False
+            else:
+                self.in_flight += 1
+                acquired = True
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with self._condition:
+                    self.in_flight -= 1
+                    self.last_used = time.monotonic()
+                    self._condition.notify()
+
+    def idle_seconds(self):
+        with self._condition:
+            if self.in_flight:
+                return 0.0
+            return time.monotonic() - self.last_used
+
+
+class KeepWarm:
+    """Calls `preload()` once the server has been idle `interval` seconds; run_once() is polled by the warmup scheduler"""
+
+    def __init__(self, dispatcher, preload, interval):
+        self.dispatcher = dispatcher
+        self.preload = preload
+        self.interval = interval
+
+    def run_once(self):
+        """Preload if the server has been idle long enough; True if a preload was sent"""
+        if self.dispatcher.idle_seconds() < self.interval:
+            return False
+        with self.dispatcher.idle_slot() as acquired:
+            if not acquired:
+                return False
+            self.preload()
+            return True
@@ -0,0 +1,100 @@
+"""
+Speculative preparation of predicted follow-up messages.
+
+When a /chat answer offers a chat_action button (e.g. "Show my schedules
+for next week" under the weekly view), the likely next message is known.
+Prefetcher prepares it in the background and parks the result in a
+SpeculativeCache for a short time; if the user clicks, the request picks it
+up instead of starting from scratch.
+
+Speculation must never compete with real traffic: a prefetch is skipped
+when more than `max_active_requests` requests are being served, when
+`max_in_flight` prefetches are already running, or when the per-minute
+budget is spent.
+"""
+import threading
+import time
+
+
+class SpeculativeCache:
+    """Short-lived, take-once entries keyed by (user, message), tagged with the data version they were built from"""
+
+    def __init__(self, ttl=60.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, value, version)
+        self._lock = threading.Lock()
+
+    def put(self, key, value, version=None):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: entry for k, entry in self._entries.items() if entry[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (now + self.ttl, value, version)
+
+    def take(self, key, version=None):
+        """The entry for key if present, fresh and built from version (removing it), else None"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic() or entry[2] != version:
+            return None
+        return entry[1]
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+
+class Prefetcher:
+    def __init__(self, max_in_flight=1, per_minute=30, max_active_requests=2, active_requests=None, on_outcome=None):
+        self.max_in_flight = max_in_flight
+        self.per_minute = per_minute
+        self.max_active_requests = max_active_requests
+        self.active_requests = active_requests or (lambda: 0)
+        self.on_outcome = on_outcome  # Called with scheduled, skipped_load, skipped_budget, failed
+        self.in_flight = 0
+        self._tokens = float(per_minute)
+        self._refilled = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _outcome(self, outcome):
+        if self.on_outcome:
+            self.on_outcome(outcome)
+
+    def _admit(self):
+        """Reserve a prefetch slot and budget token; returns the refusal outcome or None"""
+        if self.active_requests() > self.max_active_requests:
+            return 'skipped_load'
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.per_minute), self._tokens + (now - self._refilled) * self.per_minute / 60.0)
+            self._refilled = now
+            if self.in_flight >= self.max_in_flight or self._tokens < 1:
+                return 'skipped_budget'
+            self._tokens -= 1
+            self.in_flight += 1
+        return None
+
+    def _run(self, function, logger):
+        try:
+            function()
+        except Exception as e:
+            self._outcome('failed')
+            if logger:
+                logger.warning("Prefetch failed: %s", e)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def submit(self, function, logger=None):
+        """Run function() in the background if load and budget allow; True if started"""
+        refusal = self._admit()
+        if refusal:
+            self._outcome(refusal)
+            return False
+        self._outcome('scheduled')
+        threading.Thread(target=self._run, args=(function, logger), daemon=True, name='prefetch').start()
+        return True
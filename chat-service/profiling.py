@@ -0,0 +1,152 @@
+"""
+On-demand profiling of individual requests.
+
+Two modes:
+- 'sample': a background thread samples the request thread's stack every few
+  milliseconds and produces collapsed stacks (flamegraph.pl / speedscope input).
+  Low overhead, safe on production traffic.
+- 'cprofile': deterministic cProfile run, reported as pstats text. Only one
+  profiler can be active per process (enforced since Python 3.12), so while
+  one cprofile run is in progress other requests fall back to sampling.
+
+ProfileStore keeps the slowest N profiled requests in memory and can also
+write each profile to PROFILE_DIR.
+"""
+import collections
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+PROFILE_MODES = ('sample', 'cprofile')
+SAMPLE_INTERVAL = 0.005
+
+_cprofile_lock = threading.Lock()  # Held for the duration of a cprofile run
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack and aggregates collapsed stacks"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(self.counts.items()))
+
+
+def profile_call(function, mode='sample'):
+    """
+    Run function under the chosen profiler; returns (result, profile_text, mode).
+    The returned mode is 'sample' when cprofile was asked for while another
+    cprofile run held the process's profiler.
+    """
+    if mode == 'cprofile' and _cprofile_lock.acquire(blocking=False):
+        try:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(function)
+        finally:
+            _cprofile_lock.release()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(60)
+        return result, output.getvalue(), 'cprofile'
+
+    sampler = SamplingProfiler(threading.get_ident()).start()
+    try:
+        result = function()
+    finally:
+        profile_text = sampler.stop()
+    return result, profile_text, 'sample'
+
+
+class ProfileStore:
+    """Keeps the slowest `capacity` profiled requests plus the most recent explicitly requested ones"""
+
+    def __init__(self, capacity=20, directory=None):
+        self.capacity = capacity
+        self.directory = directory
+        self._slowest = []  # (duration_ms, id) min-heap
+        self._recent = collections.deque(maxlen=capacity)
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def add(self, duration_ms, mode, profile_text, label='', requested=False):
+        profile_id = uuid.uuid4().hex[:12]
+        entry = {
+            'id': profile_id,
+            'duration_ms': round(duration_ms, 2),
+            'mode': mode,
+            'format': 'collapsed' if mode == 'sample' else 'pstats',
+            'label': label,
+            'requested': requested,
+            'created_at': datetime.now().isoformat(),
+            'profile': profile_text
+        }
+
+        with self._lock:
+            self._profiles[profile_id] = entry
+            evicted = []
+            if requested:
+                if len(self._recent) == self._recent.maxlen:
+                    evicted.append(self._recent[0])
+                self._recent.append(profile_id)
+            if len(self._slowest) < self.capacity:
+                heapq.heappush(self._slowest, (duration_ms, profile_id))
+            elif duration_ms > self._slowest[0][0]:
+                evicted.append(heapq.heapreplace(self._slowest, (duration_ms, profile_id))[1])
+            else:
+                evicted.append(profile_id)
+            # Drop bodies no longer referenced by either list
+            slowest_ids = {entry_id for _, entry_id in self._slowest}
+            for entry_id in evicted:
+                if entry_id not in slowest_ids and entry_id not in self._recent:
+                    self._profiles.pop(entry_id, None)
+
+        if self.directory:
+            extension = 'collapsed.txt' if mode == 'sample' else 'pstats.txt'
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{int(time.time())}-{profile_id}.{extension}")
+            with open(path, 'w') as profile_file:
+                profile_file.write(profile_text)
+        return profile_id
+
+    def summaries(self):
+        """Stored profiles without their bodies, slowest first"""
+        with self._lock:
+            entries = [dict(entry) for entry in self._profiles.values()]
+        for entry in entries:
+            entry.pop('profile')
+        return sorted(entries, key=lambda entry: entry['duration_ms'], reverse=True)
+
+    def get(self, profile_id):
+        return self._profiles.get(profile_id)
@@ -0,0 +1,202 @@
+"""
+Token-budgeted prompt assembly for the AI fallback chain.
+
+Each model gets a prompt budget. The fixed parts (persona, instructions,
+date and question) are always kept; whatever is left is split between
+conversation history and academic data. History loses its oldest exchanges
+first and long assistant answers are truncated; academic data loses its
+lowest-scored items first.
+"""
+import math
+
+# Rough chars-per-token ratio for English prose on Llama/Mistral/Gemini tokenizers
+CHARS_PER_TOKEN = 4
+
+DEFAULT_PROMPT_BUDGET = 3000
+HISTORY_SHARE = 0.3  # Share of the flexible budget reserved for history
+MAX_HISTORY_EXCHANGES = 3
+MAX_HISTORY_ANSWER_TOKENS = 250  # Long assistant answers (weekly schedules) are cut to this
+
+NO_DATA_TEXT = "NO DATA AVAILABLE - The student has no schedules, tasks, or announcements in the database for this query."
+
+CONTEXT_SECTIONS = (
+    ('schedule', 'SCHEDULES'),
+    ('task', 'TASKS'),
+    ('announcement', 'ANNOUNCEMENTS')
+)
+
+# Static persona and instructions. This is sent first and must stay
+# byte-identical between requests so provider prefix caches and Ollama's
+# KV cache can reuse it - never interpolate dates, names or data here.
+SYSTEM_PROMPT = """You are HunniBee, a friendly and helpful academic assistant for a student. You can have normal conversations while also helping with academic information.
+
+INSTRUCTIONS:
+- You can engage in normal, friendly conversation about any topic
+- For ACADEMIC QUERIES (schedules, tasks, assignments, announcements): Use information from the "AVAILABLE ACADEMIC DATA" section of the student's message
+- The academic data includes complete information with dates, times, and locations - use this information to answer questions
+- For academic data, be accurate and don't invent schedules, tasks, or announcements not listed
+- When answering follow-up questions like "how about tomorrow?" or "what about next class?", look through ALL the academic data provided to find relevant information
+- If you see schedule data in the available academic data, you can discuss it and identify which schedules are for today, tomorrow, or other specific dates
+- Use the "Current Date and Time" given in the student's message as today's date
+- For general questions, study tips, motivation, or casual conversation: Respond naturally and helpfully
+- Use a friendly, encouraging tone with appropriate emojis
+- Keep responses engaging and helpful"""
+
+# Rolling summary of older exchanges (see memory.py). Changes only when
+# turns are folded in, so it opens the first user turn right after the
+# static prefix. It is not a second system message: several free models'
+# chat templates reject system messages after the first one or require
+# strict user/assistant alternation.
+SUMMARY_TEMPLATE = """Summary of the earlier conversation with this student:
+{summary}"""
+
+# Volatile per-request part, sent after the system prompt and history
+REQUEST_TEMPLATE = """Current Date and Time: {current_date} at {current_time} {timezone_info}
+
+AVAILABLE ACADEMIC DATA:
+{context_text}
+
+User's current question: {message}"""
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (no tokenizer dependency)"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to roughly max_tokens, marking the cut"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - 3)
+    return text[:max_chars].rstrip() + "..."
+
+
+def format_context_text(context):
+    """Group context items by type into numbered sections"""
+    if not context:
+        return NO_DATA_TEXT
+
+    context_sections = []
+    for record_type, heading in CONTEXT_SECTIONS:
+        items = [c for c in context if c['type'] == record_type]
+        if not items:
+            continue
+        prefix = "\n" if context_sections else ""
+        context_sections.append(f"{prefix}{heading} ({len(items)} found):")
+        for i, item in enumerate(items, 1):
+            context_sections.append(f"{i}. {item['content']}")
+    return "\n".join(context_sections)
+
+
+def fit_history(conversation_history, budget):
+    """Keep the newest exchanges that fit in budget, oldest first, as chat messages"""
+    exchanges = []
+    used = 0
+    for msg in reversed(conversation_history[-MAX_HISTORY_EXCHANGES:]):
+        answer = truncate_to_tokens(msg['assistant'], MAX_HISTORY_ANSWER_TOKENS)
+        cost = estimate_tokens(msg['user']) + estimate_tokens(answer) + 8  # per-message overhead
+        if used + cost > budget:
+            break
+        exchanges.append([
+            {"role": "user", "content": msg['user']},
+            {"role": "assistant", "content": answer}
+        ])
+        used += cost
+    exchanges.reverse()
+    return [message for exchange in exchanges for message in exchange], len(exchanges), used
+
+
+def fit_context(context, budget):
+    """Drop the lowest-scored context items until the rest fit; keeps original order"""
+    if not context:
+        return []
+
+    # Items without a score (e.g. "no classes today" notes) are always most valuable
+    by_value = sorted(range(len(context)), key=lambda i: -context[i].get('score', math.inf))
+    kept = set()
+    used = 0
+    for index in by_value:
+        cost = estimate_tokens(context[index]['content']) + 2
+        if used + cost > budget:
+            continue
+        kept.add(index)
+        used += cost
+    return [item for i, item in enumerate(context) if i in kept]
+
+
+def flatten_messages(messages):
+    """Render chat messages as one prompt string for single-text APIs (Gemini)"""
+    labels = {"user": "User", "assistant": "Assistant"}
+    parts = []
+    for message in messages:
+        if message["role"] == "system":
+            parts.append(message["content"])
+        else:
+            parts.append(f"{labels[message['role']]}: {message['content']}")
+    parts.append("Assistant:")
+    return "\n\n".join(parts)
+
+
+def build_prompt(message, context, conversation_history, current_date, current_time, timezone_info,
+                 budget=DEFAULT_PROMPT_BUDGET, conversation_summary=None):
+    """
+    Assemble chat messages within `budget` tokens.
+
+    Layout is stable prefix first: the static system prompt, earlier
+    exchanges as user/assistant turns, then one volatile user message with
+    the date, academic data and question. The rolling conversation summary
+    (if any) is prepended to the first user turn, so there is exactly one
+    system message and roles strictly alternate.
+
+    Returns (messages, report) where report records the token estimate of
+    each part and how many history exchanges and context items survived.
+    """
+    fixed_request = REQUEST_TEMPLATE.format(
+        current_date=current_date, current_time=current_time, timezone_info=timezone_info,
+        context_text="", message=message
+    )
+    fixed_tokens = SYSTEM_PROMPT_TOKENS + estimate_tokens(fixed_request)
+    flexible_budget = max(0, budget - fixed_tokens)
+
+    # History gets its share first (summary before raw turns); context may
+    # use whatever history leaves over
+    history_budget = int(flexible_budget * HISTORY_SHARE)
+    summary_prefix = ""
+    if conversation_summary:
+        heading_tokens = estimate_tokens(SUMMARY_TEMPLATE.format(summary="") + "\n\n")
+        summary_text = truncate_to_tokens(conversation_summary, max(0, history_budget - heading_tokens))
+        summary_prefix = SUMMARY_TEMPLATE.format(summary=summary_text) + "\n\n"
+        history_budget -= estimate_tokens(summary_prefix)
+    history_messages, history_kept, history_tokens = fit_history(conversation_history or [], max(0, history_budget))
+    history_tokens += estimate_tokens(summary_prefix)
+
+    kept_context = fit_context(context, flexible_budget - history_tokens)
+    context_text = format_context_text(kept_context)
+
+    request_content = REQUEST_TEMPLATE.format(
+        current_date=current_date, current_time=current_time, timezone_info=timezone_info,
+        context_text=context_text, message=message
+    )
+    turns = history_messages + [{"role": "user", "content": request_content}]
+    if summary_prefix:
+        turns[0] = {"role": "user", "content": summary_prefix + turns[0]["content"]}
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}] + turns
+
+    report = {
+        'budget': budget,
+        'total_tokens': SYSTEM_PROMPT_TOKENS + history_tokens + estimate_tokens(request_content),
+        'fixed_tokens': fixed_tokens,
+        'history_tokens': history_tokens,
+        'context_tokens': estimate_tokens(context_text),
+        'history_exchanges': history_kept,
+        'history_summarized': bool(summary_prefix),
+        'context_items': len(kept_context),
+        'context_items_dropped': len(context or []) - len(kept_context)
+    }
+    return messages, report
@@ -0,0 +1,235 @@
+"""
+Typed records for Node API data.
+
+Schedules, tasks and announcements are converted once at ingest into
+__slots__ objects holding only the fields the chat service uses, with
+dates pre-parsed and search tokens pre-computed. RecordCache reuses the
+converted object for any record whose id and updatedAt are unchanged
+since the previous snapshot, so an unchanged feed costs one dict lookup
+per record instead of re-parsing and re-tokenizing everything, and an
+unchanged snapshot comes back as the same object with its BM25 indexes.
+
+PartitionedRecordCache keeps one RecordCache per scope (a user, when the
+Node API is asked for user-scoped data) and evicts partitions that have
+been idle too long. Collections common to every user (announcements) are
+interned across partitions, so N users share one copy of each record.
+"""
+import collections
+import hashlib
+import json
+import threading
+import time
+import weakref
+from datetime import datetime
+
+from retrieval import BM25Index, tokenize
+
+CLOSED_TASK_STATUSES = ('completed', 'cancelled')
+
+
+def parse_datetime(value):
+    """Aware/naive datetime of an ISO string (trailing Z allowed), or None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+
+
+class Schedule:
+    __slots__ = ('id', 'fingerprint', 'subject', 'room', 'day', 'description', 'status', 'date_text',
+                 'starts_at', 'date', 'start_time', 'end_time', 'search_text', 'tokens', '__weakref__')
+    record_type = 'schedule'
+
+    @classmethod
+    def from_json(cls, raw, record_id, fingerprint):
+        self = cls()
+        self.id = record_id
+        self.fingerprint = fingerprint
+        self.subject = raw.get('subject')
+        self.room = raw.get('room')
+        self.day = raw.get('day')
+        self.description = raw.get('description')
+        self.status = raw.get('status')
+        self.date_text = raw.get('date', '')
+        self.starts_at = parse_datetime(self.date_text)
+        self.date = self.starts_at.date() if self.starts_at else None
+        self.start_time = raw.get('startTime', 'TBA')
+        self.end_time = raw.get('endTime', 'TBA')
+        self.search_text = " ".join(str(value or '') for value in (self.subject, self.room, self.day, self.description)).lower()
+        self.tokens = tuple(tokenize(self.search_text))
+        return self
+
+
+class Task:
+    __slots__ = ('id', 'fingerprint', 'title', 'class_name', 'type', 'priority', 'status', 'description',
+                 'due_text', 'due_at', 'date', 'is_open', 'search_text', 'tokens', '__weakref__')
+    record_type = 'task'
+
+    @classmethod
+    def from_json(cls, raw, record_id, fingerprint):
+        self = cls()
+        self.id = record_id
+        self.fingerprint = fingerprint
+        self.title = raw.get('title')
+        self.class_name = raw.get('class')
+        self.type = raw.get('type')
+        self.priority = raw.get('priority')
+        self.status = raw.get('status')
+        self.description = raw.get('description')
+        self.due_text = raw.get('dueDate', '')
+        self.due_at = parse_datetime(self.due_text)
+        self.date = self.due_at.date() if self.due_at else None
+        self.is_open = self.status not in CLOSED_TASK_STATUSES
+        self.search_text = " ".join(str(value or '') for value in (self.title, self.class_name, self.type, self.description)).lower()
+        self.tokens = tuple(tokenize(self.search_text))
+        return self
+
+
+class Announcement:
+    __slots__ = ('id', 'fingerprint', 'title', 'description', 'posted_by', 'created_text', 'created_at', 'date',
+                 'search_text', 'tokens', '__weakref__')
+    record_type = 'announcement'
+
+    @classmethod
+    def from_json(cls, raw, record_id, fingerprint):
+        self = cls()
+        self.id = record_id
+        self.fingerprint = fingerprint
+        self.title = raw.get('title')
+        self.description = raw.get('description')
+        self.posted_by = raw.get('postedBy')
+        self.created_text = raw.get('createdAt', '')
+        self.created_at = parse_datetime(self.created_text)
+        self.date = self.created_at.date() if self.created_at else None
+        self.search_text = " ".join(str(value or '') for value in (self.title, self.description)).lower()
+        self.tokens = tuple(tokenize(self.search_text))
+        return self
+
+
+RECORD_CLASSES = {'schedules': Schedule, 'tasks': Task, 'announcements': Announcement}
+
+
+class Snapshot:
+    """One fetch of the user's data as typed records, identified by a content version"""
+    __slots__ = ('schedules', 'tasks', 'announcements', 'version', 'scope', '_indexes')
+
+    def __init__(self, schedules=(), tasks=(), announcements=(), version='empty', scope=None):
+        self.schedules = list(schedules)
+        self.tasks = list(tasks)
+        self.announcements = list(announcements)
+        self.version = version
+        self.scope = scope  # None for the unscoped (global) data
+        self._indexes = {}
+
+    def bm25(self, collection):
+        """BM25 index over one collection's search tokens, built on first use"""
+        index = self._indexes.get(collection)
+        if index is None:
+            index = self._indexes[collection] = BM25Index([record.tokens for record in getattr(self, collection)])
+        return index
+
+    def __len__(self):
+        return len(self.schedules) + len(self.tasks) + len(self.announcements)
+
+
+class RecordCache:
+    """Builds Snapshots from raw API data, reusing records unchanged since the last build"""
+
+    def __init__(self, scope=None, shared=None, shared_collections=()):
+        self.scope = scope
+        self.shared = shared  # Optional cross-partition intern table (weak values)
+        self.shared_collections = frozenset(shared_collections)
+        self._records = {}  # (collection, id, fingerprint) -> record
+        self._last = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, raw_data):
+        with self._lock:
+            previous, last = self._records, self._last
+        current = {}
+        collections = {}
+        version = hashlib.sha1()
+
+        for collection, record_class in RECORD_CLASSES.items():
+            records = []
+            shared = self.shared if collection in self.shared_collections else None
+            for position, raw in enumerate(raw_data.get(collection) or []):
+                record_id = raw.get('_id') or raw.get('id') or f"{collection}-{position}"
+                fingerprint = raw.get('updatedAt') or json.dumps(raw, sort_keys=True, default=str)
+                key = (collection, record_id, fingerprint)
+                record = previous.get(key) or (shared.get(key) if shared is not None else None)
+                if record is None:
+                    record = record_class.from_json(raw, record_id, fingerprint)
+                    if shared is not None:
+                        shared[key] = record
+                current[key] = record
+                records.append(record)
+                version.update(f"{collection}\0{record_id}\0{fingerprint}\n".encode('utf-8'))
+            collections[collection] = records
+
+        version = version.hexdigest()[:16]
+        if last is not None and last.version == version:
+            return last
+
+        snapshot = Snapshot(version=version, scope=self.scope, **collections)
+        with self._lock:
+            self._records, self._last = current, snapshot
+        return snapshot
+
+    def last_version(self):
+        """Version of the most recent snapshot built, or None"""
+        last = self._last
+        return last.version if last is not None else None
+
+
+class PartitionedRecordCache:
+    """RecordCaches per scope with idle eviction; the None scope is the unscoped feed and is never evicted"""
+
+    def __init__(self, max_partitions=256, idle_seconds=1800, shared_collections=('announcements',), on_evict=None):
+        self.max_partitions = max_partitions
+        self.idle_seconds = idle_seconds
+        self.shared_collections = shared_collections
+        self.on_evict = on_evict  # Called with the evicted scope
+        self._shared = weakref.WeakValueDictionary()
+        self._global = RecordCache(shared=self._shared, shared_collections=shared_collections)
+        self._partitions = collections.OrderedDict()  # scope -> (RecordCache, last used), least recently used first
+        self._lock = threading.Lock()
+
+    def _partition(self, scope):
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            entry = self._partitions.pop(scope, None)
+            cache = entry[0] if entry else RecordCache(scope, self._shared, self.shared_collections)
+            self._partitions[scope] = (cache, now)
+            while self._partitions:
+                oldest_scope, (_, last_used) = next(iter(self._partitions.items()))
+                if len(self._partitions) <= self.max_partitions and now - last_used < self.idle_seconds:
+                    break
+                del self._partitions[oldest_scope]
+                evicted.append(oldest_scope)
+        if self.on_evict:
+            for evicted_scope in evicted:
+                self.on_evict(evicted_scope)
+        return cache
+
+    def snapshot(self, raw_data, scope=None):
+        cache = self._global if scope is None else self._partition(scope)
+        return cache.snapshot(raw_data)
+
+    def last_version(self, scope=None):
+        """Version of the scope's most recent snapshot (None if never built or evicted), without touching its LRU slot"""
+        if scope is None:
+            return self._global.last_version()
+        with self._lock:
+            entry = self._partitions.get(scope)
+        return entry[0].last_version() if entry else None
+
+    def __len__(self):
+        """Number of user partitions currently held"""
+        return len(self._partitions)
+
+    def shared_records(self):
+        return len(self._shared)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Replay a captured /chat log (see capture.py) against the current build.
+
+Each captured request is sent through the Flask test client with the Node
+API and every model stubbed from the recording: fetch_user_data returns the
+recorded snapshot and each model attempt returns (or fails with) what it
+did live. The report compares the service's own processing time with the
+replayed time, both without upstream time: model time comes off the
+recorded latency, and the fetch stage (a live Node fetch when recorded, a
+recorded snapshot when replayed) comes off both sides. It also diffs the
+responses:
+
+    python replay.py captures/capture-1234-1760000000.jsonl.gz --output report.json
+    python replay.py capture.jsonl.gz --realtime-llm   # also sleep for recorded model latency
+
+Responses that mention relative dates ("in 3 days") differ when the replay
+runs on a different day than the capture. Captures made before fetch_ms
+was recorded still include the Node fetch in the recorded time.
+"""
+import argparse
+import difflib
+import json
+import os
+import sys
+import time
+
+# Keep the app from probing real providers or warming up; models are stubbed below
+for key in ('OPENROUTER_API_KEY', 'GEMINI_API_KEY', 'PERSONAL_LLM_URL', 'SUMMARY_MODEL', 'CAPTURE_DIR'):
+    os.environ[key] = ''
+os.environ['MODEL_PROBES'] = 'off'
+os.environ['WARMUP'] = 'off'  # No background fetches against the real Node API
+os.environ['PREFETCH'] = 'off'  # Every replayed request fetches its own recorded snapshot
+os.environ['AI_QUOTAS'] = 'off'  # Recorded sessions would otherwise run into the per-user budgets
+os.environ.setdefault('LOG_LEVEL', 'ERROR')  # Replayed model failures would otherwise flood stderr
+
+from capture import fetch_stage_ms, read_capture
+from tracing import stage
+
+
+class RecordedUpstream:
+    """Serves one captured request's snapshots and model calls in order"""
+
+    def __init__(self, snapshots, realtime=False):
+        self.snapshots = snapshots
+        self.realtime = realtime
+        self.data = []
+        self.calls = []
+        self.unrecorded_calls = 0
+
+    def load(self, record):
+        self.data = [self.snapshots[version] for version in record['snapshots'] if version in self.snapshots]
+        self.calls = list(record['model_calls'])
+        self.unrecorded_calls = 0
+
+    def fetch_user_data(self):
+        if len(self.data) > 1:
+            return self.data.pop(0)
+        return self.data[0] if self.data else {'schedules': [], 'tasks': [], 'announcements': []}
+
+    def model_call(self):
+        if not self.calls:
+            self.unrecorded_calls += 1
+            raise Exception("Replay: no recorded model call left for this request")
+        call = self.calls.pop(0)
+        if self.realtime:
+            time.sleep(call['ms'] / 1000)
+        if call['outcome'] == 'success':
+            return call.get('content', '')
+        raise Exception(call.get('error') or call['outcome'])
+
+
+class _RecordedGemini:
+    def __init__(self, upstream):
+        self.upstream = upstream
+
+    def generate_content(self, prompt):
+        return type('RecordedResponse', (), {'text': self.upstream.model_call()})()
+
+
+def install_stubs(app_module, upstream, working_models):
+    def fetch_user_data(user_id=None):
+        with stage('fetch'):  # Same stage as the live fetch, so it can be taken out of both timings
+            return app_module.record_cache.snapshot(upstream.fetch_user_data())
+    app_module.ContextManager.fetch_user_data = staticmethod(fetch_user_data)
+    app_module.call_openrouter_api = lambda model, messages, **kwargs: upstream.model_call()
+    app_module.call_personal_llm_api = lambda model, messages, **kwargs: upstream.model_call()
+    app_module.gemini_model = _RecordedGemini(upstream)
+    # Same chain as the captured process, in the configured order
+    app_module.WORKING_MODELS[:] = [model for model in app_module.MODEL_CHAIN if model['name'] in working_models]
+    app_module.throttled_models.clear()
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * fraction))], 2) if values else None
+
+
+def replay(path, realtime=False, show_diffs=5):
+    import app as app_module
+
+    snapshots, chats, working_models = {}, [], []
+    for record in read_capture(path):
+        if record['t'] == 'meta':
+            working_models = record.get('working_models', [])
+        elif record['t'] == 'snapshot':
+            snapshots[record['version']] = record['data']
+        elif record['t'] == 'chat':
+            chats.append(record)
+
+    upstream = RecordedUpstream(snapshots, realtime)
+    install_stubs(app_module, upstream, working_models)
+    client = app_module.app.test_client()
+
+    entries, diffs = [], []
+    for record in chats:
+        upstream.load(record)
+        if record.get('chain') is not None:
+            # Chain as it stood for this request (older captures only have the startup chain)
+            app_module.WORKING_MODELS[:] = [model for model in app_module.MODEL_CHAIN if model['name'] in record['chain']]
+        started = time.perf_counter()
+        response = client.post('/chat', json={'message': record['message'], 'user_id': record['user_id'], 'mode': record['mode'],
+                                               'include_timings': True})
+        replay_ms = (time.perf_counter() - started) * 1000
+        timings = (response.get_json(silent=True) or {}).get('timings') or {'stages': []}
+        replay_fetch_ms = fetch_stage_ms(timings['stages']) or 0.0
+
+        model_ms = sum(call['ms'] for call in record['model_calls'])
+        recorded_fetch_ms = record.get('fetch_ms') or 0.0
+        before = (record.get('response') or {}).get('response')
+        after = (response.get_json(silent=True) or {}).get('response')
+        matched = response.status_code == record['status'] and before == after
+        entries.append({
+            'request_id': record.get('request_id'),
+            'recorded_ms': record['latency_ms'],
+            'recorded_local_ms': round(max(0.0, record['latency_ms'] - model_ms - recorded_fetch_ms), 2),
+            'recorded_fetch_ms': record.get('fetch_ms'),
+            'replay_ms': round(replay_ms, 2),
+            'replay_local_ms': round(max(0.0, replay_ms - replay_fetch_ms), 2),
+            'matched': matched,
+            'unrecorded_model_calls': upstream.unrecorded_calls
+        })
+        if not matched and len(diffs) < show_diffs:
+            diffs.append("\n".join(difflib.unified_diff(
+                (before or '').splitlines(), (after or '').splitlines(),
+                f"recorded {record.get('request_id')}", 'replayed', lineterm=''
+            )))
+
+    recorded_local = [entry['recorded_local_ms'] for entry in entries]
+    replayed = [entry['replay_local_ms'] for entry in entries]
+    if realtime:
+        recorded_local = [round(entry['recorded_ms'] - (entry['recorded_fetch_ms'] or 0.0), 2) for entry in entries]
+    summary = {
+        'capture': path,
+        'requests': len(entries),
+        'snapshots': len(snapshots),
+        'matched': sum(1 for entry in entries if entry['matched']),
+        'recorded_ms': {'p50': _percentile(recorded_local, 0.5), 'p95': _percentile(recorded_local, 0.95)},
+        'replay_ms': {'p50': _percentile(replayed, 0.5), 'p95': _percentile(replayed, 0.95)},
+        'includes_model_time': realtime,
+        'excludes_fetch_time': all(entry['recorded_fetch_ms'] is not None for entry in entries)
+    }
+    return summary, entries, diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('capture', help='Capture log written with CAPTURE_DIR')
+    parser.add_argument('--realtime-llm', action='store_true', help='Sleep for each recorded model call duration')
+    parser.add_argument('--show-diffs', type=int, default=5, help='Response diffs to print')
+    parser.add_argument('--output', help='Write the per-request report as JSON')
+    args = parser.parse_args()
+
+    summary, entries, diffs = replay(args.capture, args.realtime_llm, args.show_diffs)
+    for diff in diffs:
+        print(diff + "\n", file=sys.stderr)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'summary': summary, 'requests': entries}, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
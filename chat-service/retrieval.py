@@ -0,0 +1,313 @@
+"""
+Relevance scoring for chat context retrieval.
+
+Ranks schedules, tasks and announcements against a user message with BM25
+and keeps only the best k items using a bounded heap. For larger feeds a
+hashed, sparse TF-IDF index scores records with NumPy, reading only the
+columns of the query's terms.
+"""
+import heapq
+import math
+import re
+import zlib
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the BM25 path needs only the stdlib
+    np = None
+
+# BM25 tuning (standard Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that carry no retrieval signal in student questions
+STOPWORDS = frozenset([
+    'a', 'an', 'the', 'and', 'or', 'of', 'to', 'in', 'on', 'at', 'for', 'is',
+    'are', 'am', 'be', 'do', 'does', 'did', 'i', 'me', 'my', 'we', 'our', 'you',
+    'your', 'it', 'its', 'what', 'when', 'where', 'which', 'who', 'how', 'any',
+    'have', 'has', 'had', 'there', 'this', 'that', 'with', 'about', 'can', 'please',
+    'show', 'tell', 'give', 'list', 'all'
+])
+
+
+def tokenize(text):
+    """Split text into lowercase search tokens, dropping stopwords"""
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a list of tokenized documents using an inverted index"""
+
+    def __init__(self, documents, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.doc_count = len(documents)
+        self.doc_lengths = [len(tokens) for tokens in documents]
+        self.avg_doc_length = (sum(self.doc_lengths) / self.doc_count) if self.doc_count else 0.0
+
+        # term -> list of (doc_index, term_frequency)
+        self.postings = {}
+        for doc_index, tokens in enumerate(documents):
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc_index, tf))
+
+        self.idf = {
+            term: math.log(1 + (self.doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def score(self, query_tokens):
+        """Return a {doc_index: score} map for documents matching any query token"""
+        scores = {}
+        if not self.doc_count:
+            return scores
+
+        avg_length = self.avg_doc_length or 1.0
+        for term in set(query_tokens):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_index, tf in postings:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / avg_length
+                term_score = idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+                scores[doc_index] = scores.get(doc_index, 0.0) + term_score
+        return scores
+
+
+def recency_boost(days_away, half_life_days=7.0, weight=1.0):
+    """Boost that decays with distance (in days) from today"""
+    if days_away is None:
+        return 0.0
+    return weight * half_life_days / (half_life_days + abs(days_away))
+
+
+def due_date_boost(days_until_due, status, weight=1.5):
+    """Boost open tasks that are due soon; overdue work ranks just below"""
+    if days_until_due is None or status in ('completed', 'cancelled'):
+        return 0.0
+    if days_until_due < 0:
+        # Overdue items still matter but fade the longer they sit
+        return weight * 0.5 * recency_boost(days_until_due)
+    return weight * recency_boost(days_until_due, half_life_days=3.0)
+
+
+def top_k(scored_items, k):
+    """
+    Select the k highest-scoring items from an iterable of (score, item) pairs.
+
+    Uses a size-bounded min-heap so memory stays O(k) and ties keep their
+    original order. Results are returned best first.
+    """
+    if k <= 0:
+        return []
+
+    heap = []
+    for sequence, (score, item) in enumerate(scored_items):
+        # Negated sequence keeps earlier items ahead of later ones on equal score
+        entry = (score, -sequence, item)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    return [(score, item) for score, _, item in sorted(heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+def numpy_available():
+    """Whether the vectorized TF-IDF engine can be used"""
+    return np is not None
+
+
+class TfidfIndex:
+    """
+    Hashed unigram/bigram TF-IDF vectors over snapshot records.
+
+    Rows are keyed by record identity and refreshed incrementally by `sync`:
+    unchanged records keep their row, edited ones are re-vectorized in place
+    and deleted ones are compacted away; a snapshot version that was already
+    synced is skipped outright. Term buckets come from a fixed-size hash space
+    so the vocabulary never has to be rebuilt. Each row also carries a small
+    vector of numeric features (type, date, status) so callers can apply
+    boosts and filters without touching the Python records.
+
+    Rows are stored sparse (a record has a few dozen non-zero buckets out of
+    `dimensions`): per-row bucket/weight arrays, plus a column-compressed copy
+    rebuilt after changes so a query only reads the columns of its own terms.
+    """
+
+    def __init__(self, dimensions=2048, feature_count=0):
+        if np is None:
+            raise RuntimeError("NumPy is required for the TF-IDF retrieval engine")
+        self.dimensions = dimensions
+        self.rows = []  # per row: (sorted bucket indices, L2-normalized weights)
+        self.features = np.zeros((0, feature_count), dtype=np.float64)
+        self.doc_freq = np.zeros(dimensions, dtype=np.float64)
+        self.keys = []
+        self.payloads = []
+        self.fingerprints = {}
+        self.version = None
+        self._columns = None  # (column pointers, row ids, weights), rebuilt lazily after changes
+        self._bucket_cache = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _bucket(self, term):
+        bucket = self._bucket_cache.get(term)
+        if bucket is None:
+            bucket = zlib.crc32(term.encode('utf-8')) % self.dimensions
+            self._bucket_cache[term] = bucket
+        return bucket
+
+    def _term_counts(self, text):
+        tokens = tokenize(text)
+        terms = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+        counts = {}
+        for term in terms:
+            bucket = self._bucket(term)
+            counts[bucket] = counts.get(bucket, 0) + 1
+        return counts
+
+    def _vectorize(self, text):
+        """Sparse (buckets, weights) row: sublinear term frequencies, L2-normalized"""
+        counts = self._term_counts(text)
+        buckets = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+        weights = 1.0 + np.log(np.fromiter((counts[bucket] for bucket in buckets.tolist()), dtype=np.float32, count=len(counts)))
+        if len(weights):
+            weights /= np.linalg.norm(weights)
+        return buckets, weights
+
+    def sync(self, entries, version=None):
+        """
+        Bring the index in line with the current snapshot.
+
+        `entries` is an iterable of (key, fingerprint, text, payload, features);
+        when `version` matches the last synced version it is not iterated at
+        all. Returns the number of rows that had to be (re)vectorized.
+        """
+        if version is not None and version == self.version:
+            return 0
+
+        positions = {key: row for row, key in enumerate(self.keys)}
+        keep = np.zeros(len(self.keys), dtype=bool)
+        new_rows, new_features, new_keys, new_payloads = [], [], [], []
+        changed = 0
+
+        for key, fingerprint, text, payload, features in entries:
+            row = positions.get(key)
+            if row is not None and self.fingerprints.get(key) == fingerprint:
+                keep[row] = True
+                self.payloads[row] = payload
+                continue
+
+            vector = self._vectorize(text)
+            changed += 1
+            if row is not None:
+                # Edited record: overwrite its row in place
+                self.doc_freq[self.rows[row][0]] -= 1
+                self.rows[row] = vector
+                self.features[row] = features
+                self.payloads[row] = payload
+                keep[row] = True
+            else:
+                new_rows.append(vector)
+                new_features.append(features)
+                new_keys.append(key)
+                new_payloads.append(payload)
+            self.doc_freq[vector[0]] += 1
+            self.fingerprints[key] = fingerprint
+
+        if not keep.all():
+            # Drop records that disappeared from the snapshot
+            for row in np.flatnonzero(~keep):
+                self.doc_freq[self.rows[row][0]] -= 1
+                self.fingerprints.pop(self.keys[row], None)
+            self.rows = [vector for vector, kept in zip(self.rows, keep) if kept]
+            self.features = self.features[keep]
+            self.keys = [key for key, kept in zip(self.keys, keep) if kept]
+            self.payloads = [payload for payload, kept in zip(self.payloads, keep) if kept]
+
+        if new_rows:
+            self.rows.extend(new_rows)
+            self.features = np.vstack([self.features, np.asarray(new_features, dtype=np.float64).reshape(len(new_rows), -1)])
+            self.keys.extend(new_keys)
+            self.payloads.extend(new_payloads)
+
+        if changed or not keep.all():
+            self._columns = None
+        self.version = version
+        return changed
+
+    def columns(self):
+        """Column-compressed copy of the rows: weights of column c are at pointers[c]:pointers[c + 1]"""
+        if self._columns is None:
+            lengths = np.fromiter((len(buckets) for buckets, _ in self.rows), dtype=np.int64, count=len(self.rows))
+            if lengths.sum():
+                buckets = np.concatenate([buckets for buckets, _ in self.rows])
+                weights = np.concatenate([weights for _, weights in self.rows])
+            else:
+                buckets, weights = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+            row_ids = np.repeat(np.arange(len(self.rows), dtype=np.int32), lengths)
+            order = np.argsort(buckets, kind='stable')
+            pointers = np.zeros(self.dimensions + 1, dtype=np.int64)
+            np.cumsum(np.bincount(buckets, minlength=self.dimensions), out=pointers[1:])
+            self._columns = (pointers, row_ids[order], weights[order])
+        return self._columns
+
+    def nbytes(self):
+        """Memory held by the row vectors and their column-compressed copy"""
+        total = sum(buckets.nbytes + weights.nbytes for buckets, weights in self.rows)
+        if self._columns is not None:
+            total += sum(array.nbytes for array in self._columns)
+        return total
+
+    def scores(self, query_text):
+        """Score every row against the query, reading only the query's hashed columns"""
+        scores = np.zeros(len(self.keys), dtype=np.float32)
+        if not self.keys:
+            return scores
+
+        counts = self._term_counts(query_text)
+        if not counts:
+            return scores
+
+        pointers, row_ids, weights = self.columns()
+        idf = np.log((1.0 + len(self.keys)) / (1.0 + self.doc_freq)) + 1.0
+        for bucket in counts:
+            start, end = pointers[bucket], pointers[bucket + 1]
+            if start != end:
+                # Rows are unique within a column, so fancy-index += is safe
+                scores[row_ids[start:end]] += weights[start:end] * np.float32(idf[bucket] ** 2)
+        return scores
+
+
+def recency_boost_array(days_away, half_life_days=7.0, weight=1.0):
+    """Vectorized `recency_boost`; NaN days (no date) give no boost"""
+    boost = weight * half_life_days / (half_life_days + np.abs(days_away))
+    return np.nan_to_num(boost, nan=0.0)
+
+
+def due_date_boost_array(days_until_due, is_open, weight=1.5):
+    """Vectorized `due_date_boost` for rows flagged open (not completed/cancelled)"""
+    upcoming = weight * recency_boost_array(days_until_due, half_life_days=3.0)
+    overdue = weight * 0.5 * recency_boost_array(days_until_due)
+    boost = np.where(days_until_due < 0, overdue, upcoming)
+    return np.where(is_open, boost, 0.0)
+
+
+def top_k_indices(scores, k):
+    """Indices of the k largest finite scores, best first"""
+    candidates = np.flatnonzero(np.isfinite(scores))
+    if k <= 0 or not candidates.size:
+        return candidates[:0]
+    if candidates.size > k:
+        partition = np.argpartition(-scores[candidates], k - 1)[:k]
+        candidates = np.sort(candidates[partition])
+    # Stable sort keeps snapshot order on equal scores
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
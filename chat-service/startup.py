@@ -0,0 +1,41 @@
+"""
+Boot-time accounting for the chat service.
+
+Records how long each startup phase takes (module imports, module setup,
+the app factory, model probes) so slow worker boots can be traced to a
+cause. The report is logged once the factory finishes and exported as the
+chat_startup_seconds gauge.
+"""
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = []  # [{'phase', 'ms'}]
+        self._mark = self.started
+
+    def record(self, name, seconds):
+        self.phases.append({'phase': name, 'ms': round(seconds * 1000, 2)})
+
+    def mark(self, name):
+        """Record the time since the previous mark (or since start) as a phase"""
+        now = time.perf_counter()
+        self.record(name, now - self._mark)
+        self._mark = now
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+            self._mark = time.perf_counter()
+
+    def total_ms(self):
+        return round((self._mark - self.started) * 1000, 2)
+
+    def as_dict(self):
+        return {'total_ms': self.total_ms(), 'phases': list(self.phases)}
@@ -0,0 +1,176 @@
+"""
+Local stand-ins for the Node API and the LLM providers.
+
+Used by loadtest.py so the chat service can be driven end to end on an
+offline machine. Each server answers with realistic payloads and can inject
+latency, errors and 429s; faults stay off until `faults_enabled` is set so
+the service's startup model probe sees every model as working.
+
+Routes:
+- Node:       GET  /api/schedules, /api/tasks, /api/announcements
+- OpenRouter: POST /v1/chat/completions
+- Ollama:     POST /api/chat
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic_data import generate_dataset
+
+
+class FaultProfile:
+    """Latency and failure injection for one stand-in server"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        seconds = max(0.0, self.latency_ms + jitter) / 1000
+        if seconds:
+            time.sleep(seconds)
+
+    def outcome(self):
+        """'error', 'rate_limited' or 'ok' for the next request"""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 'rate_limited'
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 'error'
+        return 'ok'
+
+
+class StubServer:
+    """Threaded HTTP server on a free localhost port, running in a daemon thread"""
+
+    def __init__(self, handler_class, faults=None):
+        self.faults = faults or FaultProfile()
+        self.faults_enabled = False
+        self.requests = 0
+        self._counter_lock = threading.Lock()
+
+        stub = self
+
+        class Handler(handler_class):
+            server_stub = stub
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._counter_lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    server_stub = None
+    protocol_version = 'HTTP/1.1'
+    # Keep-alive responses are written as separate header and body segments;
+    # with Nagle on, the body waits for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Keep load test output readable
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def inject_fault(self):
+        """Apply latency and send an injected failure; returns True when the request was answered"""
+        stub = self.server_stub
+        stub.count_request()
+        if not stub.faults_enabled:
+            return False
+        stub.faults.delay()
+        outcome = stub.faults.outcome()
+        if outcome == 'rate_limited':
+            self.send_json(429, {'error': {'code': 429, 'message': 'Rate limit exceeded (stand-in)'}})
+            return True
+        if outcome == 'error':
+            self.send_json(503, {'error': {'code': 503, 'message': 'Upstream unavailable (stand-in)'}})
+            return True
+        return False
+
+
+class NodeApiHandler(_JsonHandler):
+    collections = ('schedules', 'tasks', 'announcements')
+    dataset = {}
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/health':
+            self.send_json(200, {'success': True, 'message': 'ClassInfo API is running (stand-in)'})
+            return
+        if self.inject_fault():
+            return
+        collection = self.path.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+        if not self.path.startswith('/api/') or collection not in self.collections:
+            self.send_json(404, {'success': False, 'message': 'Not found'})
+            return
+        self.send_json(200, {'success': True, 'data': self.dataset.get(collection, [])})
+
+
+class LlmHandler(_JsonHandler):
+    """Answers both OpenRouter and Ollama chat requests"""
+
+    def do_HEAD(self):
+        # Connection warmup probes: reachable, but only POST is supported
+        self.send_response(405)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _answer(self, messages):
+        question = messages[-1]['content'].rsplit('\n', 1)[-1] if messages else ''
+        return f"Stand-in answer to: {question[:120]}"
+
+    def do_POST(self):
+        payload = self.read_json()
+        if self.inject_fault():
+            return
+        content = self._answer(payload.get('messages', []))
+        if self.path.startswith('/api/chat'):
+            self.send_json(200, {'model': payload.get('model'), 'message': {'role': 'assistant', 'content': content}, 'done': True})
+        elif self.path.startswith('/v1/chat/completions'):
+            self.send_json(200, {'model': payload.get('model'), 'choices': [{'message': {'role': 'assistant', 'content': content}}]})
+        else:
+            self.send_json(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+
+def start_node_stub(records=1000, faults=None, seed=42):
+    handler = type('SeededNodeApiHandler', (NodeApiHandler,), {'dataset': generate_dataset(records, seed=seed)})
+    return StubServer(handler, faults).start()
+
+
+def start_llm_stub(faults=None):
+    return StubServer(LlmHandler, faults).start()
@@ -0,0 +1,159 @@
+"""
+Synthetic academic data for benchmarks and load tests.
+
+Generates schedules, tasks and announcements shaped like the Node API
+responses (same field names, ISO dates, HH:MM times) around a reference
+date, so date-dependent ranking and formatting see realistic spreads of
+past, current and upcoming records. Output is deterministic per seed.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+SUBJECTS = [
+    'Calculus II', 'Data Structures', 'Physics for Engineers', 'Philippine History',
+    'Technical Writing', 'Database Systems', 'Operating Systems', 'Discrete Mathematics',
+    'Software Engineering', 'Computer Networks', 'Statistics', 'Ethics'
+]
+ROOMS = ['Room 101', 'Room 204', 'Lab 3', 'AVR', 'Room 310', 'Lab 1', 'Gym', 'Library 2F']
+TASK_TYPES = ['assignment', 'project', 'exam', 'quiz', 'presentation', 'homework', 'lab', 'reading', 'other']
+TASK_STATUSES = ['pending', 'pending', 'in-progress', 'completed', 'cancelled']
+PRIORITIES = ['low', 'medium', 'medium', 'high', 'urgent']
+TASK_TOPICS = [
+    'problem set', 'lab report', 'reflection paper', 'group presentation', 'chapter reading',
+    'midterm review', 'final project proposal', 'quiz on recursion', 'case study', 'essay draft'
+]
+ANNOUNCEMENT_TOPICS = [
+    ('Class suspension', 'Classes are suspended due to the typhoon signal. Stay safe.'),
+    ('Exam schedule released', 'The midterm examination schedule is now posted on the bulletin board.'),
+    ('Enrollment reminder', 'Enrollment for next semester opens on Monday at the registrar.'),
+    ('Library hours update', 'The library will be open until 9 PM during finals week.'),
+    ('Org fair', 'Student organizations are recruiting at the quadrangle this Friday.'),
+    ('Room change', 'Database Systems moves to Lab 3 starting next week.'),
+    ('Faculty meeting', 'No afternoon classes on Wednesday due to the faculty meeting.')
+]
+DESCRIPTION_WORDS = (
+    'review chapter notes submit online before deadline bring calculator group work '
+    'lecture slides reference materials attendance required laboratory safety printed copy'
+).split()
+
+# Messages in the proportions real users send them
+MESSAGE_CORPUS = [
+    ('greeting', 'hi'),
+    ('greeting', 'Hello there!'),
+    ('weekly', 'What is my schedule this week?'),
+    ('weekly', 'show me my classes for the week'),
+    ('next_week', 'what about next week schedule'),
+    ('today', 'Do I have classes today?'),
+    ('tomorrow', 'What classes do I have tomorrow?'),
+    ('tasks', 'What are my tasks?'),
+    ('tasks', 'Any assignments due soon?'),
+    ('tasks', 'which homework is due this week for Data Structures'),
+    ('announcements', 'Any announcements?'),
+    ('announcements', 'what is the latest news'),
+    ('open', 'When is my next Calculus class and what should I prepare?'),
+    ('open', 'How should I plan my study time around the midterm exam?'),
+    ('open', 'Is there anything urgent I should focus on?'),
+    ('followup', 'how about tomorrow?')
+]
+
+
+def _iso(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def _description(rng, words=12):
+    return ' '.join(rng.choice(DESCRIPTION_WORDS) for _ in range(rng.randint(4, words))).capitalize() + '.'
+
+
+def generate_schedules(count, now, rng):
+    schedules = []
+    for index in range(count):
+        day = now + timedelta(days=rng.randint(-30, 30))
+        start_hour = rng.randint(7, 18)
+        start = day.replace(hour=start_hour, minute=rng.choice([0, 30]), second=0, microsecond=0)
+        created = now - timedelta(days=rng.randint(1, 90))
+        schedules.append({
+            '_id': f"sch{index:06d}",
+            'subject': rng.choice(SUBJECTS),
+            'date': _iso(start),
+            'day': start.strftime('%A'),
+            'startTime': start.strftime('%H:%M'),
+            'endTime': f"{min(start_hour + rng.randint(1, 3), 23):02d}:{start.minute:02d}",
+            'room': rng.choice(ROOMS),
+            'description': _description(rng) if rng.random() < 0.6 else '',
+            'status': 'active' if rng.random() < 0.9 else 'cancelled',
+            'createdAt': _iso(created),
+            'updatedAt': _iso(created)
+        })
+    return schedules
+
+
+def generate_tasks(count, now, rng):
+    tasks = []
+    for index in range(count):
+        due = now + timedelta(days=rng.randint(-20, 40), hours=rng.randint(0, 23))
+        created = due - timedelta(days=rng.randint(3, 30))
+        subject = rng.choice(SUBJECTS)
+        tasks.append({
+            '_id': f"tsk{index:06d}",
+            'title': f"{subject} {rng.choice(TASK_TOPICS)}",
+            'description': _description(rng, 25) if rng.random() < 0.8 else '',
+            'type': rng.choice(TASK_TYPES),
+            'class': subject,
+            'dueDate': _iso(due),
+            'status': rng.choice(TASK_STATUSES),
+            'priority': rng.choice(PRIORITIES),
+            'createdAt': _iso(created),
+            'updatedAt': _iso(created)
+        })
+    return tasks
+
+
+def generate_announcements(count, now, rng):
+    announcements = []
+    for index in range(count):
+        created = now - timedelta(days=rng.randint(0, 60), hours=rng.randint(0, 23))
+        title, description = rng.choice(ANNOUNCEMENT_TOPICS)
+        announcements.append({
+            '_id': f"ann{index:06d}",
+            'title': title,
+            'description': description,
+            'postedBy': rng.choice(['Registrar', 'Dean', 'Student Council', 'Prof. Santos']),
+            'createdAt': _iso(created),
+            'updatedAt': _iso(created)
+        })
+    return announcements
+
+
+def generate_dataset(records, seed=42, now=None):
+    """
+    Build a fetch_user_data-shaped snapshot with about `records` records in total.
+
+    The split follows what students actually store: mostly class sessions,
+    a good number of tasks and fewer announcements.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    schedule_count = max(1, int(records * 0.5))
+    task_count = max(1, int(records * 0.35))
+    announcement_count = max(1, records - schedule_count - task_count)
+    return {
+        'schedules': generate_schedules(schedule_count, now, rng),
+        'tasks': generate_tasks(task_count, now, rng),
+        'announcements': generate_announcements(announcement_count, now, rng)
+    }
+
+
+def generate_history(exchanges, seed=42, now=None):
+    """Fake conversation history in the shape stored by /chat"""
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    history = []
+    for index in range(exchanges):
+        _, message = rng.choice(MESSAGE_CORPUS)
+        history.append({
+            'user': message,
+            'assistant': "Here is what I found:\n\n" + "\n".join(f"• {_description(rng)}" for _ in range(3)),
+            'timestamp': (now - timedelta(minutes=(exchanges - index) * 3)).isoformat()
+        })
+    return history
@@ -0,0 +1,88 @@
+"""
+Tests for POST /chat/batch: per-item errors and the streamed NDJSON lines
+"""
+import threading
+
+import pytest
+
+import app
+from jsoncodec import loads
+from records import Snapshot
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The batch endpoint with a stand-in chat pipeline and an empty snapshot"""
+    def fake_process_chat(message, user_id, requested_mode):
+        if message == 'explode':
+            raise ValueError("pipeline failure")
+        return {'response': f"{user_id}: {message}"}
+
+    monkeypatch.setattr(app, 'process_chat', fake_process_chat)
+    monkeypatch.setattr(app, 'USER_SCOPE_PARAM', None)
+    monkeypatch.setattr(app.ContextManager, 'fetch_user_data', staticmethod(lambda user_id=None: Snapshot()))
+    return app.app.test_client()
+
+
+def _lines(response):
+    assert response.mimetype == 'application/x-ndjson'
+    return [loads(line) for line in response.get_data().splitlines()]
+
+
+def test_invalid_batches_are_refused(client, monkeypatch):
+    assert client.post('/chat/batch', json={}).status_code == 400
+    assert client.post('/chat/batch', json={'items': []}).status_code == 400
+    monkeypatch.setattr(app, 'BATCH_MAX_ITEMS', 2)
+    assert client.post('/chat/batch', json={'items': [{'message': 'hi'}] * 3}).status_code == 400
+
+
+def test_per_item_errors_are_streamed_in_order(client):
+    response = client.post('/chat/batch', json={'user_id': 'u1', 'items': [
+        {'message': 'first'},
+        {'message': '   '},
+        {'message': 'explode'},
+        {'message': 'last', 'user_id': 'u2'},
+    ]})
+    assert response.status_code == 200
+    lines = _lines(response)
+
+    assert [line.get('index') for line in lines[:-1]] == [0, 1, 2, 3]
+    assert lines[0]['response'] == 'u1: first'
+    assert lines[1] == {'index': 1, 'error': 'Message is required', 'status': 400}
+    assert lines[2]['error'] is True and lines[2]['status'] == 500
+    assert lines[2]['response'] == app.CHAT_ERROR_RESPONSE
+    assert lines[3]['response'] == 'u2: last'
+    assert lines[-1]['done'] is True and lines[-1]['count'] == 4 and lines[-1]['timed_out'] == 0
+
+
+def test_unordered_batches_stream_every_item_once(client):
+    response = client.post('/chat/batch', json={'ordered': False, 'items': [
+        {'message': f"question {n}", 'user_id': f"user{n}"} for n in range(5)
+    ]})
+    lines = _lines(response)
+    assert sorted(line['index'] for line in lines[:-1]) == list(range(5))
+    assert lines[-1]['done'] is True
+
+
+def test_items_that_never_finish_are_reported(client, monkeypatch):
+    release = threading.Event()
+
+    def hung_process_chat(message, user_id, requested_mode):
+        if message == 'hang':
+            release.wait(5)
+        return {'response': message}
+
+    monkeypatch.setattr(app, 'process_chat', hung_process_chat)
+    monkeypatch.setattr(app, 'BATCH_ITEM_TIMEOUT', 0.2)
+    try:
+        response = client.post('/chat/batch', json={'items': [
+            {'message': 'hang', 'user_id': 'slow'},
+            {'message': 'quick', 'user_id': 'fast'},
+        ]})
+        lines = _lines(response)
+    finally:
+        release.set()
+
+    assert lines[0] == {'index': 0, 'error': 'Timed out', 'status': 504}
+    assert lines[1]['response'] == 'quick'
+    assert lines[-1]['done'] is True and lines[-1]['timed_out'] == 1
@@ -0,0 +1,120 @@
+"""
+Tests for per-user AI budgets and weighted-fair slot scheduling
+"""
+import threading
+import time
+
+import pytest
+
+import app
+from fairshare import FairQueueTimeout, FairScheduler, UsageLedger, parse_weights
+
+
+def _grant_order(scheduler, users):
+    """Queue one request per entry of `users` behind a held slot and return the order they were granted in"""
+    order = []
+    order_lock = threading.Lock()
+
+    def request(label, user):
+        with scheduler.slot(user):
+            with order_lock:
+                order.append(label)
+
+    threads = []
+    with scheduler.slot('holder'):
+        for position, user in enumerate(users):
+            thread = threading.Thread(target=request, args=(f"{user}{position}", user))
+            thread.start()
+            threads.append(thread)
+            # Enqueue one at a time so sequence numbers follow the list
+            deadline = time.monotonic() + 5
+            while scheduler.waiting < position + 1:
+                assert time.monotonic() < deadline, "waiter never queued"
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_queued_requests_interleave_users():
+    scheduler = FairScheduler(concurrency=1, max_wait=5)
+    # A sends three requests back to back; B's single request goes ahead of A's second
+    assert _grant_order(scheduler, ['a', 'a', 'a', 'b']) == ['a0', 'b3', 'a1', 'a2']
+    assert scheduler.in_flight == 0 and scheduler.waiting == 0
+
+
+def test_weights_scale_each_users_share():
+    scheduler = FairScheduler(concurrency=1, max_wait=5, weights={'a': 4})
+    assert _grant_order(scheduler, ['a', 'a', 'a', 'b']) == ['a0', 'a1', 'a2', 'b3']
+
+
+def test_free_slots_are_granted_without_queueing():
+    scheduler = FairScheduler(concurrency=2, max_wait=5)
+    with scheduler.slot('a') as waited, scheduler.slot('a'):
+        assert waited < 0.5
+        assert scheduler.in_flight == 2 and scheduler.waiting == 0
+    assert scheduler.in_flight == 0
+
+
+def test_timeout_gives_back_the_reservation():
+    scheduler = FairScheduler(concurrency=1, max_wait=0.05)
+    with scheduler.slot('holder'):
+        with pytest.raises(FairQueueTimeout):
+            with scheduler.slot('a'):
+                pass
+        assert scheduler.waiting == 0
+        assert scheduler._finish['a'] == 0.0
+    with scheduler.slot('a'):
+        assert scheduler.in_flight == 1
+
+
+def test_ledger_refuses_requests_over_budget():
+    ledger = UsageLedger(window=3600, max_requests=2, max_tokens=100)
+    assert ledger.admit('a') is None
+    assert ledger.admit('a') is None
+    assert ledger.admit('a') == 'over_requests'
+    assert ledger.admit('b') is None
+
+    ledger.charge('b', 150)
+    assert ledger.admit('b') == 'over_tokens'
+
+    usage = ledger.usage('a')
+    assert usage['requests'] == 2 and usage['over_quota'] and usage['downgraded'] == 1
+    assert ledger.usage('nobody')['requests'] == 0
+    assert sorted(ledger.users()) == ['a', 'b']
+
+
+def test_ledger_window_resets_and_zero_disables_limits():
+    ledger = UsageLedger(window=0.05, max_requests=1, max_tokens=0)
+    assert ledger.admit('a') is None
+    assert ledger.admit('a') == 'over_requests'
+    time.sleep(0.06)
+    assert ledger.admit('a') is None
+    assert ledger.usage('a')['total_requests'] == 2
+
+    unlimited = UsageLedger(max_requests=0, max_tokens=0)
+    unlimited.charge('a', 10 ** 9)
+    assert all(unlimited.admit('a') is None for _ in range(100))
+    assert unlimited.usage('a')['request_limit'] is None
+
+
+def test_parse_weights_skips_malformed_entries():
+    assert parse_weights('alice=2, bob=0.5,carol,dave=x,eve=-1,=3') == {'alice': 2.0, 'bob': 0.5}
+    assert parse_weights(None) == {}
+
+
+def test_usage_for_all_users_is_admin_only(monkeypatch):
+    ledger = UsageLedger(max_requests=5)
+    ledger.admit('alice')
+    monkeypatch.setattr(app, 'usage_ledger', ledger)
+    monkeypatch.setattr(app, 'PROFILE_ADMIN_TOKEN', 'secret')
+    client = app.app.test_client()
+
+    assert client.get('/chat/usage').status_code == 403
+    assert client.get('/chat/usage', headers={'X-Profile-Token': 'wrong'}).status_code == 403
+    response = client.get('/chat/usage', headers={'X-Profile-Token': 'secret'})
+    assert response.status_code == 200 and list(response.json['users']) == ['alice']
+    assert client.get('/chat/usage/alice').json['requests'] == 1  # A user's own usage stays open
+
+    monkeypatch.setattr(app, 'PROFILE_ADMIN_TOKEN', '')
+    assert client.get('/chat/usage', headers={'X-Profile-Token': ''}).status_code == 403
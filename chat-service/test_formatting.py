@@ -0,0 +1,69 @@
+"""
+Tests for memoized date/time formatting: cached relative due dates must be
+dropped when the local date changes
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import formatting
+from formatting import DayCache, format_clock_time, format_due_date, relative_day_suffix
+
+
+class FakeClock:
+    """Stands in for formatting's datetime.now() and time.time()"""
+
+    def __init__(self, moment):
+        self.moment = moment
+
+    def advance(self, **delta):
+        self.moment += timedelta(**delta)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock(datetime(2026, 10, 19, 23, 58))
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fake.moment
+
+    monkeypatch.setattr(formatting, 'datetime', FakeDatetime)
+    monkeypatch.setattr(formatting.time, 'time', lambda: fake.moment.timestamp())
+    monkeypatch.setattr(formatting, '_relative_dates', DayCache())
+    return fake
+
+
+def test_relative_suffix_changes_at_midnight(clock):
+    assert format_due_date('2026-10-20T16:00:00') == 'Oct 20, 2026 at 04:00 PM (Tomorrow)'
+    clock.advance(minutes=1)
+    # Still the same day: served from the cache
+    assert format_due_date('2026-10-20T16:00:00') == 'Oct 20, 2026 at 04:00 PM (Tomorrow)'
+    clock.advance(minutes=2)
+    assert format_due_date('2026-10-20T16:00:00') == 'Oct 20, 2026 at 04:00 PM (Today)'
+    assert format_due_date('2026-10-19T16:00:00') == 'Oct 19, 2026 at 04:00 PM (Yesterday)'
+
+
+def test_day_cache_drops_everything_on_a_new_day(clock):
+    cache = DayCache(max_entries=2)
+    assert cache.current_day() == date(2026, 10, 19)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    clock.advance(hours=1)
+    assert cache.get('a') is None
+    assert cache.current_day() == date(2026, 10, 20)
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('c', 3)  # Over max_entries: starts over rather than growing
+    assert cache.get('a') is None and cache.get('c') == 3
+
+
+def test_static_formats():
+    assert relative_day_suffix(3) == 'in 3 days'
+    assert relative_day_suffix(-2) == '2 days overdue'
+    assert [format_clock_time(value) for value in ('00:05', '09:30:00', '12:00', '23:15', 'TBA')] == \
+        ['12:05AM', '9:30AM', '12:00PM', '11:15PM', 'TBA']
+    with pytest.raises(ValueError):
+        format_due_date('next tuesday')
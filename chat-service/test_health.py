@@ -0,0 +1,69 @@
+"""
+Tests for cached upstream health and the /health endpoints built on it
+"""
+import pytest
+
+import app
+from health import HealthRegistry
+
+
+def test_state_follows_consecutive_failures():
+    registry = HealthRegistry(failure_threshold=2)
+    assert registry.state('node') == 'unknown'
+
+    registry.success('node', 0.0123)
+    assert registry.state('node') == 'ok'
+    assert registry.describe('node')['latency_ms'] == 12.3
+
+    registry.failure('node', TimeoutError('read timed out'), 10.0)
+    assert registry.state('node') == 'ok'  # One failure is below the threshold
+    registry.failure('node', 'HTTP 502')
+    assert registry.state('node') == 'failing'
+    assert registry.last_error('node') == 'HTTP 502'
+    assert registry.describe('node')['latency_ms'] == 10000.0
+
+    registry.success('node')
+    assert registry.state('node') == 'ok'
+    assert registry.describe('node')['consecutive_failures'] == 0
+    assert registry.describe('node')['last_error'] == 'HTTP 502'  # Kept for diagnosis
+
+
+def test_unchecked_upstreams():
+    registry = HealthRegistry()
+    assert registry.describe('openrouter')['last_success'] is None
+    assert registry.last_error('openrouter') is None
+    assert registry.as_dict() == {}
+    registry.failure('openrouter', 'refused')
+    assert registry.as_dict()['openrouter']['state'] == 'unknown'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, 'upstream_health', HealthRegistry())
+
+    def no_upstream_calls(*args, **kwargs):
+        raise AssertionError("a health check called an upstream")
+    monkeypatch.setattr(app.node_http, 'get', no_upstream_calls)
+    return app.app.test_client()
+
+
+def test_health_endpoints_read_cached_state_only(client):
+    assert client.get('/health/live').json['status'] == 'alive'
+
+    response = client.get('/health/ready')
+    assert response.status_code == 200 and response.json['node'] == 'unknown'
+    assert client.get('/health').json['service_functional'] is True
+
+
+def test_failing_node_makes_the_service_unready(client):
+    for _ in range(app.upstream_health.failure_threshold):
+        app.upstream_health.failure('node', 'connection refused')
+
+    response = client.get('/health/ready')
+    assert response.status_code == 503
+    assert response.json['upstreams']['node']['consecutive_failures'] == app.upstream_health.failure_threshold
+
+    health = client.get('/health').json
+    assert health['status'] == 'unhealthy'
+    assert health['service_error'] == 'connection refused'
+    assert client.get('/health/live').status_code == 200
@@ -0,0 +1,106 @@
+"""
+Tests for /chat/history: cursor paging, field projection, ETag revalidation
+and the headers a 304 has to share with its 200
+"""
+import itertools
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, 'conversations', {})
+    monkeypatch.setattr(app, 'history_versions', {})
+    monkeypatch.setattr(app, 'HISTORY_MAX_EXCHANGES', 50)
+    return app.app.test_client()
+
+
+def _record(count, user_id='student'):
+    for n in range(count):
+        app.record_exchange(user_id, f"question {n}", f"answer {n} " + 'x' * 400, [])
+
+
+def test_cursor_pages_back_through_the_history(client):
+    _record(7)
+    first = client.get('/chat/history/student?limit=3').json
+    assert [exchange['user'] for exchange in first['history']] == ['question 4', 'question 5', 'question 6']
+    assert first['count'] == 7
+
+    second = client.get(f"/chat/history/student?limit=3&before={first['next_cursor']}").json
+    assert [exchange['user'] for exchange in second['history']] == ['question 1', 'question 2', 'question 3']
+    last = client.get(f"/chat/history/student?limit=3&before={second['next_cursor']}").json
+    assert [exchange['user'] for exchange in last['history']] == ['question 0']
+    assert last['next_cursor'] is None
+
+    newest_id = first['history'][-1]['id']
+    _record(1)
+    newer = client.get(f"/chat/history/student?after={newest_id}").json
+    assert [exchange['user'] for exchange in newer['history']] == ['question 0']
+
+
+def test_fields_project_each_exchange_and_keep_the_id(client):
+    _record(2)
+    history = client.get('/chat/history/student?fields=user,timestamp').json['history']
+    assert all(set(exchange) == {'id', 'user', 'timestamp'} for exchange in history)
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=500', 'limit=x', 'before=abc', 'fields=user,password'])
+def test_invalid_parameters_are_rejected(client, query):
+    assert client.get(f"/chat/history/student?{query}").status_code == 400
+
+
+def test_unchanged_history_revalidates_with_304(client):
+    _record(5)
+    url = '/chat/history/student?fields=user,assistant'
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+    revalidated = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    for header in ('ETag', 'Vary', 'Cache-Control'):
+        assert revalidated.headers.get(header) == response.headers.get(header), header
+
+    # One weak tag covers every encoding of the page
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_etag_changes_with_the_history_and_the_query(client):
+    _record(1)
+    etag = client.get('/chat/history/student').headers['ETag']
+    other_queries = ['/chat/history/student?limit=5', '/chat/history/student?fields=user', '/chat/history/other']
+    for url in other_queries:
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 200, url
+
+    _record(1)
+    assert client.get('/chat/history/student', headers={'If-None-Match': etag}).status_code == 200
+
+    etag = client.get('/chat/history/student').headers['ETag']
+    client.post('/chat/clear/student')
+    cleared = client.get('/chat/history/student', headers={'If-None-Match': etag})
+    assert cleared.status_code == 200 and cleared.json['history'] == []
+
+
+def test_etags_from_another_process_never_match(client, monkeypatch):
+    monkeypatch.setattr(app, 'history_sequence', itertools.count(1))
+    _record(1)
+    etag = client.get('/chat/history/student').headers['ETag']
+
+    # A restart: empty history, the sequence counting from 1 again, the same exchange recorded
+    monkeypatch.setattr(app, 'conversations', {})
+    monkeypatch.setattr(app, 'history_versions', {})
+    monkeypatch.setattr(app, 'history_sequence', itertools.count(1))
+    monkeypatch.setattr(app, 'history_epoch', 'restarted')
+    _record(1)
+    assert client.get('/chat/history/student', headers={'If-None-Match': etag}).status_code == 200
+
+    # Another worker forked from the same preloaded app
+    etag = client.get('/chat/history/student').headers['ETag']
+    assert client.get('/chat/history/student', headers={'If-None-Match': etag}).status_code == 304
+    pid = app.os.getpid()
+    monkeypatch.setattr(app.os, 'getpid', lambda: pid + 1)
+    assert client.get('/chat/history/student', headers={'If-None-Match': etag}).status_code == 200
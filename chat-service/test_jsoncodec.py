@@ -0,0 +1,67 @@
+"""
+Tests for the incremental Node API response parser and the buffered/streamed
+choice made for bodies without a Content-Length
+"""
+import json
+
+import pytest
+
+import app
+from jsoncodec import iter_collection
+
+RECORDS = [
+    {'_id': 1, 'title': 'Café menu ✓', 'score': 12.5, 'tags': ['a', 'b'], 'done': False},
+    {'_id': 2, 'title': 'Quiz "3"', 'score': -0.25e3, 'tags': [], 'done': None},
+    {'_id': 3, 'nested': {'deep': [1, {'x': 'y'}]}, 'score': 1234567}
+]
+DOCUMENT = json.dumps({'success': True, 'meta': {'count': 3}, 'data': RECORDS, 'page': 1}, ensure_ascii=False).encode('utf-8')
+
+
+def _chunks(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_records_survive_any_chunk_split(size):
+    # Size 1 splits every number and every multi-byte UTF-8 character
+    assert list(iter_collection(_chunks(DOCUMENT, size))) == RECORDS
+
+
+def test_whitespace_empty_and_missing_data():
+    assert list(iter_collection([b' {\n "data" : [ 1 ,\t2 ] } '])) == [1, 2]
+    assert list(iter_collection([b'{"data": []}'])) == []
+    assert list(iter_collection([b'{}'])) == []
+    assert list(iter_collection([b'{"success": false, "error": "x"}'])) == []
+
+
+@pytest.mark.parametrize('body', [
+    b'',
+    b'[1, 2]',
+    b'{"data": [1, 2',
+    b'{"data": [1 2]}',
+    b'{"data": [{"a": 1}',
+    b'{"data": [1], "x"}',
+    b'{"data": [tru]}'
+])
+@pytest.mark.parametrize('size', [1, 1024])
+def test_malformed_documents_raise_value_error(body, size):
+    with pytest.raises(ValueError):
+        list(iter_collection(_chunks(body, size)))
+
+
+def test_chunked_bodies_under_the_cap_are_buffered():
+    chunks = iter(_chunks(DOCUMENT, 16))
+    assert list(app.buffered_or_streamed(chunks, cap=len(DOCUMENT) + 1)) == RECORDS
+    assert next(chunks, None) is None
+
+
+def test_chunked_bodies_over_the_cap_switch_to_the_stream_parser():
+    chunks = _chunks(DOCUMENT, 16)
+    pulled = []
+    records = app.buffered_or_streamed((pulled.append(chunk) or chunk for chunk in chunks), cap=40)
+    first = next(records)
+    # The first record arrives before the rest of the body has been read
+    assert first == RECORDS[0] and len(pulled) < len(chunks)
+    assert [first] + list(records) == RECORDS
+    with pytest.raises(ValueError):
+        list(app.buffered_or_streamed(iter(_chunks(DOCUMENT[:-30], 16)), cap=40))
@@ -0,0 +1,98 @@
+"""
+Tests for personal LLM admission control and keep-warm preloading, run
+against the stand-in Ollama server from stub_servers.py
+"""
+import threading
+import time
+
+import pytest
+
+import app
+from personal_llm import KeepWarm, PersonalLLMBusy, PersonalLLMDispatcher
+from stub_servers import FaultProfile, start_llm_stub
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    """Stand-in Ollama server answering after 300 ms, with the app pointed at it"""
+    stub = start_llm_stub(FaultProfile(latency_ms=300))
+    stub.faults_enabled = True
+    monkeypatch.setenv('PERSONAL_LLM_URL', stub.url)
+    yield stub
+    stub.stop()
+
+
+def test_dispatcher_queues_then_refuses():
+    dispatcher = PersonalLLMDispatcher(parallelism=1, max_queue=1, max_wait=5)
+    waited = []
+
+    def wait_for_slot():
+        with dispatcher.slot() as queued:
+            waited.append(queued)
+
+    with dispatcher.slot():
+        waiter = threading.Thread(target=wait_for_slot)
+        waiter.start()
+        deadline = time.monotonic() + 5
+        while dispatcher.waiting < 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+        # The queue is full: refused at once instead of waiting
+        started = time.monotonic()
+        with pytest.raises(PersonalLLMBusy):
+            with dispatcher.slot():
+                pass
+        assert time.monotonic() - started < 0.5
+    waiter.join(5)
+    assert len(waited) == 1 and waited[0] > 0
+    assert dispatcher.in_flight == 0 and dispatcher.waiting == 0
+
+
+def test_dispatcher_gives_up_after_max_wait():
+    dispatcher = PersonalLLMDispatcher(parallelism=2, max_queue=4, max_wait=0.05)
+    with dispatcher.slot(), dispatcher.slot():
+        with pytest.raises(PersonalLLMBusy):
+            with dispatcher.slot():
+                pass
+        assert dispatcher.waiting == 0
+    with dispatcher.slot() as queued:
+        assert queued < 0.05
+
+
+def test_requests_over_capacity_fail_fast_against_the_server(monkeypatch, ollama):
+    monkeypatch.setattr(app, 'personal_llm_dispatcher', PersonalLLMDispatcher(parallelism=1, max_queue=0, max_wait=5))
+    outcomes = []
+
+    def ask(question):
+        try:
+            outcomes.append(app.call_personal_llm_api('llama3.2:3b', [{'role': 'user', 'content': question}]))
+        except PersonalLLMBusy:
+            outcomes.append('busy')
+
+    threads = [threading.Thread(target=ask, args=(f"question {n}",)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    # One generation at a time and no queue: the others go to the next provider
+    assert sorted(outcome.split(' to: ')[0] for outcome in outcomes) == ['Stand-in answer', 'busy', 'busy']
+    assert ollama.requests == 1
+    assert app.personal_llm_dispatcher.in_flight == 0
+
+
+def test_keep_warm_preloads_only_an_idle_server(monkeypatch, ollama):
+    dispatcher = PersonalLLMDispatcher(parallelism=1)
+    monkeypatch.setattr(app, 'AVAILABLE_MODELS', [{'provider': 'personal_llm', 'model': 'llama3.2:3b', 'name': 'Llama'}])
+    keep_warm = KeepWarm(dispatcher, app.preload_personal_llm, interval=0.2)
+
+    assert not keep_warm.run_once()  # Used just now
+    time.sleep(0.25)
+    with dispatcher.slot():
+        assert not keep_warm.run_once()  # A generation is running
+    assert ollama.requests == 0
+
+    time.sleep(0.25)
+    assert keep_warm.run_once()
+    assert ollama.requests == 1
+    assert not keep_warm.run_once()  # The preload counts as use
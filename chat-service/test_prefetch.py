@@ -0,0 +1,132 @@
+"""
+Tests for speculative follow-up preparation: cache expiry and version checks,
+and the load/budget limits that keep prefetches out of real traffic's way
+"""
+import threading
+import time
+
+import pytest
+
+import app
+import prefetch
+from prefetch import Prefetcher, SpeculativeCache
+from records import PartitionedRecordCache
+
+
+class FakeMonotonic:
+    """Stands in for prefetch's time.monotonic()"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeMonotonic()
+    monkeypatch.setattr(prefetch.time, 'monotonic', fake)
+    return fake
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = SpeculativeCache(ttl=60)
+    cache.put('a', 1, 'v1')
+    cache.put('b', 2, 'v1')
+    clock.now += 59
+    assert 'a' in cache
+    assert cache.take('a', 'v1') == 1
+    assert cache.take('a', 'v1') is None  # Take-once
+
+    clock.now += 1
+    assert 'b' not in cache
+    assert cache.take('b', 'v1') is None
+
+
+def test_entries_from_another_snapshot_version_are_dropped():
+    cache = SpeculativeCache()
+    cache.put('a', 1, 'v1')
+    assert cache.take('a', 'v2') is None
+    assert 'a' not in cache  # Dropped, not kept for a later match
+
+
+def test_a_full_cache_drops_expired_entries_first(clock):
+    cache = SpeculativeCache(ttl=10, max_entries=2)
+    cache.put('old', 0)
+    clock.now += 5
+    cache.put('a', 1)
+    clock.now += 5  # 'old' has expired
+    cache.put('b', 2)
+    assert cache.take('a') == 1 and cache.take('b') == 2
+    cache.put('c', 3)
+    cache.put('d', 4)
+    cache.put('e', 5)  # Still full after the sweep: the oldest goes
+    assert 'c' not in cache and 'd' in cache and 'e' in cache
+
+
+def _recorder():
+    outcomes = []
+    return outcomes, outcomes.append
+
+
+def test_prefetches_are_skipped_under_load():
+    outcomes, on_outcome = _recorder()
+    active = [3]
+    prefetcher = Prefetcher(max_active_requests=2, active_requests=lambda: active[0], on_outcome=on_outcome)
+    ran = threading.Event()
+    assert not prefetcher.submit(ran.set)
+    active[0] = 2
+    assert prefetcher.submit(ran.set)
+    assert ran.wait(5)
+    assert outcomes == ['skipped_load', 'scheduled']
+
+
+def test_prefetches_are_skipped_over_budget(clock):
+    outcomes, on_outcome = _recorder()
+    prefetcher = Prefetcher(max_in_flight=1, per_minute=2, on_outcome=on_outcome)
+    release = threading.Event()
+    assert prefetcher.submit(lambda: release.wait(5))
+    assert not prefetcher.submit(lambda: None)  # One already running
+    release.set()
+    while prefetcher.in_flight:
+        time.sleep(0.001)
+
+    assert prefetcher.submit(lambda: None)  # Second of two tokens
+    while prefetcher.in_flight:
+        time.sleep(0.001)
+    assert not prefetcher.submit(lambda: None)  # Budget spent
+    clock.now += 30  # Half a minute refills one token
+    assert prefetcher.submit(lambda: None)
+    assert outcomes == ['scheduled', 'skipped_budget', 'scheduled', 'skipped_budget', 'scheduled']
+
+
+def test_failures_are_counted_and_release_the_slot():
+    outcomes, on_outcome = _recorder()
+    prefetcher = Prefetcher(on_outcome=on_outcome)
+
+    def broken():
+        raise RuntimeError("no data")
+    prefetcher.submit(broken)
+    deadline = time.monotonic() + 5
+    while prefetcher.in_flight or 'failed' not in outcomes:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    assert outcomes == ['scheduled', 'failed']
+
+
+def test_a_prepared_follow_up_is_not_served_after_the_data_changes(monkeypatch):
+    monkeypatch.setattr(app, 'USER_SCOPE_PARAM', None)
+    monkeypatch.setattr(app, 'record_cache', PartitionedRecordCache())
+    monkeypatch.setattr(app, 'speculative_cache', SpeculativeCache())
+    message = "Show my schedules for next week"
+    key = app.prefetch_key('u1', message)
+
+    first = app.record_cache.snapshot({'schedules': [{'_id': 's1', 'subject': 'Physics', 'updatedAt': '1'}]})
+    app.prepare_follow_up('u1', message, first)
+    assert app.speculative_cache.take(key, app.record_cache.last_version()) is not None
+
+    app.prepare_follow_up('u1', message, first)
+    second = app.record_cache.snapshot({'schedules': [{'_id': 's1', 'subject': 'Physics', 'updatedAt': '2'}]})
+    assert app.record_cache.last_version() == second.version != first.version
+    assert app.speculative_cache.take(key, app.record_cache.last_version()) is None
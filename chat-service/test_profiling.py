@@ -0,0 +1,52 @@
+"""
+Tests for on-demand request profiling
+"""
+import threading
+
+from profiling import ProfileStore, profile_call
+
+
+def test_sample_mode_returns_collapsed_stacks():
+    result, text, mode = profile_call(lambda: sum(range(200000)) and 'done', 'sample')
+    assert (result, mode) == ('done', 'sample')
+    assert isinstance(text, str)
+
+
+def test_concurrent_cprofile_requests_fall_back_to_sampling():
+    entered, release = threading.Event(), threading.Event()
+    outcomes = {}
+
+    def slow_view():
+        entered.set()
+        release.wait(5)
+        return 'first'
+
+    def first():
+        outcomes['first'] = profile_call(slow_view, 'cprofile')
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    assert entered.wait(5)
+    try:
+        result, text, mode = profile_call(lambda: 'second', 'cprofile')
+        assert (result, mode) == ('second', 'sample')
+    finally:
+        release.set()
+        thread.join(5)
+
+    result, text, mode = outcomes['first']
+    assert (result, mode) == ('first', 'cprofile')
+    assert 'slow_view' in text
+    # The profiler is free again once the first run finished
+    assert profile_call(lambda: None, 'cprofile')[2] == 'cprofile'
+
+
+def test_store_keeps_the_slowest_and_the_requested_profiles():
+    store = ProfileStore(capacity=2)
+    slow = store.add(50.0, 'sample', 'a 1')
+    store.add(10.0, 'sample', 'b 1')
+    requested = store.add(1.0, 'cprofile', 'stats', requested=True)
+    store.add(30.0, 'sample', 'c 1')
+    assert store.get(slow)['profile'] == 'a 1'
+    assert store.get(requested)['format'] == 'pstats'
+    assert [entry['duration_ms'] for entry in store.summaries()] == [50.0, 30.0, 1.0]
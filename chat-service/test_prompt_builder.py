@@ -0,0 +1,109 @@
+"""
+Tests for token-budgeted prompt assembly: which history exchanges and
+context items survive a budget and how the final message list is laid out
+"""
+from prompt_builder import (
+    MAX_HISTORY_ANSWER_TOKENS, MAX_HISTORY_EXCHANGES, SYSTEM_PROMPT, build_prompt, estimate_tokens,
+    fit_context, fit_history, truncate_to_tokens
+)
+
+
+def _item(name, score=None, size=40):
+    item = {'type': 'task', 'content': name + ' ' + 'x' * (size - len(name) - 1)}
+    if score is not None:
+        item['score'] = score
+    return item
+
+
+def test_truncate_marks_the_cut():
+    assert truncate_to_tokens('short', 10) == 'short'
+    cut = truncate_to_tokens('y' * 400, 10)
+    assert cut.endswith('...') and estimate_tokens(cut) <= 10
+
+
+def test_fit_context_drops_the_lowest_scored_items_first():
+    context = [_item('a', 5.0), _item('b', 1.0), _item('c', 9.0), _item('d', 3.0)]
+    per_item = estimate_tokens(context[0]['content']) + 2
+    kept = fit_context(context, per_item * 2)
+    # The two best survive, in their original order
+    assert [item['content'][0] for item in kept] == ['a', 'c']
+    assert fit_context(context, per_item * 4) == context
+    assert fit_context(context, 0) == []
+    assert fit_context([], 100) == []
+
+
+def test_fit_context_keeps_unscored_items_ahead_of_scored_ones():
+    context = [_item('a', 50.0), _item('note'), _item('b', 40.0)]
+    per_item = estimate_tokens(context[0]['content']) + 2
+    assert [item['content'].split()[0] for item in fit_context(context, per_item)] == ['note']
+
+
+def test_fit_context_fills_leftover_room_with_smaller_items():
+    context = [_item('big', 9.0, size=400), _item('small', 1.0)]
+    kept = fit_context(context, estimate_tokens(context[1]['content']) + 2)
+    assert [item['content'].split()[0] for item in kept] == ['small']
+
+
+def _exchange(n, answer_chars=40):
+    return {'user': f"question {n}", 'assistant': f"answer {n} " + 'z' * answer_chars}
+
+
+def test_fit_history_keeps_the_newest_exchanges_oldest_first():
+    history = [_exchange(n) for n in range(6)]
+    messages, kept, used = fit_history(history, 10 ** 6)
+    assert kept == MAX_HISTORY_EXCHANGES
+    assert [m['content'] for m in messages if m['role'] == 'user'] == \
+        [f"question {n}" for n in range(6 - MAX_HISTORY_EXCHANGES, 6)]
+    assert [m['role'] for m in messages] == ['user', 'assistant'] * kept
+
+    one_exchange = estimate_tokens('question 5') + estimate_tokens(history[5]['assistant']) + 8
+    messages, kept, used = fit_history(history, one_exchange)
+    assert kept == 1 and used == one_exchange and messages[0]['content'] == 'question 5'
+    assert fit_history(history, 0) == ([], 0, 0)
+
+
+def test_fit_history_cuts_long_answers():
+    messages, kept, used = fit_history([_exchange(0, answer_chars=10000)], 10 ** 6)
+    answer = messages[1]['content']
+    assert answer.endswith('...') and estimate_tokens(answer) <= MAX_HISTORY_ANSWER_TOKENS
+
+
+def test_build_prompt_stays_within_budget_and_reports_drops():
+    context = [_item(f"t{n}", float(n), size=200) for n in range(40)]
+    history = [_exchange(n, answer_chars=600) for n in range(5)]
+    messages, report = build_prompt("what is due?", context, history, "Monday, October 19, 2026", "9:00 AM", "(UTC+8)", budget=1500)
+
+    assert messages[0] == {'role': 'system', 'content': SYSTEM_PROMPT}
+    assert messages[-1]['role'] == 'user' and messages[-1]['content'].endswith("User's current question: what is due?")
+    assert report['total_tokens'] <= 1500
+    # The report also counts the per-exchange message overhead
+    assert report['total_tokens'] == sum(estimate_tokens(m['content']) for m in messages) + 8 * report['history_exchanges']
+    assert report['context_items'] + report['context_items_dropped'] == 40
+    assert report['context_items_dropped'] > 0
+    # The highest-scored items are the ones that made it in
+    assert "t39 " in messages[-1]['content'] and "t0 " not in messages[-1]['content']
+
+
+def test_summary_opens_the_first_user_turn_and_roles_alternate():
+    summary = "The student asked about the physics lab twice. " * 3
+    history = [_exchange(n) for n in range(2)]
+    messages, report = build_prompt("and chemistry?", [], history, "Monday", "9:00 AM", "(UTC+8)", conversation_summary=summary)
+
+    assert [m['role'] for m in messages] == ['system', 'user', 'assistant', 'user', 'assistant', 'user']
+    assert messages[0]['content'] == SYSTEM_PROMPT
+    assert messages[1]['content'].startswith("Summary of the earlier conversation") and messages[1]['content'].endswith("question 0")
+    assert report['history_summarized'] and report['history_exchanges'] == 2
+    assert report['history_tokens'] >= estimate_tokens(summary) + estimate_tokens(messages[2]['content'])
+
+    # Without earlier turns the summary goes in front of the question
+    messages, report = build_prompt("and chemistry?", [], [], "Monday", "9:00 AM", "(UTC+8)", conversation_summary=summary)
+    assert [m['role'] for m in messages] == ['system', 'user']
+    assert messages[1]['content'].startswith("Summary of the earlier conversation")
+    assert messages[1]['content'].endswith("User's current question: and chemistry?")
+
+
+def test_long_summaries_are_cut_to_the_history_budget():
+    messages, report = build_prompt("hi", [], [_exchange(0)], "Monday", "9:00 AM", "(UTC+8)", budget=1200, conversation_summary="w " * 5000)
+    assert report['total_tokens'] <= 1200
+    assert report['history_tokens'] <= int((1200 - report['fixed_tokens']) * 0.3) + 1
+    assert sum(1 for m in messages if m['role'] == 'system') == 1
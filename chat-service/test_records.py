@@ -0,0 +1,143 @@
+"""
+Tests for typed records and snapshot versioning: a changed feed must give a
+new version, an unchanged one the same snapshot. Also covers per-user
+partitions and the records they share
+"""
+import gc
+from datetime import date
+
+import records
+from records import PartitionedRecordCache, RecordCache, Snapshot
+
+
+def _feed(**overrides):
+    feed = {
+        'schedules': [
+            {'_id': 's1', 'subject': 'Physics', 'room': 'Lab 2', 'date': '2026-10-19T09:00:00Z',
+             'startTime': '09:00', 'endTime': '10:30', 'updatedAt': '2026-10-01T00:00:00Z'},
+            {'_id': 's2', 'subject': 'Chemistry', 'date': 'not a date', 'updatedAt': '2026-10-01T00:00:00Z'}
+        ],
+        'tasks': [
+            {'_id': 't1', 'title': 'Lab report', 'class': 'Physics', 'status': 'pending',
+             'dueDate': '2026-10-22T16:00:00Z', 'updatedAt': '2026-10-02T00:00:00Z'},
+            {'_id': 't2', 'title': 'Quiz', 'status': 'completed', 'dueDate': '2026-10-18T08:00:00Z'}
+        ],
+        'announcements': [
+            {'_id': 'a1', 'title': 'No classes Friday', 'description': 'Holiday', 'createdAt': '2026-10-15T00:00:00Z'}
+        ]
+    }
+    feed.update(overrides)
+    return feed
+
+
+def test_records_are_typed_at_ingest():
+    snapshot = RecordCache().snapshot(_feed())
+    physics, chemistry = snapshot.schedules
+    assert physics.date == date(2026, 10, 19) and physics.start_time == '09:00'
+    assert chemistry.date is None and chemistry.start_time == 'TBA'
+    assert [task.is_open for task in snapshot.tasks] == [True, False]
+    assert 'physics' in snapshot.tasks[0].tokens
+    assert len(snapshot) == 5
+
+
+def test_unchanged_feed_returns_the_same_snapshot():
+    cache = RecordCache()
+    first = cache.snapshot(_feed())
+    index = first.bm25('tasks')
+    second = cache.snapshot(_feed())
+    assert second is first
+    assert second.bm25('tasks') is index
+
+
+def test_any_change_gives_a_new_version():
+    cache = RecordCache()
+    base = cache.snapshot(_feed()).version
+    feed = _feed()
+    feed['tasks'][0]['updatedAt'] = '2026-10-03T00:00:00Z'
+    edited = cache.snapshot(feed)
+    assert edited.version != base
+
+    # Records without updatedAt are fingerprinted by their content
+    feed = _feed()
+    feed['tasks'][1]['status'] = 'pending'
+    assert cache.snapshot(feed).version not in (base, edited.version)
+
+    assert cache.snapshot(_feed(announcements=[])).version != base
+    assert cache.snapshot(_feed()).version == base
+
+
+def test_unchanged_records_are_reused_across_versions():
+    cache = RecordCache()
+    first = cache.snapshot(_feed())
+    feed = _feed()
+    feed['tasks'][0]['updatedAt'] = '2026-10-03T00:00:00Z'
+    feed['tasks'][0]['title'] = 'Lab report (revised)'
+    second = cache.snapshot(feed)
+    assert second.schedules[0] is first.schedules[0]
+    assert second.tasks[0] is not first.tasks[0]
+    assert second.tasks[0].title == 'Lab report (revised)'
+
+
+def test_empty_snapshot():
+    snapshot = Snapshot()
+    assert len(snapshot) == 0 and snapshot.version == 'empty'
+    assert snapshot.bm25('tasks').score(['lab']) == {}
+
+
+def test_partitions_are_evicted_least_recently_used_first():
+    evicted = []
+    cache = PartitionedRecordCache(max_partitions=2, on_evict=evicted.append)
+    cache.snapshot(_feed(), 'u1')
+    cache.snapshot(_feed(), 'u2')
+    cache.snapshot(_feed(), 'u1')  # u2 is now the least recently used
+    cache.snapshot(_feed(), 'u3')
+    assert evicted == ['u2'] and len(cache) == 2
+    assert cache.last_version('u2') is None and cache.last_version('u1') is not None
+
+    cache.snapshot(_feed())  # The unscoped feed is not a partition
+    assert len(cache) == 2 and cache.last_version() is not None
+
+
+def test_idle_partitions_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(records.time, 'monotonic', lambda: now[0])
+    evicted = []
+    cache = PartitionedRecordCache(idle_seconds=60, on_evict=evicted.append)
+    first = cache.snapshot(_feed(), 'u1')
+    cache.snapshot(_feed(), 'u2')
+    now[0] += 30
+    assert cache.snapshot(_feed(), 'u1') is first  # Still held: same snapshot back
+    now[0] += 45  # u2 idle for 75s, u1 for 45s
+    cache.snapshot(_feed(), 'u3')
+    assert evicted == ['u2']
+
+    now[0] += 61
+    cache.snapshot(_feed(), 'u3')
+    assert evicted == ['u2', 'u1'] and len(cache) == 1
+    assert cache.snapshot(_feed(), 'u1') is not first  # Rebuilt from scratch
+
+
+def test_announcements_are_shared_across_scopes():
+    cache = PartitionedRecordCache()
+    own_tasks = _feed(tasks=[{'_id': 't9', 'title': 'Essay', 'status': 'pending'}])
+    u1 = cache.snapshot(_feed(), 'u1')
+    u2 = cache.snapshot(own_tasks, 'u2')
+    unscoped = cache.snapshot(_feed())
+    assert u1.announcements[0] is u2.announcements[0] is unscoped.announcements[0]
+    assert u1.tasks[0] is not unscoped.tasks[0]  # Scoped collections stay per partition
+    assert u1.scope == 'u1' and unscoped.scope is None
+
+    shared = cache.shared_records()
+    assert shared == 1
+    del u1, u2, unscoped
+    gc.collect()
+    assert cache.shared_records() == shared  # Still referenced by the partitions
+
+
+def test_shared_records_go_once_no_partition_holds_them():
+    cache = PartitionedRecordCache(max_partitions=1)
+    cache.snapshot(_feed(), 'u1')
+    assert cache.shared_records() == 1
+    cache.snapshot(_feed(announcements=[]), 'u2')  # Evicts u1, the announcement's only holder
+    gc.collect()
+    assert cache.shared_records() == 0
@@ -0,0 +1,138 @@
+"""
+Tests for context retrieval: BM25 scoring, top-k selection, the TF-IDF
+index and the relevance floor applied when ranking a snapshot for a message
+"""
+from datetime import datetime, time, timedelta
+
+import pytest
+
+import app
+from records import RecordCache
+from retrieval import BM25Index, TfidfIndex, numpy_available, tokenize, top_k
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What is my Physics homework?") == ['physics', 'homework']
+    assert tokenize(None) == []
+
+
+def test_bm25_scores_rarer_terms_higher():
+    index = BM25Index([['physics', 'lab'], ['physics', 'lecture'], ['chemistry', 'lab'], ['physics', 'quiz']])
+    scores = index.score(['chemistry'])
+    assert list(scores) == [2]
+    # 'lab' is in two documents, 'physics' in three
+    assert index.score(['lab'])[0] > index.score(['physics'])[0]
+
+
+def test_bm25_without_matches():
+    index = BM25Index([['physics', 'lab']])
+    assert index.score(['history']) == {}
+    assert index.score([]) == {}
+    assert BM25Index([]).score(['physics']) == {}
+
+
+def test_top_k_returns_best_first_and_keeps_ties_in_order():
+    scored = [(1.0, 'a'), (3.0, 'b'), (2.0, 'c'), (3.0, 'd'), (0.5, 'e')]
+    assert top_k(scored, 3) == [(3.0, 'b'), (3.0, 'd'), (2.0, 'c')]
+    assert top_k(iter(scored), 10) == sorted(scored, key=lambda pair: -pair[0])
+    assert top_k(scored, 0) == []
+
+
+def _iso(day):
+    return datetime.combine(day, time(9)).isoformat()
+
+
+def _snapshot(today):
+    return RecordCache().snapshot({
+        'schedules': [
+            {'_id': 's-today', 'subject': 'Physics', 'room': 'Lab 2', 'date': _iso(today)},
+            {'_id': 's-tomorrow', 'subject': 'Chemistry', 'room': 'Room 5', 'date': _iso(today + timedelta(days=1))}
+        ],
+        'tasks': [
+            {'_id': 't-report', 'title': 'Physics lab report', 'class': 'Physics',
+             'description': 'Write up the pendulum experiment', 'dueDate': _iso(today + timedelta(days=3))}
+        ] + [
+            {'_id': f't-sheet-{n}', 'title': f'Worksheet {n}', 'class': 'Math',
+             'description': 'Exercises', 'dueDate': _iso(today + timedelta(days=4))} for n in range(8)
+        ],
+        'announcements': [
+            {'_id': 'a-library', 'title': 'Campus news', 'description': 'The library opens today at 8', 'createdAt': _iso(today)}
+        ]
+    })
+
+
+def _ranked_ids(monkeypatch, message, intents, target_date=None):
+    monkeypatch.setattr(app, 'RETRIEVAL_ENGINE', 'bm25')
+    today = app.get_user_timezone().date()
+    ranked = app.ContextManager._rank(_snapshot(today), message, today, app.MAX_CONTEXT_ITEMS, intents, target_date=target_date)
+    return [record.id for _, _, record in ranked]
+
+
+def test_weak_text_matches_fall_below_the_relevance_floor(monkeypatch):
+    text_only = {'schedule': False, 'task': False, 'announcement': False}
+    # The schedule shares only 'physics' with the message; the task matches every term
+    assert _ranked_ids(monkeypatch, 'physics pendulum experiment', text_only) == ['t-report']
+    assert _ranked_ids(monkeypatch, 'volcano', text_only) == []
+
+
+def test_date_strict_query_keeps_only_the_asked_record_types(monkeypatch):
+    today = app.get_user_timezone().date()
+    monkeypatch.setattr(app, 'RETRIEVAL_ENGINE', 'bm25')
+    context = app.ContextManager.find_relevant_context('what classes do I have today', _snapshot(today))
+    assert [item['type'] for item in context] == ['schedule']
+    assert 'Physics' in context[0]['content']
+
+
+needs_numpy = pytest.mark.skipif(not numpy_available(), reason="the TF-IDF engine needs NumPy")
+
+
+def _entries(texts):
+    return [(key, text, text, key, (0.0,)) for key, text in texts.items()]
+
+
+@needs_numpy
+def test_tfidf_sync_revectorizes_only_changed_records():
+    index = TfidfIndex(dimensions=256, feature_count=1)
+    texts = {'a': 'physics lab report', 'b': 'chemistry quiz', 'c': 'english essay draft'}
+    assert index.sync(_entries(texts), version='v1') == 3
+
+    # An already synced version is skipped without reading the entries
+    def unread():
+        raise AssertionError("entries iterated for an unchanged version")
+        yield
+    assert index.sync(unread(), version='v1') == 0
+
+    texts['b'] = 'chemistry lab safety quiz'
+    del texts['c']
+    texts['d'] = 'history reading'
+    assert index.sync(_entries(texts), version='v2') == 2
+    assert index.keys == ['a', 'b', 'd']
+    assert list(index.features.shape) == [3, 1]
+
+    # Incremental document frequencies match a fresh build of the same records
+    fresh = TfidfIndex(dimensions=256, feature_count=1)
+    fresh.sync(_entries(texts))
+    assert (index.doc_freq == fresh.doc_freq).all()
+    assert list(index.scores('lab quiz')) == list(fresh.scores('lab quiz'))
+
+
+@needs_numpy
+def test_tfidf_scores_match_a_dense_product():
+    import numpy as np
+    texts = {f'r{n}': text for n, text in enumerate([
+        'physics lab report', 'physics quiz', 'chemistry lab', 'essay on the physics of music', ''])}
+    index = TfidfIndex(dimensions=64, feature_count=1)
+    index.sync(_entries(texts))
+
+    dense = np.zeros((len(index), index.dimensions), dtype=np.float32)
+    for row, (buckets, weights) in enumerate(index.rows):
+        dense[row, buckets] = weights
+    query = np.zeros(index.dimensions, dtype=np.float32)
+    query[list(index._term_counts('physics lab'))] = 1.0
+    idf = np.log((1.0 + len(index)) / (1.0 + index.doc_freq)) + 1.0
+    expected = dense @ (query * idf ** 2).astype(np.float32)
+
+    assert np.allclose(index.scores('physics lab'), expected, rtol=1e-5)
+    assert index.scores('physics lab').argmax() == 0
+    assert not index.scores('and the').any()
+    assert index.nbytes() > 0
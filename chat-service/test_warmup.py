@@ -0,0 +1,102 @@
+"""
+Tests for the warmup scheduler and one real warmup cycle against the
+stand-in Node API
+"""
+import threading
+import time
+
+import pytest
+
+import app
+from health import HealthRegistry
+from records import PartitionedRecordCache
+from stub_servers import start_node_stub
+from warmup import WarmupScheduler
+from week_views import WeekViewCache
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_jobs_run_on_their_interval_and_record_failures():
+    runs = []
+    scheduler = WarmupScheduler(on_run=lambda *run: runs.append(run), seed=1)
+
+    def broken():
+        raise RuntimeError("upstream down")
+
+    scheduler.add('ok', lambda: None, 0.05, initial_delay=0)
+    scheduler.add('broken', broken, 60, initial_delay=0)
+    assert scheduler.add('disabled', lambda: None, 0) is None
+    scheduler.start()
+    _wait_for(lambda: scheduler.status()['ok']['runs'] >= 3 and scheduler.status()['broken']['runs'] == 1)
+
+    status = scheduler.status()
+    assert status['ok']['failures'] == 0 and status['ok']['last_success']
+    assert status['broken']['failures'] == 1 and status['broken']['last_error'] == 'upstream down'
+    assert ('broken', 'failure') in {(name, outcome) for name, outcome, _ in runs}
+    assert 'disabled' not in status
+
+
+def test_a_job_still_running_is_skipped():
+    release = threading.Event()
+    scheduler = WarmupScheduler(seed=1)
+    scheduler.add('slow', lambda: release.wait(5), 0.02, initial_delay=0, jitter=0)
+    scheduler.start()
+    _wait_for(lambda: scheduler.status()['slow']['skipped'] >= 2)
+    assert scheduler.status()['slow']['runs'] == 0 and scheduler.status()['slow']['running']
+    release.set()
+    _wait_for(lambda: scheduler.status()['slow']['runs'] >= 1)
+
+
+@pytest.fixture
+def node_stub(monkeypatch):
+    """The app pointed at a stand-in Node API, with empty caches"""
+    stub = start_node_stub(records=200)
+    monkeypatch.setattr(app, 'NODE_API_URL', stub.url)
+    monkeypatch.setattr(app, 'record_cache', PartitionedRecordCache())
+    monkeypatch.setattr(app, 'week_views', WeekViewCache())
+    monkeypatch.setattr(app, 'upstream_health', HealthRegistry())
+    monkeypatch.setattr(app, 'tfidf_indexes', {})
+    yield stub
+    stub.stop()
+
+
+@pytest.mark.parametrize('engine', ['bm25', 'tfidf'])
+def test_one_warmup_cycle_fills_the_snapshot_caches(monkeypatch, node_stub, engine):
+    if engine == 'tfidf' and not app.numpy_available():
+        pytest.skip("the TF-IDF engine needs NumPy")
+    monkeypatch.setattr(app, 'RETRIEVAL_ENGINE', engine)
+    monkeypatch.setattr(app, 'USER_SCOPE_PARAM', None)
+
+    scheduler = WarmupScheduler(seed=1)
+    scheduler.add('snapshot', app.warm_snapshot, 3600, initial_delay=0)
+    scheduler.add('connections', app.warm_connections, 3600, initial_delay=0)
+    scheduler.start()
+    _wait_for(lambda: all(job['runs'] == 1 for job in scheduler.status().values()))
+    assert all(job['failures'] == 0 for job in scheduler.status().values()), scheduler.status()
+
+    # An unchanged feed comes back as the warmed snapshot object, caches included
+    with app.app.app_context():
+        snapshot = app.ContextManager.fetch_user_data()
+    assert len(snapshot.schedules) == 100
+
+    today = app.get_user_timezone().date()
+    lookups = []
+    app.week_views.on_lookup = lookups.append
+    app.week_views.view(snapshot, today, 0)
+    app.week_views.view(snapshot, today, 1)
+    assert lookups == ['hit', 'hit']
+
+    if engine == 'tfidf':
+        index = app.tfidf_indexes[None]
+        assert index.version == snapshot.version and len(index) == len(snapshot)
+        assert index._columns is not None
+    else:
+        assert set(snapshot._indexes) == set(app.NODE_COLLECTIONS)
+
+    assert app.upstream_health.state('node') == 'ok'
@@ -0,0 +1,87 @@
+"""
+Tests for the per-snapshot week view cache: a new snapshot or a new week
+must never be served a view rendered for the old one
+"""
+import time
+from datetime import date
+
+from records import RecordCache
+from week_views import WeekViewCache, week_monday
+
+MONDAY = date(2026, 10, 19)
+
+
+def _snapshot(cache, *subjects_and_days):
+    return cache.snapshot({'schedules': [
+        {'_id': subject, 'subject': subject, 'room': '101', 'date': f"{day.isoformat()}T09:00:00",
+         'startTime': '09:00', 'endTime': '10:00'}
+        for subject, day in subjects_and_days
+    ]})
+
+
+def test_week_monday():
+    assert week_monday(date(2026, 10, 25)) == MONDAY
+    assert week_monday(MONDAY, 1) == date(2026, 10, 26)
+    assert week_monday(MONDAY, -1) == date(2026, 10, 12)
+
+
+def test_views_are_cached_per_snapshot_version():
+    lookups = []
+    views = WeekViewCache(on_lookup=lookups.append)
+    records = RecordCache()
+    first = _snapshot(records, ('Physics', date(2026, 10, 20)))
+
+    text = views.view(first, MONDAY)
+    assert '**Tuesday:**\n  • Physics from 9:00AM to 10:00AM in room 101' in text
+    assert views.view(first, date(2026, 10, 22)) is text  # Same week, same snapshot
+    assert lookups == ['miss', 'hit']
+
+    second = _snapshot(records, ('Physics', date(2026, 10, 20)), ('Chemistry', date(2026, 10, 21)))
+    assert second.version != first.version
+    updated = views.view(second, MONDAY)
+    assert lookups[-1] == 'miss'
+    assert 'Chemistry' in updated and 'Chemistry' not in text
+
+
+def test_a_new_week_misses_the_cache():
+    lookups = []
+    views = WeekViewCache(on_lookup=lookups.append)
+    snapshot = _snapshot(RecordCache(), ('Physics', date(2026, 10, 20)), ('History', date(2026, 10, 27)))
+
+    this_week = views.view(snapshot, date(2026, 10, 25))  # Sunday
+    next_week = views.view(snapshot, date(2026, 10, 26))  # Monday after
+    assert lookups == ['miss', 'miss']
+    assert 'Physics' in this_week and 'History' not in this_week
+    assert 'History' in next_week and 'Physics' not in next_week
+
+    # "Next week" seen from the first week is the same days but a different heading
+    assert 'History' in views.view(snapshot, date(2026, 10, 25), 1)
+    assert lookups[-1] == 'miss'
+
+
+def test_empty_weeks_and_eviction():
+    views = WeekViewCache(max_views=2, max_snapshots=1)
+    records = RecordCache()
+    snapshot = _snapshot(records)
+    assert 'You have a free week!' in views.view(snapshot, MONDAY)
+    views.view(snapshot, MONDAY, 1)
+    views.view(snapshot, MONDAY, 2)
+    assert len(views._views) == 2
+
+    other = _snapshot(records, ('Art', MONDAY))
+    views.view(other, MONDAY)
+    assert list(views._weeks) == [other.version]
+
+
+def test_observe_prebuilds_this_and_next_week():
+    lookups = []
+    views = WeekViewCache(on_lookup=lookups.append)
+    snapshot = _snapshot(RecordCache(), ('Physics', date(2026, 10, 27)))
+    views.observe(snapshot, MONDAY)
+    deadline = time.monotonic() + 5
+    while len(views._views) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert 'Physics' in views.view(snapshot, MONDAY, 1)
+    views.view(snapshot, MONDAY)
+    assert lookups == ['hit', 'hit']
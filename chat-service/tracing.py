@@ -0,0 +1,88 @@
+"""
+Per-request stage tracing.
+
+A RequestTrace collects named stage durations for the current request
+(intent detection, Node fetch, context selection, prompt build, each model
+attempt, serialization). They are exposed as a Server-Timing header and
+optionally as a `timings` object in the /chat response. The trace id is
+the logging request id and is forwarded to Node and LLM providers in the
+X-Request-ID header.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+from logging_config import current_request_id
+
+TRACE_HEADER = 'X-Request-ID'
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class RequestTrace:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.stages = []  # [{'name', 'ms', 'desc'}]
+        self._names = {}
+
+    def record(self, name, seconds, desc=None):
+        # Repeated stages (a second fetch, model-2...) get a numeric suffix
+        count = self._names.get(name, 0) + 1
+        self._names[name] = count
+        entry = {'name': name if count == 1 else f"{name}-{count}", 'ms': round(seconds * 1000, 2)}
+        if desc:
+            entry['desc'] = desc
+        self.stages.append(entry)
+
+    def total_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+    def as_dict(self):
+        return {'trace_id': self.trace_id, 'total_ms': self.total_ms(), 'stages': list(self.stages)}
+
+    def server_timing(self):
+        parts = []
+        for stage in self.stages:
+            part = stage['name']
+            if 'desc' in stage:
+                part += ';desc="' + stage['desc'].replace('"', "'") + '"'
+            parts.append(f"{part};dur={stage['ms']}")
+        parts.append(f"total;dur={self.total_ms()}")
+        return ", ".join(parts)
+
+
+def start_trace():
+    """Begin tracing the current request under its logging request id"""
+    trace = RequestTrace(current_request_id())
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def record_stage(name, seconds, desc=None):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(name, seconds, desc)
+
+
+@contextmanager
+def stage(name, desc=None):
+    """Time a block as a stage of the current trace (no-op outside a request)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started, desc)
+
+
+def trace_headers(headers=None):
+    """Outbound headers carrying the current trace id"""
+    headers = dict(headers or {})
+    trace_id = current_request_id()
+    if trace_id:
+        headers[TRACE_HEADER] = trace_id
+    return headers
@@ -0,0 +1,126 @@
+"""
+Background warmup jobs for the chat service.
+
+Each job runs on its own interval, with jitter so workers started together
+drift apart instead of hitting upstreams in lockstep. A job that is still
+running when it comes due again is skipped rather than started a second
+time, so a slow upstream cannot pile up warmup threads. Jobs run on their
+own threads; the scheduler thread only keeps time.
+"""
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class WarmupJob:
+    __slots__ = ('name', 'function', 'interval', 'jitter', 'next_run', 'running',
+                 'runs', 'failures', 'skipped', 'last_success', 'last_error', 'last_seconds')
+
+    def __init__(self, name, function, interval, jitter, next_run):
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.jitter = jitter
+        self.next_run = next_run
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_success = None  # ISO timestamp
+        self.last_error = None
+        self.last_seconds = None
+
+    def as_dict(self):
+        return {
+            'interval_seconds': self.interval,
+            'running': self.running,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'last_success': self.last_success,
+            'last_error': self.last_error,
+            'last_ms': round(self.last_seconds * 1000, 2) if self.last_seconds is not None else None
+        }
+
+
+class WarmupScheduler:
+    def __init__(self, on_run=None, logger=None, seed=None):
+        self.on_run = on_run  # Called with (job name, outcome, seconds); outcome is success, failure or skipped
+        self.logger = logger
+        self.jobs = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _jittered(self, interval, jitter):
+        return interval * (1 + self._random.uniform(-jitter, jitter))
+
+    def add(self, name, function, interval, initial_delay=None, jitter=0.1):
+        """Run `function()` every `interval` seconds (+/- jitter), first after `initial_delay` (default: a jittered interval)"""
+        if interval <= 0:
+            return None
+        delay = self._jittered(interval, jitter) if initial_delay is None else initial_delay
+        with self._lock:
+            job = self.jobs[name] = WarmupJob(name, function, interval, jitter, time.monotonic() + delay)
+        self._wake.set()
+        return job
+
+    def _run(self, job):
+        started = time.perf_counter()
+        outcome = 'success'
+        try:
+            job.function()
+            job.last_success = datetime.now(timezone.utc).isoformat()
+            job.last_error = None
+        except Exception as e:
+            outcome = 'failure'
+            job.failures += 1
+            job.last_error = str(e)
+            if self.logger:
+                self.logger.warning("Warmup job %s failed: %s", job.name, e)
+        finally:
+            job.last_seconds = time.perf_counter() - started
+            job.runs += 1
+            with self._lock:
+                job.running = False
+        if self.on_run:
+            self.on_run(job.name, outcome, job.last_seconds)
+
+    def _dispatch_due(self):
+        """Start every due job; returns seconds until the next one is due"""
+        now = time.monotonic()
+        started = []
+        with self._lock:
+            for job in self.jobs.values():
+                if job.next_run > now:
+                    continue
+                job.next_run = now + self._jittered(job.interval, job.jitter)
+                if job.running:
+                    job.skipped += 1
+                    started.append((job, False))
+                else:
+                    job.running = True
+                    started.append((job, True))
+            next_due = min((job.next_run for job in self.jobs.values()), default=now + 60) - now
+        for job, run in started:
+            if run:
+                threading.Thread(target=self._run, args=(job,), daemon=True, name=f"warmup-{job.name}").start()
+            elif self.on_run:
+                self.on_run(job.name, 'skipped', 0.0)
+        return max(0.0, next_due)
+
+    def _loop(self):
+        while True:
+            self._wake.clear()  # Before dispatching, so a job added meanwhile wakes the next wait
+            self._wake.wait(self._dispatch_due())
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='warmup-scheduler')
+            self._thread.start()
+
+    def status(self):
+        with self._lock:
+            return {name: job.as_dict() for name, job in self.jobs.items()}
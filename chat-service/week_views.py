@@ -0,0 +1,144 @@
+"""
+Week-by-week schedule views, materialized per data snapshot.
+
+Schedules are grouped by the Monday of their week once per snapshot, and the
+rendered Monday-Sunday markdown for a week is cached under (snapshot
+version, Monday, week offset). When a new snapshot version shows up, the
+current and next week are rendered in a background thread so the "This
+Week" / "See Next Week" buttons are usually a cache read. With user-scoped
+data several versions are live at once (one per active user), so the
+groupings of the most recently used MAX_CACHED_SNAPSHOTS versions are kept.
+"""
+import collections
+import threading
+from datetime import timedelta
+
+from formatting import format_clock_time
+
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+PREBUILT_WEEK_OFFSETS = (0, 1)
+MAX_CACHED_VIEWS = 64
+MAX_CACHED_SNAPSHOTS = 16
+
+HEADINGS = {0: "📅 **Your Schedule This Week**", 1: "📅 **Your Schedule Next Week**", -1: "📅 **Your Schedule Last Week**"}
+DEFAULT_HEADING = "📅 **Your Schedule**"
+EMPTY_WEEK_NOTES = {
+    0: ["🎉 **You have a free week!** No classes scheduled for this week.", "",
+        "💡 *Tip: Use this time to catch up on assignments or prepare for upcoming classes.*"],
+    1: ["🎉 **You have a free week ahead!** No classes scheduled for next week.", "",
+        "💡 *Tip: Perfect time to plan ahead or work on long-term projects.*"]
+}
+
+
+def week_monday(day, week_offset=0):
+    """Monday of the week `week_offset` weeks from the one containing `day`"""
+    return day - timedelta(days=day.weekday()) + timedelta(weeks=week_offset)
+
+
+def _clock(time_str):
+    if not time_str or time_str == 'TBA':
+        return 'TBA'
+    try:
+        return format_clock_time(time_str)
+    except (ValueError, TypeError):
+        return time_str
+
+
+def render_week(schedules, monday, week_offset):
+    """Markdown day-by-day view of one week's schedules"""
+    sunday = monday + timedelta(days=6)
+    response_parts = [HEADINGS.get(week_offset, DEFAULT_HEADING)]
+    response_parts.append(f"*Week of {monday.strftime('%B %d')} - {sunday.strftime('%B %d, %Y')}*")
+    response_parts.append("")
+
+    schedule_by_day = {day: [] for day in DAYS_OF_WEEK}
+    for schedule in schedules:
+        schedule_by_day[DAYS_OF_WEEK[schedule.date.weekday()]].append(
+            f"{schedule.subject or 'Unknown Class'} from {_clock(schedule.start_time)} to {_clock(schedule.end_time)} in room {schedule.room or 'TBA'}"
+        )
+
+    # Display each day - show "No classes scheduled" for empty days
+    for day in DAYS_OF_WEEK:
+        if schedule_by_day[day]:
+            response_parts.append(f"**{day}:**")
+            response_parts.extend(f"  • {entry}" for entry in schedule_by_day[day])
+        else:
+            response_parts.append(f"**{day}:** No classes scheduled")
+        response_parts.append("")
+
+    if not schedules:
+        if week_offset in EMPTY_WEEK_NOTES:
+            response_parts.extend(EMPTY_WEEK_NOTES[week_offset])
+        elif week_offset > 0:
+            response_parts.append("🎉 **You have a free week ahead!** No classes scheduled for that week.")
+        else:
+            response_parts.append("No classes were scheduled for that week.")
+
+    return "\n".join(response_parts).strip()
+
+
+class WeekViewCache:
+    """Rendered week views keyed by snapshot version, Monday and offset"""
+
+    def __init__(self, max_views=MAX_CACHED_VIEWS, on_lookup=None, max_snapshots=MAX_CACHED_SNAPSHOTS):
+        self.max_views = max_views
+        self.max_snapshots = max_snapshots
+        self.on_lookup = on_lookup  # Called with 'hit' or 'miss'
+        self._views = collections.OrderedDict()
+        self._weeks = collections.OrderedDict()  # snapshot version -> {monday: [schedules]}, least recently used first
+        self._prebuilt_versions = collections.OrderedDict()  # snapshot versions already prebuilt (used as an ordered set)
+        self._lock = threading.Lock()
+
+    def _schedules_by_week(self, snapshot):
+        with self._lock:
+            weeks = self._weeks.get(snapshot.version)
+            if weeks is not None:
+                self._weeks.move_to_end(snapshot.version)
+        if weeks is None:
+            weeks = {}
+            # Schedules without a parseable date are left out; matching by day name is too uncertain
+            for schedule in snapshot.schedules:
+                if schedule.date is not None:
+                    weeks.setdefault(week_monday(schedule.date), []).append(schedule)
+            with self._lock:
+                self._weeks[snapshot.version] = weeks
+                while len(self._weeks) > self.max_snapshots:
+                    self._weeks.popitem(last=False)
+        return weeks
+
+    def view(self, snapshot, today, week_offset=0):
+        """Rendered schedule for the week `week_offset` weeks from today's"""
+        monday = week_monday(today, week_offset)
+        key = (snapshot.version, monday, week_offset)
+        with self._lock:
+            text = self._views.get(key)
+            if text is not None:
+                self._views.move_to_end(key)
+        if self.on_lookup:
+            self.on_lookup('hit' if text is not None else 'miss')
+        if text is None:
+            text = render_week(self._schedules_by_week(snapshot).get(monday, []), monday, week_offset)
+            with self._lock:
+                self._views[key] = text
+                while len(self._views) > self.max_views:
+                    self._views.popitem(last=False)
+        return text
+
+    def observe(self, snapshot, today):
+        """Prebuild the current and next week in the background when the snapshot changes"""
+        with self._lock:
+            if snapshot.version in self._prebuilt_versions:
+                self._prebuilt_versions.move_to_end(snapshot.version)
+                return
+            self._prebuilt_versions[snapshot.version] = None
+            while len(self._prebuilt_versions) > self.max_snapshots:
+                self._prebuilt_versions.popitem(last=False)
+
+        def prebuild():
+            for week_offset in PREBUILT_WEEK_OFFSETS:
+                monday = week_monday(today, week_offset)
+                text = render_week(self._schedules_by_week(snapshot).get(monday, []), monday, week_offset)
+                with self._lock:
+                    self._views[(snapshot.version, monday, week_offset)] = text
+
+        threading.Thread(target=prebuild, daemon=True).start()